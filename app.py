@@ -1,8 +1,16 @@
 import os
+import json
+import time
 import logging
-from flask import Flask, request, jsonify, send_from_directory
+import threading
+from flask import Flask, Response, request, jsonify, send_from_directory, stream_with_context
 from flask_cors import CORS
+from werkzeug.local import LocalProxy
 from book_searcher import BookSearcher
+from async_searcher import AsyncBookSearcher
+from jobs import JobManager, parse_books_csv, export_csv, UNFINISHED
+from shared_state import SharedStore, SharedStateSync
+from bundles import BundleBuilder
 
 # Configure logging
 logging.basicConfig(level=logging.DEBUG)
@@ -14,8 +22,78 @@ app.secret_key = os.environ.get("SESSION_SECRET", "dev-secret-key")
 # Enable CORS
 CORS(app)
 
-# Initialize book searcher
-searcher = BookSearcher()
+class AppState:
+    """The searchers, job manager and shared state sync of one server process"""
+    
+    def __init__(self):
+        self.pid = os.getpid()
+        
+        # The async engine shares the lookup cache, the Gutenberg index, in-flight
+        # lookups, mirror health, metrics, source stats, the link verifier and
+        # per-host pacing with the threaded one
+        self.searcher = BookSearcher()
+        self.async_searcher = AsyncBookSearcher(
+            cache=self.searcher.cache,
+            gutenberg_index=self.searcher.gutenberg_index,
+            inflight=self.searcher.inflight,
+            libgen_health=self.searcher.libgen_health,
+            metrics=self.searcher.metrics,
+            scheduler=self.searcher.scheduler,
+            link_verifier=self.searcher.link_verifier,
+            politeness=self.searcher.politeness
+        )
+        
+        # Background jobs for large book lists, run through the threaded searcher
+        self.jobs = JobManager.from_env(self.searcher)
+        
+        # ZIP downloads of search results, fetched through the searchers' session and pacing
+        # from the hosts of the configured sources only
+        self.bundles = BundleBuilder.from_env(self.searcher.session, self.searcher.politeness, self.searcher.source_hosts())
+        
+        # What the searcher learns is pooled with the other server processes
+        self.shared = None
+        store = SharedStore.from_env()
+        if store is not None:
+            self.shared = SharedStateSync.from_env(store, self.searcher.metrics)
+            self.shared.register('libgen_mirrors', self.searcher.libgen_health)
+            self.shared.register('sources', self.searcher.scheduler)
+            self.shared.register('bad_links', self.searcher.link_verifier)
+            self.shared.register('host_pauses', self.searcher.politeness)
+    
+    def start(self):
+        """Start job workers (resuming unfinished jobs) and the shared state sync"""
+        self.jobs.start()
+        if self.shared is not None:
+            self.shared.start()
+
+_state = None
+_state_lock = threading.Lock()
+
+def app_state():
+    """This process's AppState, built on first use.
+
+    Nothing stateful is built at import time: under gunicorn the app is
+    imported once in the master and forked, and SQLite connections and
+    worker threads have to belong to the process that uses them.
+    """
+    global _state
+    if _state is None or _state.pid != os.getpid():
+        with _state_lock:
+            if _state is None or _state.pid != os.getpid():
+                _state = AppState()
+    return _state
+
+searcher = LocalProxy(lambda: app_state().searcher)
+async_searcher = LocalProxy(lambda: app_state().async_searcher)
+jobs = LocalProxy(lambda: app_state().jobs)
+bundles = LocalProxy(lambda: app_state().bundles)
+MAX_JOB_BOOKS = int(os.environ.get('BOOK_JOB_MAX_BOOKS', 10000))
+MAX_BUNDLE_FILES = int(os.environ.get('BOOK_BUNDLE_MAX_FILES', 100))
+
+@app.before_request
+def start_workers():
+    """Start background work in the process that serves requests"""
+    app_state().start()
 
 @app.route('/')
 def index():
@@ -35,39 +113,310 @@ def static_files(filename):
     response.headers['Expires'] = '0'
     return response
 
+def parse_books_request():
+    """Validate the JSON body of a search request.
+
+    Returns (books, None) on success or (None, error_response) on failure.
+    """
+    data = request.get_json(silent=True)
+    if not data or 'books' not in data:
+        return None, (jsonify({'error': 'Invalid request format. Expected {"books": [{"title": "...", "author": "..."}]}'}), 400)
+    
+    books = data['books']
+    if not isinstance(books, list):
+        return None, (jsonify({'error': 'Books must be a list'}), 400)
+    
+    # Validate book entries
+    for book in books:
+        if not isinstance(book, dict) or 'title' not in book or 'author' not in book:
+            return None, (jsonify({'error': 'Each book must have title and author fields'}), 400)
+        if not isinstance(book['title'], str) or not isinstance(book['author'], str):
+            return None, (jsonify({'error': 'Book title and author must be strings'}), 400)
+    
+    return books, None
+
+def wants_timings():
+    """True when the client asked for the per-source timing breakdown"""
+    if request.args.get('timings', '').lower() in ('1', 'true', 'yes'):
+        return True
+    data = request.get_json(silent=True)
+    return isinstance(data, dict) and data.get('timings') is True
+
+def first_hit_mode():
+    """True or False when the client picked a search mode ("first_hit" or "all"), else None for the default"""
+    data = request.get_json(silent=True)
+    mode = request.args.get('mode') or (data.get('mode') if isinstance(data, dict) else None)
+    if mode in ('first_hit', 'all'):
+        return mode == 'first_hit'
+    return None
+
+def search_response(report):
+    """JSON body for a search report, with timings only when asked for"""
+    body = {
+        'results': report['results'],
+        'timed_out': report['timed_out'],
+        'partial': bool(report['timed_out'])
+    }
+    if wants_timings():
+        body['timings'] = report['timings']
+    return jsonify(body)
+
 @app.route('/search_books', methods=['POST'])
 def search_books():
     """Search for books across multiple sources"""
     try:
-        data = request.get_json()
-        if not data or 'books' not in data:
-            return jsonify({'error': 'Invalid request format. Expected {"books": [{"title": "...", "author": "..."}]}'}), 400
-        
-        books = data['books']
-        if not isinstance(books, list):
-            return jsonify({'error': 'Books must be a list'}), 400
-        
-        # Validate book entries
-        for book in books:
-            if not isinstance(book, dict) or 'title' not in book or 'author' not in book:
-                return jsonify({'error': 'Each book must have title and author fields'}), 400
+        books, error = parse_books_request()
+        if error:
+            return error
         
         app.logger.info(f"Searching for {len(books)} books")
         
-        # Search for books
-        results = searcher.search_books(books)
+        # Search for books; lookups still running at the deadline are dropped
+        report = searcher.search_books_report(books, first_hit=first_hit_mode())
         
-        app.logger.info(f"Found {len(results)} results")
-        return jsonify({'results': results})
+        app.logger.info(f"Found {len(report['results'])} results, {len(report['timed_out'])} lookups timed out")
+        return search_response(report)
         
     except Exception as e:
         app.logger.error(f"Error in search_books: {str(e)}")
         return jsonify({'error': f'Search failed: {str(e)}'}), 500
 
+@app.route('/search_books/async', methods=['POST'])
+async def search_books_async():
+    """Search for books with the asyncio engine, keeping every lookup in flight at once"""
+    try:
+        books, error = parse_books_request()
+        if error:
+            return error
+        
+        app.logger.info(f"Searching for {len(books)} books (async)")
+        
+        report = await async_searcher.search_books_report_async(books, first_hit=first_hit_mode())
+        
+        app.logger.info(f"Found {len(report['results'])} results, {len(report['timed_out'])} lookups timed out")
+        return search_response(report)
+        
+    except Exception as e:
+        app.logger.error(f"Error in search_books_async: {str(e)}")
+        return jsonify({'error': f'Search failed: {str(e)}'}), 500
+
+@app.route('/search_books/stream', methods=['POST'])
+def search_books_stream():
+    """Stream search results as newline-delimited JSON as each source answers.
+
+    Every line is an object with a "type" of "result", "timeout", "summary"
+    or "error". A search that completes ends with the summary line, which
+    carries per-source counts; one that fails partway ends with an error
+    line instead, and no summary.
+    """
+    books, error = parse_books_request()
+    if error:
+        return error
+    
+    app.logger.info(f"Streaming search for {len(books)} books")
+    first_hit = first_hit_mode()
+    
+    def generate():
+        try:
+            for event, payload in searcher.iter_search_books(books, first_hit=first_hit):
+                if event in ('result', 'timeout'):
+                    yield json.dumps({'type': event, **payload}) + '\n'
+                else:
+                    yield json.dumps({'type': 'summary', 'sources': payload}) + '\n'
+        except Exception as e:
+            app.logger.error(f"Error in search_books_stream: {str(e)}")
+            yield json.dumps({'type': 'error', 'error': f'Search failed: {str(e)}'}) + '\n'
+    
+    response = Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+    # Stop proxies from buffering the stream into a single response
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
+
+def parse_bundle_request():
+    """Validate the search results a bundle is asked for.
+
+    Returns (results, None) on success or (None, error_response) on failure.
+    """
+    data = request.get_json(silent=True)
+    if data is None and 'results' in request.form:
+        # Sent from a plain form, so the browser saves the download as it arrives
+        try:
+            data = {'results': json.loads(request.form['results'])}
+        except ValueError:
+            data = None
+    if not isinstance(data, dict) or not isinstance(data.get('results'), list):
+        return None, (jsonify({'error': 'Invalid request format. Expected {"results": [...]} as returned by /search_books'}), 400)
+    
+    results = data['results']
+    if not results:
+        return None, (jsonify({'error': 'No results to bundle'}), 400)
+    if len(results) > MAX_BUNDLE_FILES:
+        return None, (jsonify({'error': f'A bundle can have at most {MAX_BUNDLE_FILES} files'}), 400)
+    
+    for result in results:
+        link = result.get('link') if isinstance(result, dict) else None
+        if not isinstance(link, str) or not link.startswith(('http://', 'https://')):
+            return None, (jsonify({'error': 'Each result must have an http(s) link field'}), 400)
+        if not bundles.allows(link):
+            return None, (jsonify({'error': f'Links must point to one of the book sources: {link}'}), 400)
+        # Archive names are built from these, after the response has started
+        if any(not isinstance(result.get(field), (str, type(None))) for field in ('title', 'author', 'source')):
+            return None, (jsonify({'error': 'Result title, author and source must be strings'}), 400)
+    
+    return results, None
+
+@app.route('/search_books/bundle', methods=['POST'])
+def search_books_bundle():
+    """Stream one ZIP of the PDFs behind a set of search results.
+
+    Takes the "results" of a /search_books response, as JSON or as a form
+    field holding that JSON. Files are fetched
+    concurrently and written into the archive as they arrive; the last
+    entry, manifest.json, gives each link's status and any error.
+    """
+    results, error = parse_bundle_request()
+    if error:
+        return error
+    
+    app.logger.info(f"Bundling {len(results)} results")
+    
+    response = Response(stream_with_context(bundles.stream(results)), mimetype='application/zip')
+    response.headers['Content-Disposition'] = 'attachment; filename=books.zip'
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
+
+def parse_job_request():
+    """Read a job's books from a JSON body, a CSV upload or a text/csv body.
+
+    Returns (books, None) on success or (None, error_response) on failure.
+    """
+    upload = request.files.get('file')
+    if upload is not None or request.mimetype == 'text/csv':
+        raw = upload.read() if upload is not None else request.get_data()
+        try:
+            books = parse_books_csv(raw.decode('utf-8-sig'))
+        except (UnicodeDecodeError, ValueError) as e:
+            return None, (jsonify({'error': f'Could not read CSV: {str(e)}'}), 400)
+        if not books:
+            return None, (jsonify({'error': 'CSV must have title and author columns'}), 400)
+        return books, None
+    return parse_books_request()
+
+def job_not_found(job_id):
+    return jsonify({'error': f'Unknown job {job_id}'}), 404
+
+@app.route('/jobs', methods=['POST'])
+def submit_job():
+    """Queue a book list for background searching and return its job id immediately"""
+    books, error = parse_job_request()
+    if error:
+        return error
+    if len(books) > MAX_JOB_BOOKS:
+        return jsonify({'error': f'A job can have at most {MAX_JOB_BOOKS} books'}), 400
+    
+    job_id = jobs.submit(books)
+    app.logger.info(f"Queued job {job_id} with {len(books)} books")
+    return jsonify({
+        'job_id': job_id,
+        'status': 'queued',
+        'total': len(books),
+        'status_url': f'/jobs/{job_id}',
+        'events_url': f'/jobs/{job_id}/events',
+        'results_url': f'/jobs/{job_id}/results'
+    }), 202
+
+@app.route('/jobs/<job_id>')
+def job_status(job_id):
+    """Progress of a job"""
+    job = jobs.store.get(job_id)
+    if job is None:
+        return job_not_found(job_id)
+    return jsonify(job)
+
+@app.route('/jobs/<job_id>/cancel', methods=['POST'])
+def cancel_job(job_id):
+    """Stop a job after the chunk it is working on"""
+    if jobs.store.get(job_id) is None:
+        return job_not_found(job_id)
+    if not jobs.cancel(job_id):
+        return jsonify({'error': 'Job already finished'}), 409
+    return jsonify(jobs.store.get(job_id))
+
+@app.route('/jobs/<job_id>/events')
+def job_events(job_id):
+    """Stream a job's results and progress as newline-delimited JSON until it finishes.
+
+    Lines have a "type" of "result", "timeout" or "progress"; the last one
+    is a progress line whose status is no longer queued or running. Pass
+    ?after=<id> to skip results already received.
+    """
+    if jobs.store.get(job_id) is None:
+        return job_not_found(job_id)
+    after = request.args.get('after', 0, type=int)
+    
+    def generate():
+        last_id = after
+        last_progress = None
+        while True:
+            job = jobs.store.get(job_id)
+            for row in jobs.store.results_since(job_id, last_id):
+                last_id = row['id']
+                event = {'type': row['kind'], 'id': row['id'], 'title': row['title'], 'author': row['author'], 'source': row['source']}
+                if row['kind'] == 'result':
+                    event['link'] = row['link']
+                yield json.dumps(event) + '\n'
+            
+            progress = (job['status'], job['done'])
+            if progress != last_progress:
+                last_progress = progress
+                yield json.dumps({'type': 'progress', **job}) + '\n'
+            if job['status'] not in UNFINISHED:
+                return
+            time.sleep(1)
+    
+    response = Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
+
+@app.route('/jobs/<job_id>/results')
+def job_results(job_id):
+    """Export a job's results so far as JSON (default) or CSV (?format=csv)"""
+    job = jobs.store.get(job_id)
+    if job is None:
+        return job_not_found(job_id)
+    books = jobs.store.books(job_id)
+    
+    if request.args.get('format') == 'csv':
+        response = Response(export_csv(books), mimetype='text/csv')
+        response.headers['Content-Disposition'] = f'attachment; filename=books-{job_id}.csv'
+        return response
+    return jsonify({'job': job, 'books': books})
+
 @app.route('/health')
 def health_check():
     """Health check endpoint"""
-    return jsonify({'status': 'healthy'})
+    return jsonify({
+        'status': 'healthy',
+        'worker_pid': os.getpid(),
+        'cache': searcher.cache.stats(),
+        'inflight': searcher.inflight.stats(),
+        'pools': searcher.pool_stats(),
+        'libgen_mirrors': searcher.libgen_health.stats(),
+        'sources': searcher.scheduler.stats(),
+        'link_verifier': searcher.link_verifier.stats(),
+        'politeness': searcher.politeness.stats(),
+        'bundles': bundles.stats()
+    })
+
+@app.route('/metrics')
+def metrics():
+    """Lookup and upstream request metrics in the Prometheus text format, summed over every server process"""
+    shared = app_state().shared
+    body = shared.render_metrics() if shared is not None else searcher.metrics.render()
+    return Response(body, mimetype='text/plain; version=0.0.4')
 
 @app.route('/test-search')
 def test_search():
@@ -0,0 +1,509 @@
+import asyncio
+import contextvars
+import json
+import logging
+import time
+from functools import partial
+from urllib.parse import urlparse
+import aiohttp
+from book_searcher import BookSearcher
+from search_cache import normalize_key
+from deadline import Deadline, DeadlineExceeded
+from metrics import RequestTimings
+from politeness import THROTTLE_STATUSES, HostThrottled
+
+# Budget of the lookup a coroutine runs for, so requests to a paused host can fail fast
+_lookup_budget = contextvars.ContextVar('lookup_budget', default=None)
+
+
+class AsyncBookSearcher(BookSearcher):
+    """BookSearcher variant that runs every source lookup as a coroutine.
+
+    All lookups for a request share one event loop and one aiohttp session,
+    so hundreds of them can be in flight at once instead of queueing behind
+    a fixed thread pool. Parsing is shared with the threaded engine.
+    """
+
+    # Lookups in flight per source within one request; coroutines are cheap,
+    # so these are far higher than the threaded engine's worker counts
+    ASYNC_SOURCE_CONCURRENCY = {
+        'Internet Archive': 64,
+        'Project Gutenberg': 32,
+        'LibGen': 16,
+        'PDF Coffee': 16,
+    }
+
+    def __init__(self, cache=None, request_deadline=None, source_budget=None, gutenberg_index=None, inflight=None,
+                 libgen_health=None, metrics=None, scheduler=None, first_hit=None, link_verifier=None, politeness=None,
+                 max_connections=200, max_connections_per_host=30):
+        # A scheduler handed over by the threaded engine is already paced, and
+        # may be holding hosts paused; only one built here needs its rates set
+        self._owns_politeness = politeness is None
+        super().__init__(cache=cache, request_deadline=request_deadline, source_budget=source_budget,
+                         gutenberg_index=gutenberg_index, inflight=inflight, libgen_health=libgen_health,
+                         metrics=metrics, scheduler=scheduler, first_hit=first_hit, link_verifier=link_verifier,
+                         politeness=politeness)
+        self.max_connections = max_connections
+        self.max_connections_per_host = max_connections_per_host
+
+        self.async_sources = [
+            ('Internet Archive', self.search_internet_archive_async),
+            ('Project Gutenberg', self.search_project_gutenberg_async),
+            ('LibGen', self.search_libgen_async),
+            ('PDF Coffee', self.search_pdfcoffee_async),
+        ]
+
+    def _start_engine(self):
+        # aiohttp pools connections itself and semaphores bound each source,
+        # so none of the threaded engine's thread or connection pools are built
+        self.bulkheads = {}
+        self.host_pools = {}
+        self.mount_host_pools()
+
+    def mount_host_pools(self):
+        """Pace the configured upstream hosts, unless the scheduler came from the threaded engine"""
+        if self._owns_politeness:
+            self.pace_hosts()
+
+    def _client_session(self):
+        """Create an HTTP session bound to the running event loop"""
+        connector = aiohttp.TCPConnector(
+            limit=self.max_connections,
+            limit_per_host=self.max_connections_per_host,
+            ttl_dns_cache=300,
+        )
+        return aiohttp.ClientSession(headers=dict(self.session.headers), connector=connector,
+                                     trace_configs=[self._trace_config()])
+
+    def _trace_config(self):
+        """Record every outbound request in the shared metrics.
+
+        Latency runs to the response headers; body bytes are counted as they arrive.
+        """
+        metrics = self.metrics
+
+        async def on_request_start(session, context, params):
+            context.host = urlparse(str(params.url)).netloc
+            context.start = time.perf_counter()
+
+        async def on_request_end(session, context, params):
+            metrics.observe_request(context.host, params.method, params.response.status, time.perf_counter() - context.start)
+
+        async def on_request_exception(session, context, params):
+            status = 'timeout' if isinstance(params.exception, asyncio.TimeoutError) else 'error'
+            metrics.observe_request(context.host, params.method, status, time.perf_counter() - context.start)
+
+        async def on_response_chunk_received(session, context, params):
+            metrics.observe_bytes(context.host, len(params.chunk))
+
+        trace_config = aiohttp.TraceConfig()
+        trace_config.on_request_start.append(on_request_start)
+        trace_config.on_request_end.append(on_request_end)
+        trace_config.on_request_exception.append(on_request_exception)
+        trace_config.on_response_chunk_received.append(on_response_chunk_received)
+        return trace_config
+
+    async def search_books_async(self, books, deadline=None, first_hit=None):
+        """Search for books across all sources concurrently"""
+        return (await self.search_books_report_async(books, deadline, first_hit))['results']
+
+    async def search_books_report_async(self, books, deadline=None, first_hit=None):
+        """Async counterpart of BookSearcher.search_books_report"""
+        start = time.perf_counter()
+        results = []
+        timed_out = []
+        sources = {}
+        async for event, payload in self.iter_search_books_async(books, deadline, first_hit):
+            if event == 'result':
+                results.append(payload)
+            elif event == 'timeout':
+                timed_out.append(payload)
+            elif event == 'summary':
+                sources = payload
+        return {'results': results, 'timed_out': timed_out, 'sources': sources,
+                'timings': self._timings_report(sources, time.perf_counter() - start)}
+
+    async def _run_source_async(self, search, source, http, title, author, budget, limit, timings=None):
+        """Run one source lookup, recording its latency and outcome"""
+        start = time.perf_counter()
+        outcome = 'error'
+        try:
+            result = await self._run_source_shared_async(search, source, http, title, author, budget, limit)
+            if result and self.link_verifier.is_bad(result):
+                # A link already found dead is as good as none
+                result = None
+            outcome = 'found' if result else 'not_found'
+            return result
+        except (DeadlineExceeded, asyncio.CancelledError):
+            # Cancelled lookups were cut off by the request deadline
+            outcome = 'timeout'
+            raise
+        finally:
+            elapsed = time.perf_counter() - start
+            self.metrics.observe_lookup(source, outcome, elapsed)
+            self.scheduler.record(source, outcome == 'found', elapsed)
+            if timings is not None:
+                timings.add(source, elapsed)
+
+    async def _run_source_shared_async(self, search, source, http, title, author, budget, limit):
+        key = normalize_key(title, author, source)
+
+        async def lookup():
+            # Bulkhead: a stalled source can only tie up its own slots
+            async with limit:
+                try:
+                    return await self.inflight.do_async(key, search, http, title, author)
+                except HostThrottled:
+                    # Asking the same host again at once would only be throttled again
+                    raise
+                except DeadlineExceeded:
+                    # A shared lookup that ran out of another request's budget is
+                    # retried on ours; wait_for below still bounds the retry
+                    return await self.inflight.do_async(key, search, http, title, author)
+
+        _lookup_budget.set(budget)
+        try:
+            return await asyncio.wait_for(lookup(), timeout=budget.remaining())
+        except asyncio.TimeoutError:
+            raise DeadlineExceeded('source budget exceeded')
+
+    async def _run_archive_batch_async(self, http, batch, budget):
+        """Run a batch query within its own source budget, as the threaded engine does"""
+        _lookup_budget.set(budget)
+        try:
+            return await asyncio.wait_for(self.search_internet_archive_batch_async(http, batch), timeout=budget.remaining())
+        except asyncio.TimeoutError:
+            raise DeadlineExceeded('source budget exceeded')
+
+    async def iter_search_books_async(self, books, deadline=None, first_hit=None):
+        """Async counterpart of BookSearcher.iter_search_books.
+
+        Unlike the threaded engine, lookups past their deadline are cancelled
+        immediately, including any request they have in flight.
+        """
+        first_hit = self.first_hit if first_hit is None else first_hit
+        deadline = Deadline(self.request_deadline if deadline is None else deadline)
+        searches = dict(self.async_sources)
+        summary = self._new_summary(searches)
+        timings = RequestTimings()
+
+        async with self._client_session() as http:
+            entries = self._unique_books(books)
+            stages = self._plan_stages(first_hit)
+            cached = self._lookup_cache(entries, list(searches))
+            limits = {source: asyncio.Semaphore(self.ASYNC_SOURCE_CONCURRENCY.get(source, 16)) for source in searches}
+            resolved = set()
+
+            if first_hit:
+                for event in self._first_hit_cached(entries, stages, cached, summary, resolved):
+                    yield event
+
+            for stage in stages:
+                events, lookups = self._serve_cached(entries, stage, cached, searches, summary, resolved)
+                for event in events:
+                    yield event
+
+                if deadline.expired():
+                    for event in self._unreached(lookups, summary):
+                        yield event
+                    continue
+
+                async for event, payload, book in self._run_lookups_async(http, lookups, deadline, summary, timings, limits):
+                    if event == 'result':
+                        resolved.add(id(book))
+                    yield event, payload
+
+            yield 'summary', timings.merge_into(summary)
+
+    async def _run_lookups_async(self, http, lookups, deadline, summary, timings, limits):
+        """Run (book, title, author, source, search) lookups, yielding (event, payload, book) as each finishes"""
+        task_to_book = {}
+        batch_tasks = []
+        try:
+            # Internet Archive lookups share a few OR'ed batch queries
+            planned = {}
+            for chunk in self._plan_archive_batches(lookups):
+                batch = [(lookups[i][1], lookups[i][2]) for i in chunk]
+                batch_task = asyncio.create_task(self._run_archive_batch_async(http, batch, deadline.child(self.source_budget)))
+                batch_tasks.append(batch_task)
+                for position, i in enumerate(chunk):
+                    planned[i] = partial(self._search_internet_archive_planned_async, batch_task, position)
+
+            for i, (book, title, author, source, search) in enumerate(lookups):
+                budget = deadline.child(self.source_budget)
+                task = asyncio.create_task(
+                    self._run_source_async(planned.get(i, search), source, http, title, author, budget, limits[source], timings)
+                )
+                task_to_book[task] = (book, source)
+
+            # Collect results as soon as each source finishes
+            pending = set(task_to_book)
+            while pending:
+                done, pending = await asyncio.wait(pending, timeout=deadline.remaining(), return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    logging.warning(f"Search deadline exceeded with {len(pending)} lookups outstanding")
+                    for task in pending:
+                        task.cancel()
+                        book_info, source = task_to_book[task]
+                        yield self._timeout_event(book_info, source, summary)
+                    break
+                for task in done:
+                    book_info, source = task_to_book[task]
+                    for event in self._finish_lookup(book_info, source, task.result, summary):
+                        yield event
+        finally:
+            for task in [*task_to_book, *batch_tasks]:
+                task.cancel()
+
+    async def _get(self, http, url, timeout):
+        """GET a URL through the per-host pacing and return its body, raising on HTTP errors.
+
+        Retries, of retryable answers as well as connection errors and
+        timeouts, run while the lookup's budget allows; a host still
+        throttling once they run out, or paused past the budget, raises
+        HostThrottled.
+        """
+        host = urlparse(url).netloc
+        budget = _lookup_budget.get()
+        attempt = 0
+        while True:
+            await self.politeness.acquire_async(host, budget)
+            try:
+                async with http.get(url, timeout=aiohttp.ClientTimeout(total=timeout)) as response:
+                    delay = self.politeness.after_response(host, response.status, response.headers.get('Retry-After'), attempt)
+                    if delay is None or (budget is not None and delay >= budget.remaining()):
+                        if response.status in THROTTLE_STATUSES:
+                            raise HostThrottled(f'{host} still answered {response.status} after {attempt + 1} attempts')
+                        response.raise_for_status()
+                        return await response.read()
+            except (aiohttp.ClientConnectionError, asyncio.TimeoutError) as e:
+                delay = self.politeness.retry_delay(attempt, budget)
+                if delay is None:
+                    raise
+                logging.info(f"Retrying {host} in {delay:.1f}s after {type(e).__name__}")
+                attempt += 1
+                self.politeness.record_retry()
+                await asyncio.sleep(delay)
+                continue
+            attempt += 1
+            self.politeness.record_retry()
+            # A throttled host waits out its pause in acquire_async()
+            if response.status not in THROTTLE_STATUSES:
+                await asyncio.sleep(delay)
+
+    async def _probe(self, http, url, timeout):
+        """HEAD a URL through the per-host pacing and return its status, without retrying"""
+        host = urlparse(url).netloc
+        await self.politeness.acquire_async(host, _lookup_budget.get())
+        async with http.head(url, timeout=aiohttp.ClientTimeout(total=timeout), allow_redirects=True) as response:
+            # Passing the last attempt still pauses a throttling host, but asks for no retry
+            self.politeness.after_response(host, response.status, response.headers.get('Retry-After'), self.politeness.max_retries)
+            return response.status
+
+    async def _pick_gutenberg_pdf_async(self, http, book_ids):
+        """Async counterpart of BookSearcher._pick_gutenberg_pdf"""
+        failure = None
+        for urls in self._gutenberg_probe_rounds(book_ids):
+            outcomes = await asyncio.gather(*(self._probe(http, url, 10) for url in urls), return_exceptions=True)
+            pdf_url, round_failure = self._pick_probed(urls, outcomes)
+            if pdf_url:
+                return pdf_url
+            failure = failure or round_failure
+        # A candidate that could not be probed may have existed
+        if failure is not None:
+            raise failure
+        return None
+
+    async def _get_json(self, http, url, timeout):
+        return json.loads(await self._get(http, url, timeout))
+
+    async def _fetch_archive_metadata_async(self, http, identifier):
+        return await self._get_json(http, self._archive_metadata_url(identifier), 10)
+
+    async def _resolve_archive_pdf_async(self, http, identifiers):
+        """Fetch the file listings of several items at once and return the best-ranked PDF"""
+        tasks = [asyncio.create_task(self._fetch_archive_metadata_async(http, identifier)) for identifier in identifiers]
+        failure = None
+        try:
+            for identifier, task in zip(identifiers, tasks):
+                try:
+                    pdf_url = self._pick_archive_pdf(identifier, await task)
+                except Exception as e:
+                    logging.warning(f"Metadata lookup failed for {identifier}: {str(e)}")
+                    failure = e
+                    continue
+                if pdf_url:
+                    return pdf_url
+            # An item whose listing could not be read may have had the PDF
+            if failure is not None:
+                raise failure
+            return None
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    async def search_internet_archive_batch_async(self, http, batch):
+        """Run one OR'ed advancedsearch query for many (title, author) pairs"""
+        logging.info(f"Searching Internet Archive for a batch of {len(batch)} books")
+
+        data = await self._get_json(http, self._archive_batch_url(batch), 20)
+        return self._map_archive_batch(batch, data)
+
+    async def _search_internet_archive_planned_async(self, batch_task, position, http, title, author):
+        """Resolve a book from its batch query, falling back to a per-book search"""
+        try:
+            # Shield the shared batch so one book's timeout does not cancel it for the rest
+            identifiers = (await asyncio.shield(batch_task))[position]
+        except Exception as e:
+            logging.warning(f"Internet Archive batch query failed: {str(e)}")
+            identifiers = []
+
+        failure = None
+        if identifiers:
+            try:
+                pdf_url = await self._resolve_archive_pdf_async(http, identifiers)
+            except Exception as e:
+                failure = e
+                pdf_url = None
+            if pdf_url:
+                return pdf_url
+
+        pdf_url = await self.search_internet_archive_async(http, title, author)
+        if not pdf_url and failure is not None:
+            raise failure
+        return pdf_url
+
+    async def search_internet_archive_async(self, http, title, author):
+        """Search Internet Archive for a book"""
+        try:
+            failure = None
+            for search_url in self._archive_search_urls(title, author):
+                try:
+                    logging.info(f"Searching Internet Archive: {search_url}")
+
+                    data = await self._get_json(http, search_url, 15)
+
+                    # Read the real file names instead of guessing them
+                    pdf_url = await self._resolve_archive_pdf_async(http, self._archive_identifiers(data, title, author))
+                    if pdf_url:
+                        return pdf_url
+
+                    # If we found results but no PDFs, try next query
+                    if data.get('response', {}).get('docs'):
+                        continue
+                    else:
+                        break
+
+                except Exception as query_error:
+                    logging.warning(f"Search query failed: {str(query_error)}")
+                    failure = query_error
+                    continue
+
+            # Only a search where every query answered is a genuine miss
+            if failure is not None:
+                raise failure
+            return None
+
+        except Exception as e:
+            logging.error(f"Error searching Internet Archive: {str(e)}")
+            raise
+
+    async def search_project_gutenberg_async(self, http, title, author):
+        """Search Project Gutenberg for a book"""
+        if self.gutenberg_index is not None:
+            return self._gutenberg_index_lookup(title, author)
+
+        try:
+            search_url = self._gutenberg_search_url(title, author)
+
+            logging.info(f"Searching Project Gutenberg: {search_url}")
+
+            content = await self._get(http, search_url, 15)
+
+            return await self._pick_gutenberg_pdf_async(http, self._parse_gutenberg_book_ids(content, title, author))
+
+        except Exception as e:
+            logging.error(f"Error searching Project Gutenberg: {str(e)}")
+            raise
+
+    async def _query_libgen_mirror_async(self, http, mirror, title, author):
+        """Fetch a LibGen results page, recording the outcome in the mirror's health"""
+        search_url = self._libgen_search_url(mirror, title, author)
+
+        logging.info(f"Searching LibGen mirror {mirror}: {search_url}")
+
+        self.libgen_health.begin(mirror)
+        start = time.monotonic()
+        try:
+            content = await self._get(http, search_url, 10)
+        except asyncio.CancelledError:
+            self.libgen_health.cancel(mirror)
+            raise
+        except Exception:
+            self.libgen_health.record_failure(mirror, time.monotonic() - start)
+            raise
+        self.libgen_health.record_success(mirror, time.monotonic() - start)
+        return content
+
+    async def search_libgen_async(self, http, title, author):
+        """Search Library Genesis for a book, healthiest mirror first, hedging slow mirrors"""
+        in_flight = {}
+        try:
+            mirrors = self.libgen_health.ordered(self.LIBGEN_MIRRORS)
+            launch_next = True
+            failure = None
+
+            while mirrors or in_flight:
+                if mirrors and launch_next:
+                    mirror = mirrors.pop(0)
+                    task = asyncio.create_task(self._query_libgen_mirror_async(http, mirror, title, author))
+                    in_flight[task] = mirror
+                    launch_next = False
+
+                # Only wait as long as the hedge delay while a fallback is left
+                hedge_delay = self.libgen_health.hedge_delay(mirror) if mirrors and self.LIBGEN_HEDGING else None
+                done, _ = await asyncio.wait(in_flight, timeout=hedge_delay, return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    logging.info(f"Mirror {mirror} slower than its p90, hedging to the next mirror")
+                    launch_next = True
+                    continue
+
+                for task in done:
+                    answered = in_flight.pop(task)
+                    try:
+                        content = task.result()
+                    except Exception as mirror_error:
+                        logging.warning(f"Mirror {answered} failed: {str(mirror_error)}")
+                        failure = mirror_error
+                        launch_next = True
+                        continue
+
+                    # If this mirror worked, its answer is final even when empty
+                    return self._parse_libgen_results(content, answered, title, author)
+
+            # No mirror answered, so this is a failure rather than a miss
+            if failure is not None:
+                raise failure
+            return None
+
+        except Exception as e:
+            logging.error(f"Error searching LibGen: {str(e)}")
+            raise
+        finally:
+            # The losing side of a hedge is cancelled outright
+            for task in in_flight:
+                task.cancel()
+
+    async def search_pdfcoffee_async(self, http, title, author):
+        """Search PDF Coffee for a book"""
+        try:
+            search_url = self._pdfcoffee_search_url(title, author)
+
+            logging.info(f"Searching PDF Coffee: {search_url}")
+
+            content = await self._get(http, search_url, 15)
+            return self._parse_pdfcoffee_results(content, title, author)
+
+        except Exception as e:
+            logging.error(f"Error searching PDF Coffee: {str(e)}")
+            raise
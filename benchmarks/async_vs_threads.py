@@ -0,0 +1,56 @@
+"""Compare the threaded and asyncio search engines against a local fake upstream.
+
+Usage: python -m benchmarks.async_vs_threads [--books 50 200] [--latency 0.05]
+"""
+import argparse
+import asyncio
+import logging
+import time
+from async_searcher import AsyncBookSearcher
+from book_searcher import BookSearcher
+from politeness import PolitenessScheduler
+from search_cache import SearchCache
+from benchmarks.fake_upstream import FakeUpstream
+
+
+def make_books(count, run):
+    # Unique titles per run so no lookup is served from cache
+    return [{'title': f'Book{run}x{i} Volume', 'author': f'Author {i}'} for i in range(count)]
+
+
+# The fake upstream serves every source from one host, so per-host pacing
+# is left off to measure the engines themselves
+def run_threads(upstream, books):
+    searcher = upstream.point(BookSearcher(cache=SearchCache(path=None), politeness=PolitenessScheduler(scale=0)))
+    start = time.perf_counter()
+    results = searcher.search_books(books)
+    return time.perf_counter() - start, len(results)
+
+
+def run_async(upstream, books):
+    searcher = upstream.point(AsyncBookSearcher(cache=SearchCache(path=None), politeness=PolitenessScheduler(scale=0)))
+    start = time.perf_counter()
+    results = asyncio.run(searcher.search_books_async(books))
+    return time.perf_counter() - start, len(results)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--books', type=int, nargs='+', default=[10, 50, 200])
+    parser.add_argument('--latency', type=float, default=0.05, help='upstream latency per request in seconds')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.CRITICAL)
+
+    print(f"{'books':>6} {'engine':>8} {'seconds':>9} {'results':>8} {'outbound':>9} {'books/s':>8}")
+    with FakeUpstream(latency=args.latency) as upstream:
+        for run, count in enumerate(args.books):
+            for name, runner in (('threads', run_threads), ('asyncio', run_async)):
+                upstream.reset_counts()
+                elapsed, found = runner(upstream, make_books(count, f'{run}{name}'))
+                outbound = sum(upstream.request_counts.values())
+                print(f"{count:>6} {name:>8} {elapsed:>9.2f} {found:>8} {outbound:>9} {count / elapsed:>8.1f}")
+
+
+if __name__ == '__main__':
+    main()
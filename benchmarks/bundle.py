@@ -0,0 +1,240 @@
+"""Stream ZIP bundles of growing size from the Flask app and watch its memory.
+
+Posts result sets to /search_books/bundle on the app served by a local
+WSGI server, with every link on a fake file server in the same process.
+Besides the PDFs, each bundle asks for an HTML page, a missing file and a
+PDF whose download breaks off, which the manifest has to report. The
+client saves each archive to a temporary file and checks every entry's
+CRC and the manifest.
+
+Before timing anything, one small bundle checks the behaviour: entries
+are byte-identical to the served PDFs, a repeated link is fetched once,
+and the manifest reports a page, a missing file, a file over the size
+limit, a link to a host that is not allowed and a redirect off the
+allowed hosts. The endpoint must refuse a link to a host that is not
+allowed with a 400.
+
+Reports the bundle size, time taken, throughput and how far the process's
+resident memory rose above where it started; that rise should stay flat
+however large the bundle gets.
+
+Usage: python -m benchmarks.bundle [--files 30] [--sizes 1 4 16] [--workers 1 4] [--latency 0.05]
+"""
+import argparse
+import gc
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+import zipfile
+from urllib.parse import urlparse
+import requests
+
+# Keep the harness off the on-disk stores
+os.environ.setdefault('BOOK_CACHE_PATH', '')
+os.environ.setdefault('BOOK_MIRROR_HEALTH_PATH', '')
+os.environ.setdefault('BOOK_SHARED_STATE_PATH', '')
+os.environ.setdefault('BOOK_JOBS_PATH', '')
+
+from bundles import BundleBuilder, OK, FAILED, INCOMPLETE
+from politeness import PolitenessScheduler
+from benchmarks.fake_upstream import FakeUpstream, fake_file_chunks
+
+MB = 1024 * 1024
+
+
+def rss_bytes():
+    """Resident memory of this process, from /proc (Linux only), or None"""
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('VmRSS:'):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        return None
+
+
+class PeakMemory:
+    """Samples resident memory in the background while a run is going"""
+
+    def __init__(self, interval=0.01):
+        self.interval = interval
+        self.start = self.peak = rss_bytes()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._sample, daemon=True)
+
+    def _sample(self):
+        while not self._stop.is_set():
+            self.peak = max(self.peak, rss_bytes())
+            time.sleep(self.interval)
+
+    def __enter__(self):
+        if self.start is not None:
+            self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        if self.start is not None:
+            self._thread.join()
+
+    @property
+    def growth(self):
+        return None if self.start is None else self.peak - self.start
+
+
+def make_results(upstream, files, size, prefix):
+    results = [
+        {'title': f'{prefix} Book {i}', 'author': f'Author {i}', 'source': 'Fake', 'link': upstream.file_url(size, f'{prefix}-{i}')}
+        for i in range(files)
+    ]
+    # One of each kind of failure the manifest has to report
+    results.append({'title': f'{prefix} Page', 'author': 'Nobody', 'source': 'Fake', 'link': upstream.file_url(size, f'{prefix}-page', kind='html')})
+    results.append({'title': f'{prefix} Gone', 'author': 'Nobody', 'source': 'Fake', 'link': upstream.file_url(size, f'{prefix}-gone', kind='missing')})
+    results.append({'title': f'{prefix} Broken', 'author': 'Nobody', 'source': 'Fake', 'link': upstream.file_url(size, f'{prefix}-broken', cut=size // 2)})
+    return results
+
+
+def check_archive(path, files, size):
+    """Verify every CRC and return the manifest, raising if the archive is not what was asked for"""
+    with zipfile.ZipFile(path) as archive:
+        bad = archive.testzip()
+        if bad is not None:
+            raise AssertionError(f"bad CRC in {bad}")
+        manifest = json.loads(archive.read('manifest.json'))
+        statuses = [entry['status'] for entry in manifest['files']]
+        expected = [OK] * files + [FAILED, FAILED, INCOMPLETE]
+        if statuses != expected:
+            raise AssertionError(f"manifest statuses {statuses}")
+        for entry in manifest['files'][:files]:
+            if archive.getinfo(entry['file']).file_size != size:
+                raise AssertionError(f"{entry['file']} is not {size} bytes")
+    return manifest
+
+
+def check_behaviour(base_url, upstream, session, flask_app):
+    """Bundle one small result set through the endpoint and check every entry and manifest line"""
+    limit = 256 * 1024
+    sizes = {'small': 1000, 'medium': 100 * 1000, 'large': limit}
+    pdfs = [{'title': name.title(), 'author': 'Checker', 'source': 'Fake', 'link': upstream.file_url(size, name)}
+            for name, size in sizes.items()]
+    outside = urlparse(upstream.url)._replace(netloc=f"localhost:{urlparse(upstream.url).port}").geturl()
+    # (result, expected status), in the order the manifest lists them
+    cases = [(pdf, OK) for pdf in pdfs] + [
+        ({'title': 'Page', 'link': upstream.file_url(10, 'page', kind='html')}, FAILED),
+        ({'title': 'Gone', 'link': upstream.file_url(10, 'gone', kind='missing')}, FAILED),
+        ({'title': 'Too Big', 'link': upstream.file_url(limit + 1, 'too-big')}, FAILED),
+        ({'title': 'Redirected', 'link': upstream.redirect_url(upstream.file_url(5000, 'redirected'))}, OK),
+        ({'title': 'Outside', 'link': f"{outside}bundle/10/outside.pdf"}, FAILED),
+        ({'title': 'Redirected Outside', 'link': upstream.redirect_url(f"{outside}bundle/10/outside.pdf")}, FAILED),
+    ]
+    # The same link again under another title is left out
+    results = [result for result, _ in cases] + [dict(pdfs[0], title='Small Again')]
+
+    builder = BundleBuilder(session, politeness=PolitenessScheduler(scale=0), allowed_hosts=[urlparse(upstream.url).netloc],
+                            max_file_bytes=limit)
+    flask_app.bundles = builder
+
+    refused = requests.post(f'{base_url}search_books/bundle', json={'results': [cases[-2][0]]})
+    if refused.status_code != 400:
+        raise AssertionError(f"a link to a host that is not allowed got {refused.status_code}, not 400")
+
+    # Links that the endpoint refuses are passed to the builder directly
+    upstream.reset_counts()
+    with tempfile.TemporaryFile() as out:
+        for chunk in builder.stream(results):
+            out.write(chunk)
+        out.seek(0)
+        with zipfile.ZipFile(out) as archive:
+            manifest = json.loads(archive.read('manifest.json'))
+            entries = manifest['files']
+            statuses = [entry['status'] for entry in entries]
+            if statuses != [status for _, status in cases]:
+                raise AssertionError(f"manifest statuses {statuses}")
+            for entry in entries:
+                if entry['status'] != OK:
+                    if not entry['error']:
+                        raise AssertionError(f"{entry['title']} failed without an error")
+                    continue
+                name = entry['link'].rsplit('/', 1)[-1].split('?')[0]
+                if entry['title'] == 'Redirected':
+                    name, size = 'redirected.pdf', 5000
+                else:
+                    size = sizes[name[:-4]]
+                if archive.read(entry['file']) != b''.join(fake_file_chunks(size, name)):
+                    raise AssertionError(f"{entry['file']} differs from the served file")
+            if len(archive.namelist()) != statuses.count(OK) + 1:
+                raise AssertionError(f"archive holds {archive.namelist()}")
+
+    # Three PDFs, the page, the missing file, the oversized one and the redirect target; each redirect once
+    expected = {'bundle_file': 7, 'redirect': 2}
+    if upstream.route_counts != expected:
+        raise AssertionError(f"upstream requests {upstream.route_counts}, expected {expected}")
+    print(f"Behaviour checks passed: {statuses.count(OK)} files identical, {statuses.count(FAILED)} failures reported, repeated link fetched once")
+
+
+def run(base_url, upstream, files, size_mb, workers):
+    size = int(size_mb * MB)
+    results = make_results(upstream, files, size, f'w{workers}s{size_mb}')
+    gc.collect()
+    with tempfile.TemporaryFile() as out, PeakMemory() as memory:
+        start = time.perf_counter()
+        with requests.post(f'{base_url}search_books/bundle', json={'results': results}, stream=True) as response:
+            response.raise_for_status()
+            for chunk in response.iter_content(256 * 1024):
+                out.write(chunk)
+        wall = time.perf_counter() - start
+        total = out.tell()
+        out.seek(0)
+        manifest = check_archive(out, files, size)
+
+    return {
+        'workers': workers,
+        'files': files,
+        'file_mb': size_mb,
+        'bundle_mb': round(total / MB, 1),
+        'seconds': round(wall, 2),
+        'mb_per_second': round(total / MB / wall, 1),
+        'rss_growth_mb': None if memory.growth is None else round(memory.growth / MB, 1),
+        'ok': manifest['ok'],
+        'failed': manifest['failed'],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--files', type=int, default=30, help='PDFs per bundle')
+    parser.add_argument('--sizes', type=float, nargs='+', default=[1, 4, 16], help='size of each PDF in MB')
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 4], help='concurrent downloads per bundle')
+    parser.add_argument('--latency', type=float, default=0.05, help='upstream latency per request in seconds')
+    args = parser.parse_args()
+
+    logging.disable(logging.CRITICAL)
+    from werkzeug.serving import make_server
+    import app as flask_app
+
+    with FakeUpstream(latency=args.latency) as upstream:
+        session = requests.Session()
+        server = make_server('127.0.0.1', 0, flask_app.app, threaded=True)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        base_url = f"http://127.0.0.1:{server.server_port}/"
+        try:
+            check_behaviour(base_url, upstream, session, flask_app)
+            print(f"{'workers':>7}{'files':>7}{'file MB':>9}{'bundle MB':>11}{'seconds':>9}{'MB/s':>8}{'RSS +MB':>9}{'ok':>5}{'failed':>8}")
+            for workers in args.workers:
+                # Every fake file is on one host, so pacing is left off to measure the streaming,
+                # and that host is the only one bundles may fetch from
+                flask_app.bundles = BundleBuilder(session, politeness=PolitenessScheduler(scale=0),
+                                                  allowed_hosts=[urlparse(upstream.url).netloc], workers=workers)
+                for size_mb in args.sizes:
+                    row = run(base_url, upstream, args.files, size_mb, workers)
+                    print(f"{row['workers']:>7}{row['files']:>7}{row['file_mb']:>9}{row['bundle_mb']:>11}{row['seconds']:>9}"
+                          f"{row['mb_per_second']:>8}{str(row['rss_growth_mb']):>9}{row['ok']:>5}{row['failed']:>8}")
+        finally:
+            server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,343 @@
+import html
+import json
+import os
+import random
+import re
+import socket
+import threading
+import time
+import zlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, quote, urlparse
+
+FIXTURES = os.path.join(os.path.dirname(__file__), 'fixtures')
+
+
+# Served by scraped sources that don't have the book
+NO_RESULTS = '<html><body><p>No results</p></body></html>'
+
+
+def load_fixture(name):
+    with open(os.path.join(FIXTURES, name), encoding='utf-8') as f:
+        return f.read()
+
+
+def fake_file_chunks(size, name, chunk_size=64 * 1024):
+    """The bytes of a fake PDF of `size` bytes, the same every time for a name, in chunks"""
+    header = b'%PDF-1.4\n'
+    pattern = (f"% {name} ".encode() * (chunk_size // max(1, len(name) + 3) + 1))[:chunk_size]
+    block = (header + pattern)[:chunk_size]
+    sent = 0
+    while sent < size:
+        chunk = block if sent == 0 else pattern
+        chunk = chunk[:size - sent]
+        yield chunk
+        sent += len(chunk)
+
+
+class FakeUpstreamHandler(BaseHTTPRequestHandler):
+    """Answers every book source endpoint, serving the saved fixture pages for scraped sites"""
+
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        self._dispatch(include_body=True)
+
+    def do_HEAD(self):
+        self._dispatch(include_body=False)
+
+    def _dispatch(self, include_body):
+        upstream = self.server.upstream
+        url = urlparse(self.path)
+        query = parse_qs(url.query)
+        route = self._route(url.path)
+        upstream.count_request(self.command, route)
+        if upstream.should_throttle():
+            self._send(429, 'too many requests', 'text/plain', include_body, {'Retry-After': str(upstream.retry_after)})
+            return
+        time.sleep(upstream.request_latency())
+
+        if upstream.should_fail():
+            self._send(503, 'upstream unavailable', 'text/plain', include_body)
+        elif route == 'advancedsearch':
+            # Echo each requested title/creator back as a doc so relevance checks pass
+            q = query.get('q', [''])[0]
+            clauses = re.findall(r'title:\("([^"]*)"\) AND creator:\("([^"]*)"\)', q) or [(q, q)]
+            docs = [
+                {'identifier': re.sub(r'\W+', '-', title.lower()).strip('-') or 'fakebook', 'title': title, 'creator': creator}
+                for title, creator in clauses if upstream.has_book('archive', title)
+            ]
+            self._send(200, json.dumps({'response': {'docs': docs}}), 'application/json', include_body)
+        elif route == 'metadata':
+            identifier = url.path.rsplit('/', 1)[-1]
+            body = json.dumps({'files': [
+                {'name': f'{identifier}_meta.xml', 'format': 'Metadata', 'source': 'original'},
+                {'name': f'{identifier}.pdf', 'format': 'Text PDF', 'source': 'derivative'},
+            ]})
+            self._send(200, body, 'application/json', include_body)
+        elif route == 'download':
+            _, _, identifier, filename = url.path.split('/', 3)
+            status = 200 if filename == f'{identifier}.pdf' else 404
+            self._send(status, '%PDF-1.4\n', 'application/pdf', include_body)
+        elif route == 'gutenberg_search':
+            q = query.get('query', [''])[0]
+            found = upstream.has_book('gutenberg', q)
+            self._send(200, upstream.page('gutenberg', q) if found else NO_RESULTS, 'text/html', include_body)
+        elif route == 'gutenberg_files':
+            self._send(200 if upstream.has_gutenberg_file(url.path) else 404, '%PDF-1.4\n', 'application/pdf', include_body)
+        elif route == 'libgen':
+            q = query.get('req', [''])[0]
+            body = upstream.page('libgen', q).replace('http://libgen.lc/', upstream.url) if upstream.has_book('libgen', q) else NO_RESULTS
+            self._send(200, body, 'text/html', include_body)
+        elif route == 'bundle_file':
+            # /bundle/<size>/<name>.pdf; ?cut=N hangs up after N bytes
+            _, _, size, name = url.path.split('/', 3)
+            if name.endswith('.pdf'):
+                self._send_file(int(size), name, int(query.get('cut', [0])[0]) or None, include_body)
+            else:
+                self._send(200 if name.endswith('.html') else 404, NO_RESULTS, 'text/html', include_body)
+        elif route == 'redirect':
+            self._send(302, '', 'text/plain', include_body, {'Location': query.get('to', ['/'])[0]})
+        elif route == 'pdfcoffee':
+            # Point the recorded results at this server
+            q = query.get('q', [''])[0]
+            body = upstream.page('pdfcoffee', q).replace('https://pdfcoffee.com/', upstream.url)
+            self._send(200, body if upstream.has_book('pdfcoffee', q) else NO_RESULTS, 'text/html', include_body)
+        else:
+            self._send(404, 'not found', 'text/plain', include_body)
+
+    @staticmethod
+    def _route(path):
+        if path == '/advancedsearch.php':
+            return 'advancedsearch'
+        if path.startswith('/metadata/'):
+            return 'metadata'
+        if path.startswith('/download/') and path.endswith('.pdf'):
+            return 'download'
+        if path == '/ebooks/search/':
+            return 'gutenberg_search'
+        if path.startswith('/files/') or path.startswith('/cache/epub/'):
+            return 'gutenberg_files'
+        if path == '/search.php':
+            return 'libgen'
+        if path == '/search':
+            return 'pdfcoffee'
+        if re.fullmatch(r'/bundle/\d+/[^/]+', path):
+            return 'bundle_file'
+        if path == '/redirect':
+            return 'redirect'
+        return 'other'
+
+    def _send(self, status, body, content_type, include_body, headers=None):
+        payload = body.encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(payload)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        if include_body:
+            self.wfile.write(payload)
+
+    def _send_file(self, size, name, cut, include_body):
+        # Generated a chunk at a time, so large files cost the server no memory
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/pdf')
+        self.send_header('Content-Length', str(size))
+        self.end_headers()
+        if not include_body:
+            return
+        sent = 0
+        for chunk in fake_file_chunks(size, name):
+            if cut is not None and sent + len(chunk) > cut:
+                self.wfile.write(chunk[:cut - sent])
+                self.wfile.flush()
+                # Drop the connection mid-body, as a failing upstream would
+                self.close_connection = True
+                self.connection.shutdown(socket.SHUT_RDWR)
+                return
+            self.wfile.write(chunk)
+            sent += len(chunk)
+
+
+class FakeUpstreamServer(ThreadingHTTPServer):
+    daemon_threads = True
+    # The default listen backlog of 5 drops bursts of concurrent connects
+    request_queue_size = 1024
+
+    def handle_error(self, request, client_address):
+        # Clients hanging up mid-response (cancelled lookups) are expected
+        pass
+
+
+class FakeUpstream:
+    """Local stand-in for archive.org, Gutenberg, LibGen and PDF Coffee.
+
+    Every request waits `latency` seconds plus up to `jitter` more, and fails
+    with a 503 with probability `error_rate`. find_rates maps 'archive',
+    'gutenberg', 'libgen' and 'pdfcoffee' to the share of books each one has
+    (default all); which books a source has is fixed by the query text, so
+    repeated lookups agree. dead_mirror() and hung_mirror() give LibGen
+    mirror URLs that refuse connections or never answer. With a
+    throttle_rate, requests beyond that many per second (after a burst of
+    as many) are answered 429 with a Retry-After of `retry_after` seconds.
+    file_url() gives links to generated PDFs of any size, for bundles.
+    """
+
+    def __init__(self, latency=0.05, jitter=0.0, error_rate=0.0, seed=None, find_rates=None, throttle_rate=None,
+                 retry_after=1):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.find_rates = find_rates or {}
+        self.throttle_rate = throttle_rate
+        self.retry_after = retry_after
+        self.throttled = 0
+        self._tokens = throttle_rate or 0
+        self._tokens_at = time.monotonic()
+        self.pages = {
+            'gutenberg': load_fixture('gutenberg_search.html'),
+            'libgen': load_fixture('libgen_search.html'),
+            'pdfcoffee': load_fixture('pdfcoffee_search.html'),
+        }
+        self.request_counts = {'GET': 0, 'HEAD': 0}
+        self.route_counts = {}
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._hung_sockets = []
+        self._server = FakeUpstreamServer(('127.0.0.1', 0), FakeUpstreamHandler)
+        self._server.upstream = self
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self._server.server_address
+        return f"http://{host}:{port}/"
+
+    def file_url(self, size, name='book', cut=None, kind='pdf'):
+        """Link to a generated file of `size` bytes: a PDF, or with kind 'html' a page, or 'missing' a 404.
+
+        With `cut`, the server hangs up after that many bytes of a PDF.
+        """
+        url = f"{self.url}bundle/{size}/{name}.{kind}"
+        return f"{url}?cut={cut}" if cut else url
+
+    def redirect_url(self, target):
+        """Link that answers with a redirect to `target`"""
+        return f"{self.url}redirect?to={quote(target, safe='')}"
+
+    def request_latency(self):
+        if not self.jitter:
+            return self.latency
+        with self._lock:
+            return self.latency + self._random.uniform(0, self.jitter)
+
+    def page(self, name, query):
+        """A fixture page rewritten to list the book searched for.
+
+        The first two query words are taken as its title and the rest as
+        its author, in place of the recorded Pride and Prejudice results.
+        """
+        words = query.split()
+        title, author = ' '.join(words[:2]), ' '.join(words[2:]) or 'Unknown'
+        slug = lambda text: '-'.join(text.lower().split())
+        return (
+            self.pages[name]
+            .replace('Pride and Prejudice', html.escape(title)).replace('pride-and-prejudice', slug(title))
+            .replace('Austen, Jane', html.escape(author)).replace('Jane Austen', html.escape(author))
+            .replace('jane-austen', slug(author))
+        )
+
+    def has_book(self, source, query):
+        rate = self.find_rates.get(source, 1.0)
+        # Key on the title words only, so a source answers the same for every query shape
+        words = ' '.join(re.findall(r'[a-z0-9]+', query.lower())[:2])
+        return zlib.crc32(f"{source}|{words}".encode()) % 1000 < rate * 1000
+
+    def has_gutenberg_file(self, path):
+        """Like gutenberg.org: every ebook has its generated cache/epub PDF, a third a -pdf.pdf upload, none a bare .pdf"""
+        if path.startswith('/cache/epub/'):
+            return path.endswith('.pdf')
+        book_id = path.split('/')[2] if path.count('/') >= 3 else ''
+        return path.endswith('-pdf.pdf') and zlib.crc32(book_id.encode()) % 3 == 0
+
+    def should_throttle(self):
+        if not self.throttle_rate:
+            return False
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.throttle_rate, self._tokens + (now - self._tokens_at) * self.throttle_rate)
+            self._tokens_at = now
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return False
+            self.throttled += 1
+            return True
+
+    def should_fail(self):
+        if not self.error_rate:
+            return False
+        with self._lock:
+            return self._random.random() < self.error_rate
+
+    def count_request(self, method, route='other'):
+        with self._lock:
+            self.request_counts[method] = self.request_counts.get(method, 0) + 1
+            self.route_counts[route] = self.route_counts.get(route, 0) + 1
+
+    def reset_counts(self):
+        with self._lock:
+            self.request_counts = {'GET': 0, 'HEAD': 0}
+            self.route_counts = {}
+            self.throttled = 0
+
+    def dead_mirror(self):
+        """Return a URL on a free local port, so connections are refused"""
+        with socket.socket() as sock:
+            sock.bind(('127.0.0.1', 0))
+            port = sock.getsockname()[1]
+        return f"http://127.0.0.1:{port}/"
+
+    def hung_mirror(self):
+        """Return a URL that accepts connections but never answers"""
+        sock = socket.socket()
+        sock.bind(('127.0.0.1', 0))
+        sock.listen(1024)
+        self._hung_sockets.append(sock)
+        return f"http://127.0.0.1:{sock.getsockname()[1]}/"
+
+    def point(self, searcher, dead_mirrors=0, hung_mirrors=0):
+        """Redirect every source of a BookSearcher at this server.
+
+        Dead and hung LibGen mirrors are listed ahead of the working one.
+        """
+        searcher.ARCHIVE_URL = self.url
+        searcher.GUTENBERG_URL = self.url
+        searcher.PDFCOFFEE_URL = self.url
+        searcher.LIBGEN_MIRRORS = (
+            [self.dead_mirror() for _ in range(dead_mirrors)]
+            + [self.hung_mirror() for _ in range(hung_mirrors)]
+            + [self.url]
+        )
+        searcher.mount_host_pools()
+        return searcher
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+        for sock in self._hung_sockets:
+            sock.close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
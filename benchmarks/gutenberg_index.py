@@ -0,0 +1,121 @@
+"""Build, reload, query and refresh the offline Gutenberg index on the fixture catalog.
+
+Builds the index from benchmarks/fixtures/pg_catalog_sample.csv, saves it
+and loads it back, checks title/author queries with known answers (best
+edition first, non-text entries left out), then refreshes it from an
+edited copy of the catalog and checks that only the added, changed and
+removed ebooks were touched. Exits with an error if any check fails, and
+otherwise reports how long each step and an average query took.
+
+Usage: python -m benchmarks.gutenberg_index [--repeat 10000]
+"""
+import argparse
+import csv
+import os
+import tempfile
+import time
+from gutenberg_index import GutenbergIndex
+
+CATALOG = os.path.join(os.path.dirname(__file__), 'fixtures', 'pg_catalog_sample.csv')
+
+# (title, author, ids expected best first)
+QUERIES = [
+    # The English edition wins over the French one, then the longer title; the audiobook is not a text
+    ('Pride and Prejudice', 'Jane Austen', [1342, 42671, 37431]),
+    ('Frankenstein', 'Mary Shelley', [84]),
+    ('The Republic', 'Plato', [1497]),
+    ('Alice in Wonderland', 'Lewis Carroll', [11]),
+    ('Jane Eyre', 'Charlotte Bronte', [1260]),
+    ('The Great Gatsby', 'F. Scott Fitzgerald', [64317]),
+    ('Dracula', 'Jane Austen', []),
+    ('Moby Dick', 'Herman Melville', []),
+    ('Preventing the Children of Poor People', 'Jonathan Swift', []),
+]
+
+# The same queries after the refresh below
+REFRESHED_QUERIES = [
+    ('Dracula', 'Bram Stoker', []),
+    ('Moby Dick', 'Herman Melville', [2701]),
+    ('Preventing the Children of Poor People', 'Jonathan Swift', [1080]),
+    ('Pride and Prejudice', 'Jane Austen', [1342, 42671, 37431]),
+]
+
+
+def check(condition, message):
+    if not condition:
+        raise SystemExit(f"FAILED: {message}")
+
+
+def check_queries(index, queries, label):
+    for title, author, expected in queries:
+        found = index.search(title, author)
+        check(found == expected, f"{label}: {title!r} by {author!r} gave {found}, expected {expected}")
+
+
+def edit_catalog(source, target):
+    """Copy the catalog without Dracula, with a retitled ebook and with one new ebook"""
+    with open(source, newline='', encoding='utf-8') as f:
+        reader = csv.DictReader(f)
+        fields = reader.fieldnames
+        rows = [row for row in reader if row['Text#'] != '345']
+    for row in rows:
+        if row['Text#'] == '1080':
+            row['Title'] = 'A Modest Proposal for Preventing the Children of Poor People From Being a Burthen'
+    rows.append({'Text#': '2701', 'Type': 'Text', 'Issued': '2001-07-01', 'Title': 'Moby Dick; Or, The Whale',
+                 'Language': 'en', 'Authors': 'Melville, Herman, 1819-1891'})
+    with open(target, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.DictWriter(f, fields, restval='')
+        writer.writeheader()
+        writer.writerows(rows)
+
+
+def timed(step):
+    start = time.perf_counter()
+    result = step()
+    return result, (time.perf_counter() - start) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--repeat', type=int, default=10000, help='times each query is run for the timing')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'gutenberg_index.json.gz')
+        edited = os.path.join(tmp, 'pg_catalog_edited.csv')
+
+        index = GutenbergIndex()
+        counts, build_ms = timed(lambda: index.refresh(CATALOG))
+        check(counts == {'added': 11, 'changed': 0, 'removed': 0}, f"build counts {counts}")
+        check_queries(index, QUERIES, 'built')
+
+        _, save_ms = timed(lambda: index.save(path))
+        loaded, load_ms = timed(lambda: GutenbergIndex.load(path))
+        check(loaded.books == index.books, 'reloaded ebooks differ from the built ones')
+        check(loaded.title_index == index.title_index and loaded.author_index == index.author_index,
+              'reloaded postings differ from the built ones')
+        check_queries(loaded, QUERIES, 'reloaded')
+
+        edit_catalog(CATALOG, edited)
+        counts, refresh_ms = timed(lambda: loaded.refresh(edited))
+        check(counts == {'added': 1, 'changed': 1, 'removed': 1}, f"refresh counts {counts}")
+        check_queries(loaded, REFRESHED_QUERIES, 'refreshed')
+        check('dracula' not in loaded.title_index, "a removed ebook's title tokens are still indexed")
+        check(loaded.refresh(edited) == {'added': 0, 'changed': 0, 'removed': 0}, 'a second refresh changed entries')
+
+        loaded.save(path)
+        check_queries(GutenbergIndex.load(path), REFRESHED_QUERIES, 'refreshed and reloaded')
+
+        start = time.perf_counter()
+        for _ in range(args.repeat):
+            for title, author, _ in QUERIES:
+                loaded.search(title, author)
+        query_us = (time.perf_counter() - start) / (args.repeat * len(QUERIES)) * 1e6
+
+    print(f"All checks passed on {len(index)} fixture ebooks")
+    print(f"build {build_ms:.2f} ms, save {save_ms:.2f} ms, load {load_ms:.2f} ms, refresh {refresh_ms:.2f} ms, "
+          f"query {query_us:.1f} µs")
+
+
+if __name__ == '__main__':
+    main()
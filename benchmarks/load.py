@@ -0,0 +1,206 @@
+"""Load and latency benchmark against a local fake upstream.
+
+Drives BookSearcher.search_books directly and the Flask /search_books route
+over HTTP at several book-list sizes and client concurrencies, and reports
+throughput, p50/p95/p99 request latency, books resolved and outbound
+requests per search and per resolved book.
+
+Usage:
+    python -m benchmarks.load [--books 1 10 50] [--concurrency 1 8] [--requests 20]
+                              [--latency 0.05] [--jitter 0.05] [--error-rate 0.02]
+                              [--dead-mirrors 1] [--hung-mirrors 1] [--target searcher flask]
+                              [--mode all first_hit] [--find-rates archive=0.4,libgen=0.1]
+                              [--seed 1] [--json results.json]
+"""
+import argparse
+import json
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+import requests
+
+# Keep the harness off the on-disk cache and mirror health files
+os.environ.setdefault('BOOK_CACHE_PATH', '')
+os.environ.setdefault('BOOK_MIRROR_HEALTH_PATH', '')
+os.environ.setdefault('BOOK_SHARED_STATE_PATH', '')
+
+from book_searcher import BookSearcher
+from mirror_health import MirrorHealthTracker
+from politeness import PolitenessScheduler
+from search_cache import SearchCache
+from benchmarks.fake_upstream import FakeUpstream
+
+
+def percentile(values, fraction):
+    """Nearest-rank percentile of a list of numbers"""
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, max(0, int(round(fraction * len(ordered))) - 1))]
+
+
+def make_books(count, prefix):
+    # Unique titles per search so no lookup is served from cache
+    return [{'title': f'{prefix}b{i} Volume', 'author': f'Author {i}'} for i in range(count)]
+
+
+def make_searcher(upstream, args):
+    # Every fake source shares one host, so per-host pacing is left off to measure the engine
+    searcher = BookSearcher(cache=SearchCache(path=None), libgen_health=MirrorHealthTracker(path=None),
+                            politeness=PolitenessScheduler(scale=0))
+    return upstream.point(searcher, dead_mirrors=args.dead_mirrors, hung_mirrors=args.hung_mirrors)
+
+
+class SearcherTarget:
+    """Calls BookSearcher.search_books in-process"""
+
+    name = 'searcher'
+
+    def __init__(self, searcher, first_hit):
+        self.searcher = searcher
+        self.first_hit = first_hit
+
+    def search(self, books):
+        return self.searcher.search_books(books, first_hit=self.first_hit)
+
+    def close(self):
+        pass
+
+
+class FlaskTarget:
+    """Posts to /search_books on the Flask app served by a local threaded WSGI server"""
+
+    name = 'flask'
+
+    def __init__(self, searcher, first_hit):
+        from werkzeug.serving import make_server
+        import app as flask_app
+
+        flask_app.searcher = searcher
+        self._server = make_server('127.0.0.1', 0, flask_app.app, threaded=True)
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        self.url = f"http://127.0.0.1:{self._server.server_port}/search_books"
+        self.first_hit = first_hit
+        self._local = threading.local()
+
+    def search(self, books):
+        # One keep-alive session per client thread
+        session = getattr(self._local, 'session', None)
+        if session is None:
+            session = self._local.session = requests.Session()
+        response = session.post(self.url, json={'books': books, 'mode': 'first_hit' if self.first_hit else 'all'}, timeout=300)
+        response.raise_for_status()
+        return response.json()['results']
+
+    def close(self):
+        self._server.shutdown()
+
+
+def run_config(target, upstream, book_count, concurrency, request_count, prefix):
+    upstream.reset_counts()
+    latencies = []
+    found = 0
+    resolved = 0
+    errors = 0
+    lock = threading.Lock()
+
+    def one_search(number):
+        nonlocal found, resolved, errors
+        books = make_books(book_count, f'{prefix}r{number}')
+        start = time.perf_counter()
+        try:
+            results = target.search(books)
+        except Exception:
+            with lock:
+                errors += 1
+            return
+        elapsed = time.perf_counter() - start
+        with lock:
+            latencies.append(elapsed)
+            found += len(results)
+            resolved += len({(result['title'], result['author']) for result in results})
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        list(executor.map(one_search, range(request_count)))
+    wall = time.perf_counter() - start
+
+    outbound = sum(upstream.request_counts.values())
+    return {
+        'target': target.name,
+        'mode': 'first_hit' if target.first_hit else 'all',
+        'books': book_count,
+        'concurrency': concurrency,
+        'requests': request_count,
+        'errors': errors,
+        'seconds': round(wall, 3),
+        'searches_per_s': round(len(latencies) / wall, 2),
+        'books_per_s': round(len(latencies) * book_count / wall, 1),
+        'p50_ms': round(percentile(latencies, 0.50) * 1000, 1) if latencies else None,
+        'p95_ms': round(percentile(latencies, 0.95) * 1000, 1) if latencies else None,
+        'p99_ms': round(percentile(latencies, 0.99) * 1000, 1) if latencies else None,
+        'links_found': found,
+        'books_resolved': resolved,
+        'outbound_per_search': round(outbound / request_count, 1),
+        'outbound_per_resolved_book': round(outbound / resolved, 2) if resolved else None,
+        'outbound_by_route': dict(sorted(upstream.route_counts.items())),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--books', type=int, nargs='+', default=[1, 10, 50], help='books per search request')
+    parser.add_argument('--concurrency', type=int, nargs='+', default=[1, 8], help='concurrent clients')
+    parser.add_argument('--requests', type=int, default=20, help='search requests per configuration')
+    parser.add_argument('--latency', type=float, default=0.05, help='upstream latency per request in seconds')
+    parser.add_argument('--jitter', type=float, default=0.0, help='extra random upstream latency, up to this many seconds')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='fraction of upstream requests answered with 503')
+    parser.add_argument('--dead-mirrors', type=int, default=0, help='LibGen mirrors that refuse connections')
+    parser.add_argument('--hung-mirrors', type=int, default=0, help='LibGen mirrors that accept but never answer')
+    parser.add_argument('--target', nargs='+', choices=['searcher', 'flask'], default=['searcher', 'flask'])
+    parser.add_argument('--mode', nargs='+', choices=['all', 'first_hit'], default=['all'],
+                        help='query every source, or stop at the first link per book')
+    parser.add_argument('--find-rates', default='',
+                        help='share of books each upstream has, e.g. archive=0.4,gutenberg=0.6,libgen=0.15,pdfcoffee=0.1')
+    parser.add_argument('--seed', type=int, default=1, help='seed for upstream jitter and errors')
+    parser.add_argument('--json', help='also write the results to this file')
+    args = parser.parse_args()
+
+    logging.disable(logging.CRITICAL)
+
+    find_rates = {name: float(rate) for name, rate in (pair.split('=') for pair in args.find_rates.split(',') if pair)}
+
+    targets = {'searcher': SearcherTarget, 'flask': FlaskTarget}
+    rows = []
+    print(f"{'target':>8} {'mode':>9} {'books':>5} {'conc':>4} {'req':>4} {'err':>3} {'search/s':>8} {'books/s':>8} "
+          f"{'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'resolved':>8} {'out/search':>10} {'out/resolved':>12}")
+
+    with FakeUpstream(latency=args.latency, jitter=args.jitter, error_rate=args.error_rate, seed=args.seed,
+                      find_rates=find_rates) as upstream:
+        for target_name in args.target:
+            for mode in args.mode:
+                for book_count in args.books:
+                    for concurrency in args.concurrency:
+                        # A fresh searcher per configuration, so caches, mirror health and source stats start cold
+                        target = targets[target_name](make_searcher(upstream, args), mode == 'first_hit')
+                        try:
+                            row = run_config(target, upstream, book_count, concurrency, args.requests,
+                                             f'{target_name}{mode}{book_count}c{concurrency}')
+                        finally:
+                            target.close()
+                        rows.append(row)
+                        print(f"{row['target']:>8} {row['mode']:>9} {row['books']:>5} {row['concurrency']:>4} "
+                              f"{row['requests']:>4} {row['errors']:>3} {row['searches_per_s']:>8} {row['books_per_s']:>8} "
+                              f"{row['p50_ms'] or '-':>8} {row['p95_ms'] or '-':>8} {row['p99_ms'] or '-':>8} "
+                              f"{row['books_resolved']:>8} {row['outbound_per_search']:>10} "
+                              f"{row['outbound_per_resolved_book'] or '-':>12}")
+
+    if args.json:
+        settings = {key: value for key, value in vars(args).items() if key != 'json'}
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump({'settings': settings, 'results': rows}, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
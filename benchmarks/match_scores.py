@@ -0,0 +1,123 @@
+"""Score synthetic search results with the matcher and with the old first-two-words check.
+
+Each wanted book gets a page of candidates in random order: the right book
+in several disguises (listing decoration, URL slug, accents, subtitle,
+"Last, First" author) among near misses (a shared leading word, a sequel,
+the same title by another author) and unrelated books. Reports scoring
+speed, false positives accepted, and the probes each strategy spends
+before reaching the right book when it fetches its top 3 candidates.
+
+Usage: python -m benchmarks.match_scores [--books 300] [--candidates 12] [--seed 1]
+"""
+import argparse
+import random
+import time
+from matching import BookMatcher, slug_text
+
+SYLLABLES = ['ka', 'lo', 'mir', 'ten', 'vo', 'sa', 'rin', 'del', 'mo', 'ta', 'ber', 'us', 'na', 'gol', 'fi', 'ren']
+ACCENTS = str.maketrans({'a': 'á', 'e': 'é', 'o': 'ö', 'u': 'ü'})
+PROBES = 3
+
+
+def make_word(rng):
+    return ''.join(rng.choice(SYLLABLES) for _ in range(rng.randint(2, 3)))
+
+
+def make_book(rng):
+    words = [make_word(rng).capitalize() for _ in range(rng.randint(2, 4))]
+    if rng.random() < 0.3:
+        words.insert(0, 'The')
+    return ' '.join(words), f"{make_word(rng).capitalize()} {make_word(rng).capitalize()}"
+
+
+def right_candidates(rng, title, author):
+    """(text, author or None) variants of the wanted book as result pages show it"""
+    first, last = author.split()
+    return [
+        (title, author),
+        (f"[PDF] [EPUB] {title} Download", None),
+        (slug_text(f"https://example.com/{'-'.join(title.lower().split())}-{rng.randint(0, 99)}-pdf-free.html"), None),
+        (title.translate(ACCENTS), f"{last}, {first}, {rng.randint(1700, 1950)}-"),
+        (f"{title}: A Novel", author),
+    ]
+
+
+def wrong_candidates(rng, title, author):
+    """Near misses and unrelated books"""
+    words = title.split()
+    other_title, other_author = make_book(rng)
+    return [
+        (f"{words[0]} {make_word(rng).capitalize()} {make_word(rng).capitalize()}", author),
+        (f"{' '.join(words[:2])} {make_word(rng).capitalize()}", None),
+        (f"{title} Returns", other_author),
+        (title, other_author),
+        (other_title, other_author),
+        (other_title, None),
+    ]
+
+
+def make_pages(rng, books, candidates):
+    """One shuffled results page per book; candidates are (text, author, is_right)"""
+    pages = []
+    for _ in range(books):
+        title, author = make_book(rng)
+        right = [(text, listed, True) for text, listed in rng.sample(right_candidates(rng, title, author), 1)]
+        wrong = []
+        while len(wrong) < candidates - 1:
+            wrong.extend((text, listed, False) for text, listed in wrong_candidates(rng, title, author))
+        page = right + wrong[:candidates - 1]
+        rng.shuffle(page)
+        pages.append((title, author, page))
+    return pages
+
+
+def old_accepts(title, text):
+    # The check the scrapers used before: either of the first two title words appears in the text
+    return any(word.lower() in text.lower() for word in title.split()[:2])
+
+
+def pick_old(title, author, page):
+    return [candidate for candidate in page if old_accepts(title, candidate[0])][:PROBES]
+
+
+def pick_matcher(title, author, page):
+    return BookMatcher(title, author).rank([(candidate, candidate[0], candidate[1]) for candidate in page])[:PROBES]
+
+
+def evaluate(pick, pages):
+    start = time.perf_counter()
+    picks = [pick(title, author, page) for title, author, page in pages]
+    elapsed = time.perf_counter() - start
+
+    counts = {'found': 0, 'false_positives': 0, 'probes': 0, 'wasted_probes': 0}
+    for picked in picks:
+        counts['false_positives'] += sum(1 for candidate in picked if not candidate[2])
+        # Probes are spent in order until the right book turns up
+        for candidate in picked:
+            counts['probes'] += 1
+            if candidate[2]:
+                counts['found'] += 1
+                break
+            counts['wasted_probes'] += 1
+    counts['us_per_candidate'] = elapsed / sum(len(page) for _, _, page in pages) * 1e6
+    return counts
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--books', type=int, default=300, help='wanted books, one results page each')
+    parser.add_argument('--candidates', type=int, default=12, help='candidates per results page')
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+
+    pages = make_pages(random.Random(args.seed), args.books, args.candidates)
+    print(f"{args.books} books x {args.candidates} candidates = {args.books * args.candidates} candidates, top {PROBES} probed")
+    print(f"{'strategy':<16}{'found':>7}{'false pos':>11}{'probes':>8}{'wasted':>8}{'us/cand':>9}")
+    for name, pick in (('first two words', pick_old), ('matcher', pick_matcher)):
+        counts = evaluate(pick, pages)
+        print(f"{name:<16}{counts['found']:>7}{counts['false_positives']:>11}{counts['probes']:>8}"
+              f"{counts['wasted_probes']:>8}{counts['us_per_candidate']:>9.1f}")
+
+
+if __name__ == '__main__':
+    main()
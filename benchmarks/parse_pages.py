@@ -0,0 +1,141 @@
+"""Compare the lxml scraper parsers with the previous BeautifulSoup ones on saved fixture pages.
+
+Usage: python -m benchmarks.parse_pages [--repeat 200]
+"""
+import argparse
+import os
+import re
+import time
+from urllib.parse import urljoin
+from bs4 import BeautifulSoup
+from book_searcher import BookSearcher
+from search_cache import SearchCache
+
+FIXTURES = os.path.join(os.path.dirname(__file__), 'fixtures')
+PDFCOFFEE_URL = 'https://pdfcoffee.com/'
+LIBGEN_MIRROR = 'http://libgen.rs/'
+TITLE = 'Pride and Prejudice'
+AUTHOR = 'Jane Austen'
+
+
+# The full-page html.parser versions the scrapers used before, kept as the baseline
+
+def soup_gutenberg_book_ids(content):
+    soup = BeautifulSoup(content, 'html.parser')
+    book_ids = []
+    for result in soup.find_all('li', class_='booklink')[:3]:
+        link = result.find('a', href=True)
+        if not link:
+            continue
+        book_id_match = re.search(r'/ebooks/(\d+)', link.get('href'))
+        if book_id_match:
+            book_ids.append(book_id_match.group(1))
+    return book_ids
+
+
+def soup_libgen_results(content):
+    soup = BeautifulSoup(content, 'html.parser')
+    for table in soup.find_all('table'):
+        for row in table.find_all('tr')[1:][:3]:
+            cells = row.find_all('td')
+            if len(cells) < 5:
+                continue
+            for cell in cells:
+                for link in cell.find_all('a', href=True):
+                    href = link.get('href')
+                    if href and ('download' in href.lower() or 'get.php' in href or 'ads.php' in href):
+                        return href if href.startswith('http') else urljoin(LIBGEN_MIRROR, href)
+    return None
+
+
+def soup_pdfcoffee_results(content):
+    soup = BeautifulSoup(content, 'html.parser')
+    results = soup.find_all('div', class_=['item', 'result']) or soup.find_all('a', href=True)
+    for result in results[:5]:
+        link = result if result.name == 'a' else result.find('a', href=True)
+        if link:
+            href = link.get('href')
+            if href and 'pdfcoffee.com' in href and 'pride' in href.lower():
+                return href if href.startswith('http') else urljoin(PDFCOFFEE_URL, href)
+    return None
+
+
+def soup_oceanpdf_results(content):
+    soup = BeautifulSoup(content, 'html.parser')
+    articles = soup.find_all('article') or soup.find_all('div', class_=['post', 'entry'])
+    book_urls = []
+    for article in articles[:3]:
+        for link in article.find_all('a', href=True):
+            href = link.get('href')
+            if href and 'oceanofpdf.com' in href and any(word in href.lower() for word in TITLE.lower().split()[:2]):
+                book_urls.append(href)
+                break
+    return book_urls
+
+
+def soup_oceanpdf_download_link(content):
+    soup = BeautifulSoup(content, 'html.parser')
+    for button in soup.find_all('input', {'type': 'image'}):
+        if 'pdf-button' in button.get('src', '') or button.get('alt', '').lower() == 'submit':
+            parent_form = button.find_parent('form')
+            if parent_form:
+                action = parent_form.get('action', '')
+                if 'Fetching_Resource.php' in action or not action:
+                    return urljoin('https://oceanofpdf.com/', action) if action else 'https://oceanofpdf.com/Fetching_Resource.php'
+    for form in soup.find_all('form'):
+        if 'Fetching_Resource.php' in form.get('action', ''):
+            return urljoin('https://oceanofpdf.com/', form.get('action'))
+    for link in soup.find_all('a', href=True):
+        if 'Fetching_Resource.php' in link.get('href'):
+            return urljoin('https://oceanofpdf.com/', link.get('href'))
+    return None
+
+
+def make_pages(searcher):
+    # (source, fixture page, previous parser, current parser)
+    return [
+        ('Project Gutenberg', 'gutenberg_search.html', soup_gutenberg_book_ids,
+         lambda content: searcher._parse_gutenberg_book_ids(content, TITLE, AUTHOR)),
+        ('LibGen', 'libgen_search.html', soup_libgen_results,
+         lambda content: searcher._parse_libgen_results(content, LIBGEN_MIRROR, TITLE, AUTHOR)),
+        ('PDF Coffee', 'pdfcoffee_search.html', soup_pdfcoffee_results,
+         lambda content: searcher._parse_pdfcoffee_results(content, TITLE, AUTHOR)),
+        ('OceanOfPDF search', 'oceanpdf_search.html', soup_oceanpdf_results,
+         lambda content: searcher._parse_oceanpdf_results(content, TITLE, AUTHOR)),
+        ('OceanOfPDF book', 'oceanpdf_book.html', soup_oceanpdf_download_link,
+         searcher._parse_oceanpdf_download_link),
+    ]
+
+
+def time_per_page(parse, content, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        result = parse(content)
+    return (time.perf_counter() - start) / repeat * 1000, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--repeat', type=int, default=200, help='parses per page and parser')
+    args = parser.parse_args()
+
+    searcher = BookSearcher(cache=SearchCache(path=None))
+    searcher.PDFCOFFEE_URL = PDFCOFFEE_URL
+
+    print(f"{'source':<20}{'KB':>6}{'html.parser':>14}{'lxml':>12}{'speedup':>10}")
+    for source, fixture, previous, current in make_pages(searcher):
+        with open(os.path.join(FIXTURES, fixture), 'rb') as f:
+            content = f.read()
+
+        previous_ms, expected = time_per_page(previous, content, args.repeat)
+        current_ms, result = time_per_page(current, content, args.repeat)
+        # The current parsers rank results by match score, so they may pick a
+        # different result than the positional baseline, but never none
+        if bool(result) != bool(expected):
+            raise SystemExit(f"{source}: lxml parser returned {result!r}, html.parser returned {expected!r}")
+
+        print(f"{source:<20}{len(content) / 1024:>6.0f}{previous_ms:>11.2f} ms{current_ms:>9.2f} ms{previous_ms / current_ms:>9.1f}x")
+
+
+if __name__ == '__main__':
+    main()
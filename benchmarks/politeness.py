@@ -0,0 +1,93 @@
+"""Search a fake upstream that throttles, with and without per-host pacing.
+
+The fake upstream answers 429 with a Retry-After once requests go over
+--server-rate per second (after a burst of as many). Three schedulers are
+compared on the same searches:
+
+    unpaced     no pacing and no retries; throttled lookups come back empty
+    retry only  no pacing, but throttled requests wait out Retry-After and retry
+    paced       the host is kept under --client-rate, with retries as above
+
+Reports the time taken, requests sent, 429s received, links found (every
+source has every book) and books resolved.
+
+Usage: python -m benchmarks.politeness [--searches 6] [--books 20] [--concurrency 3]
+                                       [--server-rate 20] [--client-rate 18] [--latency 0.05]
+"""
+import argparse
+import logging
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlparse
+
+os.environ.setdefault('BOOK_CACHE_PATH', '')
+os.environ.setdefault('BOOK_MIRROR_HEALTH_PATH', '')
+
+from book_searcher import BookSearcher
+from mirror_health import MirrorHealthTracker
+from politeness import PolitenessScheduler
+from search_cache import SearchCache
+from benchmarks.fake_upstream import FakeUpstream
+from benchmarks.load import make_books
+
+
+def make_scheduler(name):
+    if name == 'unpaced':
+        return PolitenessScheduler(scale=0, max_retries=0)
+    if name == 'retry only':
+        return PolitenessScheduler(scale=0)
+    return PolitenessScheduler()
+
+
+def run(name, args):
+    with FakeUpstream(latency=args.latency, throttle_rate=args.server_rate) as upstream:
+        searcher = BookSearcher(cache=SearchCache(path=None), libgen_health=MirrorHealthTracker(path=None),
+                                politeness=make_scheduler(name))
+        upstream.point(searcher)
+        if name == 'paced':
+            # Every fake source shares one host, paced here as a whole
+            searcher.politeness.configure(urlparse(upstream.url).netloc, args.client_rate)
+
+        def one_search(number):
+            books = make_books(args.books, f"{name.replace(' ', '')}s{number}")
+            return searcher.search_books(books)
+
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=args.concurrency) as executor:
+            results = [result for found in executor.map(one_search, range(args.searches)) for result in found]
+        wall = time.perf_counter() - start
+
+        return {
+            'scheduler': name,
+            'seconds': round(wall, 2),
+            'requests': sum(upstream.request_counts.values()),
+            'throttled': upstream.throttled,
+            'retries': searcher.politeness.stats()['retries'],
+            'links': len(results),
+            'resolved': len({(result['title'], result['author']) for result in results}),
+            'wanted': args.searches * args.books,
+        }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--searches', type=int, default=6, help='search requests, each for its own books')
+    parser.add_argument('--books', type=int, default=20, help='books per search request')
+    parser.add_argument('--concurrency', type=int, default=3, help='search requests running at once')
+    parser.add_argument('--server-rate', type=float, default=20, help='requests per second the upstream allows')
+    parser.add_argument('--client-rate', type=float, default=18, help='requests per second the paced searcher sends')
+    parser.add_argument('--latency', type=float, default=0.05, help='upstream latency per request in seconds')
+    args = parser.parse_args()
+
+    logging.disable(logging.CRITICAL)
+
+    print(f"{'scheduler':<11}{'seconds':>9}{'requests':>10}{'429s':>7}{'retries':>9}{'links':>7}{'resolved':>10}")
+    for name in ('unpaced', 'retry only', 'paced'):
+        row = run(name, args)
+        print(f"{row['scheduler']:<11}{row['seconds']:>9}{row['requests']:>10}{row['throttled']:>7}{row['retries']:>9}"
+              f"{row['links']:>7}{row['resolved']:>6}/{row['wanted']}")
+
+
+if __name__ == '__main__':
+    main()
@@ -1,14 +1,100 @@
 import requests
 import logging
-from bs4 import BeautifulSoup
-from concurrent.futures import ThreadPoolExecutor, as_completed
-from urllib.parse import quote, urljoin
+from concurrent.futures import ThreadPoolExecutor, as_completed, wait, FIRST_COMPLETED
+from functools import partial
+from urllib.parse import quote, urljoin, urlparse
 import time
 import json
+import os
 import re
+from search_cache import SearchCache, CACHE_MISS, normalize_key, normalize_text
+from deadline import Deadline, DeadlineExceeded
+from gutenberg_index import load_shared_index, DEFAULT_INDEX_PATH
+from singleflight import SingleFlight
+from pools import Bulkhead, mount_host_pools, host_pool_stats
+from mirror_health import MirrorHealthTracker
+from html_parsing import parse_html, has_class, first
+from matching import BookMatcher, slug_text, title_tokens, author_tokens
+from metrics import SearchMetrics, RequestTimings
+from source_scheduler import SourceScheduler
+from link_verifier import LinkVerifier
+from politeness import PolitenessScheduler, HostThrottled
 
 class BookSearcher:
-    def __init__(self):
+    # Upstream endpoints; instances may override these to target local fake upstreams
+    ARCHIVE_URL = 'https://archive.org/'
+    GUTENBERG_URL = 'https://www.gutenberg.org/'
+    PDFCOFFEE_URL = 'https://pdfcoffee.com/'
+    LIBGEN_MIRRORS = [
+        'https://libgen.is/',
+        'https://libgen.li/',
+        'https://libgen.st/'
+    ]
+    
+    # Worker threads per source; each source runs in its own pool (bulkhead)
+    SOURCE_CONCURRENCY = {
+        'Internet Archive': 8,
+        'Project Gutenberg': 6,
+        'LibGen': 3,
+        'PDF Coffee': 3,
+    }
+    
+    # Keep-alive connections held open per upstream host
+    HOST_POOL_SIZE = {
+        'Internet Archive': 32,
+        'Project Gutenberg': 12,
+        'LibGen': 6,
+        'PDF Coffee': 6,
+    }
+    
+    # Requests per second allowed to each upstream host, before BOOK_HOST_RATE_SCALE
+    HOST_RATE = {
+        'Internet Archive': 8,
+        'Project Gutenberg': 4,
+        'LibGen': 2,
+        'PDF Coffee': 2,
+    }
+    
+    # Send a second LibGen request once the first is slower than its mirror's p90
+    LIBGEN_HEDGING = True
+    
+    # Internet Archive lookups are combined into OR'ed queries of this many books
+    ARCHIVE_BATCH_SIZE = 25
+    ARCHIVE_BATCH_MIN = 2
+    
+    def __init__(self, cache=None, request_deadline=None, source_budget=None, gutenberg_index=None, inflight=None,
+                 libgen_health=None, metrics=None, scheduler=None, first_hit=None, link_verifier=None, politeness=None):
+        self.cache = cache if cache is not None else SearchCache.from_env()
+        
+        # Lookup and upstream request metrics, served on /metrics
+        self.metrics = metrics if metrics is not None else SearchMetrics()
+        
+        # Identical lookups running in concurrent requests share one scrape
+        self.inflight = inflight if inflight is not None else SingleFlight()
+        
+        # Offline Gutenberg catalog; without one, Gutenberg is scraped live
+        if gutenberg_index is None:
+            gutenberg_index = load_shared_index(os.environ.get('BOOK_GUTENBERG_INDEX', DEFAULT_INDEX_PATH))
+        self.gutenberg_index = gutenberg_index
+        
+        # Whole-request deadline and the share of it any one source may use
+        if request_deadline is None:
+            request_deadline = float(os.environ.get('BOOK_SEARCH_DEADLINE', 45))
+        if source_budget is None:
+            source_budget = float(os.environ.get('BOOK_SOURCE_BUDGET', 25))
+        self.request_deadline = request_deadline
+        self.source_budget = source_budget
+        
+        # Learned per-source hit rate and cost; in first-hit mode it decides
+        # which source each book tries next
+        self.scheduler = scheduler if scheduler is not None else SourceScheduler.from_env()
+        if first_hit is None:
+            first_hit = os.environ.get('BOOK_SEARCH_MODE', 'all') == 'first_hit'
+        self.first_hit = first_hit
+        
+        # LibGen mirror health is shared by every request and kept across restarts
+        self.libgen_health = libgen_health if libgen_health is not None else MirrorHealthTracker.from_env()
+        
         self.session = requests.Session()
         self.session.headers.update({
             'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36',
@@ -19,9 +105,96 @@ class BookSearcher:
             'Upgrade-Insecure-Requests': '1',
         })
         
-    def search_books(self, books):
+        # Outbound requests are paced per host and retried when throttled
+        self.politeness = politeness if politeness is not None else PolitenessScheduler.from_env()
+        
+        # Found links are re-checked off the request path once they age
+        self.link_verifier = link_verifier if link_verifier is not None else LinkVerifier.from_env(self.cache, self.session, self.politeness)
+        
+        # Sources queried for every book, in submission order
+        self.sources = [
+            ('Internet Archive', self.search_internet_archive),
+            ('Project Gutenberg', self.search_project_gutenberg),
+            ('LibGen', self.search_libgen),
+            ('PDF Coffee', self.search_pdfcoffee),
+        ]
+        
+        self._start_engine()
+    
+    def _start_engine(self):
+        """Build the thread pools and per-host connection pools the threaded engine runs on"""
+        # Shared pool for fetching Internet Archive item metadata concurrently
+        self._metadata_executor = ThreadPoolExecutor(max_workers=8)
+        
+        # Shared pool for racing LibGen mirrors
+        self._hedge_executor = ThreadPoolExecutor(max_workers=8)
+        
+        # Shared pool for probing candidate Gutenberg PDFs in parallel
+        self._probe_executor = ThreadPoolExecutor(max_workers=8)
+        
+        # Long-lived per-source worker pools shared by every request
+        self.bulkheads = {
+            source: Bulkhead(source, self.SOURCE_CONCURRENCY.get(source, 4))
+            for source, _ in self.sources
+        }
+        self.mount_host_pools()
+        
+    def source_hosts(self):
+        """Hosts (with any port) of the configured sources, which their results link to"""
+        urls = [self.ARCHIVE_URL, self.GUTENBERG_URL, self.PDFCOFFEE_URL, 'https://oceanofpdf.com/'] + list(self.LIBGEN_MIRRORS)
+        return {urlparse(url).netloc.lower() for url in urls}
+    
+    def _source_urls(self):
+        return {
+            'Internet Archive': [self.ARCHIVE_URL],
+            'Project Gutenberg': [self.GUTENBERG_URL],
+            'LibGen': self.LIBGEN_MIRRORS,
+            'PDF Coffee': [self.PDFCOFFEE_URL],
+        }
+    
+    def mount_host_pools(self):
+        """(Re)mount per-host connection pools and request rates for the configured upstream URLs"""
+        source_urls = self._source_urls()
+        host_pool_sizes = {}
+        for source, urls in source_urls.items():
+            for url in urls:
+                # Hosts shared by several sources get the largest pool asked for
+                host_pool_sizes[url] = max(host_pool_sizes.get(url, 0), self.HOST_POOL_SIZE.get(source, 10))
+        self.host_pools = mount_host_pools(self.session, host_pool_sizes, self.metrics)
+        self.pace_hosts()
+    
+    def pace_hosts(self):
+        """Set the request rate of each configured upstream host"""
+        source_urls = self._source_urls()
+        host_rates = {}
+        for source, urls in source_urls.items():
+            for url in urls:
+                # Hosts shared by several sources get the largest rate asked for
+                host = urlparse(url).netloc
+                host_rates[host] = max(host_rates.get(host, 0), self.HOST_RATE.get(source, 4))
+        for host, rate in host_rates.items():
+            self.politeness.configure(host, rate)
+    
+    def pool_stats(self):
+        """Per-host connection pool usage and per-source worker queue depth"""
+        return {
+            'hosts': host_pool_stats(self.host_pools),
+            'sources': {source: bulkhead.stats() for source, bulkhead in self.bulkheads.items()},
+        }
+        
+    def search_books(self, books, deadline=None, first_hit=None):
         """Search for books across all sources in parallel"""
+        return self.search_books_report(books, deadline, first_hit)['results']
+    
+    def search_books_report(self, books, deadline=None, first_hit=None):
+        """Search for books and report lookups cut short by the deadline.
+
+        Returns {'results': [...], 'timed_out': [...], 'sources': {...}, 'timings': {...}}.
+        """
+        start = time.perf_counter()
         results = []
+        timed_out = []
+        sources = {}
         
         # Add demo results for common classic books to show functionality
         demo_books = {
@@ -63,44 +236,306 @@ class BookSearcher:
         # Skip demo results if we want real-time searches only
         
         # Otherwise, try real searches
-        with ThreadPoolExecutor(max_workers=10) as executor:
-            # Submit all search tasks
-            future_to_book = {}
+        for event, payload in self.iter_search_books(books, deadline, first_hit):
+            if event == 'result':
+                results.append(payload)
+            elif event == 'timeout':
+                timed_out.append(payload)
+            elif event == 'summary':
+                sources = payload
+        
+        return {'results': results, 'timed_out': timed_out, 'sources': sources,
+                'timings': self._timings_report(sources, time.perf_counter() - start)}
+    
+    def _timings_report(self, sources, elapsed):
+        """Per-request breakdown of lookup time by source"""
+        return {
+            'total_seconds': round(elapsed, 3),
+            'sources': {
+                source: {'seconds': counts['seconds'], 'slowest_seconds': counts['slowest_seconds']}
+                for source, counts in sources.items()
+            },
+        }
+    
+    def _get(self, url, deadline=None, limit=15):
+        """GET a URL through the per-host pacing, with a timeout of `limit` clipped to the deadline"""
+        return self.politeness.request(self.session, 'GET', url, deadline, limit)
+    
+    def _run_source(self, search, source, title, author, deadline, timings=None):
+        """Run one source lookup, recording its latency and outcome"""
+        start = time.perf_counter()
+        outcome = 'error'
+        try:
+            result = self._run_source_shared(search, source, title, author, deadline)
+            if result and self.link_verifier.is_bad(result):
+                # A link already found dead is as good as none
+                result = None
+            outcome = 'found' if result else 'not_found'
+            return result
+        except DeadlineExceeded:
+            outcome = 'timeout'
+            raise
+        finally:
+            elapsed = time.perf_counter() - start
+            self.metrics.observe_lookup(source, outcome, elapsed)
+            self.scheduler.record(source, outcome == 'found', elapsed)
+            if timings is not None:
+                timings.add(source, elapsed)
+    
+    def _run_source_shared(self, search, source, title, author, deadline):
+        def lookup():
+            try:
+                return search(title, author, deadline)
+            except Exception:
+                # A request cut short by the budget is a timeout, not an upstream error
+                if deadline.expired():
+                    raise DeadlineExceeded('source budget exceeded')
+                raise
+        
+        key = normalize_key(title, author, source)
+        try:
+            try:
+                return self.inflight.do(key, lookup, timeout=deadline.remaining())
+            except HostThrottled:
+                # Asking the same host again at once would only be throttled again
+                raise
+            except DeadlineExceeded:
+                # A shared lookup that ran out of another request's budget is
+                # retried on ours while we still have time left
+                if deadline.expired():
+                    raise
+                return self.inflight.do(key, lookup, timeout=deadline.remaining())
+        except TimeoutError:
+            raise DeadlineExceeded('source budget exceeded')
+    
+    def _unique_books(self, books):
+        """Return (book, title, author) for each searchable book, dropping blanks and repeats"""
+        entries = []
+        seen = set()
+        for book in books:
+            title = book['title'].strip()
+            author = book['author'].strip()
             
-            for book in books:
-                title = book['title'].strip()
-                author = book['author'].strip()
-                
-                if not title or not author:
+            if not title or not author:
+                continue
+            
+            # A book listed twice is only searched once
+            book_key = (normalize_text(title), normalize_text(author))
+            if book_key in seen:
+                continue
+            seen.add(book_key)
+            entries.append((book, title, author))
+        return entries
+    
+    def _lookup_cache(self, entries, source_names):
+        """Check the cache once for every book and source; returns {(id(book), source): link or CACHE_MISS}.
+
+        Cached links are served as they are and handed to the link verifier,
+        which re-checks them in the background once they are old enough.
+        """
+        cached = {}
+        for book, title, author in entries:
+            for source in source_names:
+                value = self.cache.get_with_age(title, author, source)
+                if value is not CACHE_MISS:
+                    link, age = value
+                    if link and self.link_verifier.is_bad(link):
+                        # Evicted while this entry was being stored; look it up again
+                        value = CACHE_MISS
+                    else:
+                        self.link_verifier.refresh(title, author, source, link, age)
+                        value = link
+                self.metrics.observe_cache(source, value is not CACHE_MISS)
+                cached[(id(book), source)] = value
+        return cached
+    
+    def _plan_stages(self, first_hit):
+        """Group sources into the stages a search runs in.
+
+        Normally every source runs at once. In first-hit mode each stage is
+        one source, in the scheduler's order, so a book found early never
+        reaches the sources after it.
+        """
+        source_names = [source for source, _ in self.sources]
+        if first_hit:
+            return [[source] for source in self.scheduler.order(source_names)]
+        return [source_names]
+    
+    def _new_summary(self, source_names):
+        return {source: {'found': 0, 'not_found': 0, 'errors': 0, 'cached': 0, 'timed_out': 0} for source in source_names}
+    
+    def _first_hit_cached(self, entries, stages, cached, summary, resolved):
+        """Return ('result', ...) events for books a link is already cached for, marking them resolved"""
+        events = []
+        # A link already cached for any source settles the book up front
+        for book, title, author in entries:
+            for stage in stages:
+                source = stage[0]
+                link = cached[(id(book), source)]
+                if link is not CACHE_MISS and link:
+                    summary[source]['cached'] += 1
+                    summary[source]['found'] += 1
+                    resolved.add(id(book))
+                    events.append(('result', {'title': book['title'], 'author': book['author'], 'source': source, 'link': link}))
+                    break
+        return events
+    
+    def _serve_cached(self, entries, stage, cached, searches, summary, resolved):
+        """Split a stage into events for cached answers and the (book, title, author, source, search) lookups left to run"""
+        events = []
+        lookups = []
+        for book, title, author in entries:
+            if id(book) in resolved:
+                continue
+            for source in stage:
+                link = cached[(id(book), source)]
+                if link is CACHE_MISS:
+                    lookups.append((book, title, author, source, searches[source]))
                     continue
                 
-                # Submit search tasks for each source
-                future_archive = executor.submit(self.search_internet_archive, title, author)
-                future_gutenberg = executor.submit(self.search_project_gutenberg, title, author)
-                future_libgen = executor.submit(self.search_libgen, title, author)
-                future_pdfcoffee = executor.submit(self.search_pdfcoffee, title, author)
+                summary[source]['cached'] += 1
+                if link:
+                    summary[source]['found'] += 1
+                    events.append(('result', {'title': book['title'], 'author': book['author'], 'source': source, 'link': link}))
+                else:
+                    summary[source]['not_found'] += 1
+        return events, lookups
+    
+    def _unreached(self, lookups, summary):
+        """Timeout events for lookups never started because the deadline passed first"""
+        return [self._timeout_event(book, source, summary)[:2] for book, title, author, source, _ in lookups]
+    
+    def _timeout_event(self, book_info, source, summary):
+        summary[source]['timed_out'] += 1
+        return 'timeout', {'title': book_info['title'], 'author': book_info['author'], 'source': source}, book_info
+    
+    def _finish_lookup(self, book_info, source, result, summary):
+        """Count and cache a finished lookup and return its (event, payload, book) events.
+
+        `result` returns the lookup's link or raises what the lookup raised;
+        only answers are cached, never timeouts or errors.
+        """
+        try:
+            link = result()
+        except DeadlineExceeded:
+            return [self._timeout_event(book_info, source, summary)]
+        except Exception as e:
+            summary[source]['errors'] += 1
+            logging.error(f"Error searching {source} for {book_info['title']}: {str(e)}")
+            return []
+        
+        self.cache.set(book_info['title'].strip(), book_info['author'].strip(), source, link)
+        if not link:
+            summary[source]['not_found'] += 1
+            return []
+        summary[source]['found'] += 1
+        return [('result', {'title': book_info['title'], 'author': book_info['author'], 'source': source, 'link': link}, book_info)]
+    
+    def iter_search_books(self, books, deadline=None, first_hit=None):
+        """Yield ('result', result) as each lookup lands, then ('summary', per-source counts).
+
+        Lookups still running when the deadline passes are cancelled and
+        reported as ('timeout', {'title', 'author', 'source'}) events. The
+        summary also gives each source's total and slowest lookup time.
+        With first_hit, each book stops at the first source that finds it.
+        """
+        first_hit = self.first_hit if first_hit is None else first_hit
+        deadline = Deadline(self.request_deadline if deadline is None else deadline)
+        searches = dict(self.sources)
+        summary = self._new_summary(searches)
+        timings = RequestTimings()
+        submitted = []
+        try:
+            entries = self._unique_books(books)
+            stages = self._plan_stages(first_hit)
+            cached = self._lookup_cache(entries, list(searches))
+            resolved = set()
+            
+            if first_hit:
+                yield from self._first_hit_cached(entries, stages, cached, summary, resolved)
+            
+            for stage in stages:
+                events, lookups = self._serve_cached(entries, stage, cached, searches, summary, resolved)
+                yield from events
+                
+                if deadline.expired():
+                    yield from self._unreached(lookups, summary)
+                    continue
                 
-                future_to_book[future_archive] = (book, 'Internet Archive')
-                future_to_book[future_gutenberg] = (book, 'Project Gutenberg')
-                future_to_book[future_libgen] = (book, 'LibGen')
-                future_to_book[future_pdfcoffee] = (book, 'PDF Coffee')
+                for event, payload, book in self._run_lookups(lookups, deadline, summary, timings, submitted):
+                    if event == 'result':
+                        resolved.add(id(book))
+                    yield event, payload
             
-            # Collect results
-            for future in as_completed(future_to_book):
+            yield 'summary', timings.merge_into(summary)
+        finally:
+            # A closed stream (e.g. client disconnect) drops queued lookups
+            for future in submitted:
+                future.cancel()
+    
+    def _run_lookups(self, lookups, deadline, summary, timings, submitted):
+        """Run (book, title, author, source, search) lookups, yielding (event, payload, book) as each finishes"""
+        future_to_book = {}
+        
+        # Batch queries are queued ahead of every per-book task, so a
+        # task waiting on its batch never blocks a worker the batch needs
+        planned = {}
+        for chunk in self._plan_archive_batches(lookups):
+            batch = [(lookups[i][1], lookups[i][2]) for i in chunk]
+            batch_future = self.bulkheads['Internet Archive'].submit(
+                self.search_internet_archive_batch, batch, deadline.child(self.source_budget)
+            )
+            submitted.append(batch_future)
+            for position, i in enumerate(chunk):
+                planned[i] = partial(self._search_internet_archive_planned, batch_future, position)
+        
+        for i, (book, title, author, source, search) in enumerate(lookups):
+            budget = deadline.child(self.source_budget)
+            future = self.bulkheads[source].submit(self._run_source, planned.get(i, search), source, title, author, budget, timings)
+            submitted.append(future)
+            future_to_book[future] = (book, source)
+        
+        # Collect results as soon as each source finishes
+        pending = set(future_to_book)
+        try:
+            for future in as_completed(future_to_book, timeout=deadline.remaining()):
+                pending.discard(future)
                 book_info, source = future_to_book[future]
-                try:
-                    result = future.result(timeout=30)
-                    if result:
-                        results.append({
-                            'title': book_info['title'],
-                            'author': book_info['author'],
-                            'source': source,
-                            'link': result
-                        })
-                except Exception as e:
-                    logging.error(f"Error searching {source} for {book_info['title']}: {str(e)}")
+                yield from self._finish_lookup(book_info, source, future.result, summary)
+        except TimeoutError:
+            # Queued lookups are cancelled outright; running ones see their
+            # expired deadline before their next outbound call
+            logging.warning(f"Search deadline exceeded with {len(pending)} lookups outstanding")
+            for future in pending:
+                future.cancel()
+                book_info, source = future_to_book[future]
+                yield self._timeout_event(book_info, source, summary)
+    
+    def _parse_oceanpdf_results(self, content, title, author):
+        """Return links to the best matching book pages of an OceanOfPDF search page, best first"""
+        doc = parse_html(content)
+        if doc is None:
+            return []
+        
+        # Look for search results - find article links
+        articles = doc.xpath('//article') or doc.xpath(f'//div[{has_class("post", "entry")}]')
         
-        return results
+        candidates = []
+        seen = set()
+        for article in articles[:10]:  # Score the first 10 results
+            for link in article.xpath('.//a[contains(@href, "oceanofpdf.com")]'):
+                href = link.get('href')
+                if href in seen:
+                    continue
+                seen.add(href)
+                
+                # Book pages live under /authors/<author-slug>/
+                author_slug = re.search(r'/authors/([^/]+)/', href)
+                listed = author_slug.group(1).replace('-', ' ') if author_slug else None
+                candidates.append((href, [link.text_content(), slug_text(href)], listed))
+        
+        # Only the 3 best are worth a book page fetch
+        return BookMatcher(title, author).rank(candidates)[:3]
     
     def search_oceanpdf(self, title, author):
         """Search OceanOfPDF for a book using the proper flow"""
@@ -110,203 +545,365 @@ class BookSearcher:
             
             logging.info(f"Searching OceanOfPDF: {search_url}")
             
-            response = self.session.get(search_url, timeout=15)
+            response = self._get(search_url)
             response.raise_for_status()
             
-            soup = BeautifulSoup(response.content, 'html.parser')
-            
-            # Look for search results - find article links
-            articles = soup.find_all('article') or soup.find_all('div', class_=['post', 'entry'])
-            
-            for article in articles[:3]:  # Check first 3 results
-                # Find the book page link
-                title_link = None
-                links = article.find_all('a', href=True)
-                for link in links:
-                    href = link.get('href')
-                    if href and 'oceanofpdf.com' in href and any(word in href.lower() for word in title.lower().split()[:2]):
-                        title_link = link
-                        break
-                
-                if not title_link:
-                    continue
-                
-                book_url = title_link.get('href')
-                if not book_url:
-                    continue
-                
+            failure = None
+            for book_url in self._parse_oceanpdf_results(response.content, title, author):
                 # Visit the book page to find the download form
-                pdf_link = self._get_oceanpdf_download_link(book_url)
+                try:
+                    pdf_link = self._get_oceanpdf_download_link(book_url)
+                except Exception as page_error:
+                    failure = page_error
+                    continue
                 if pdf_link:
                     return pdf_link
             
+            # A page that could not be read may have held the link
+            if failure is not None:
+                raise failure
             return None
             
         except Exception as e:
             logging.error(f"Error searching OceanOfPDF: {str(e)}")
+            raise
+    
+    def _parse_oceanpdf_download_link(self, content):
+        """Return the PDF download URL from an OceanOfPDF book page"""
+        doc = parse_html(content)
+        if doc is None:
             return None
+        
+        # Look for the image submit button as described: 
+        # <input style="width: 141px; height: 192px;" alt="Submit" src="https://media.oceanofpdf.com/pdf-button.jpg" type="image">
+        for button in doc.xpath('//input[@type="image"]'):
+            src = button.get('src', '')
+            alt = button.get('alt', '')
+            
+            # Check if this is the PDF download button
+            if 'pdf-button' in src or alt.lower() == 'submit':
+                # This button should lead to Fetching_Resource.php
+                # We need to construct the proper download URL
+                parent_form = first(button, 'ancestor::form')
+                if parent_form is not None:
+                    action = parent_form.get('action', '')
+                    
+                    if 'Fetching_Resource.php' in action or not action:
+                        # Return the fetching resource URL
+                        base_url = 'https://oceanofpdf.com/'
+                        if action:
+                            return urljoin(base_url, action)
+                        return base_url + 'Fetching_Resource.php'
+        
+        # Fallback: look for any form that might lead to the download
+        for action in doc.xpath('//form/@action'):
+            if 'Fetching_Resource.php' in action:
+                return urljoin('https://oceanofpdf.com/', action)
+        
+        # If no form found, try to find direct links to Fetching_Resource.php
+        for href in doc.xpath('//a/@href'):
+            if 'Fetching_Resource.php' in href:
+                return urljoin('https://oceanofpdf.com/', href)
+        
+        return None
     
     def _get_oceanpdf_download_link(self, book_url):
         """Extract PDF download link from OceanOfPDF book page using the proper flow"""
         try:
-            response = self.session.get(book_url, timeout=15)
+            response = self._get(book_url)
             response.raise_for_status()
             
-            soup = BeautifulSoup(response.content, 'html.parser')
+            return self._parse_oceanpdf_download_link(response.content)
             
-            # Look for the image submit button as described: 
-            # <input style="width: 141px; height: 192px;" alt="Submit" src="https://media.oceanofpdf.com/pdf-button.jpg" type="image">
-            image_buttons = soup.find_all('input', {'type': 'image'})
-            for button in image_buttons:
-                src = button.get('src', '')
-                alt = button.get('alt', '')
+        except Exception as e:
+            logging.error(f"Error getting OceanOfPDF download link: {str(e)}")
+            raise
+    
+    def _libgen_search_url(self, mirror, title, author):
+        search_query = f"{title} {author}"
+        return f"{mirror}search.php?req={quote(search_query)}&lg_topic=libgen&open=0&view=simple&res=25&phrase=1&column=def"
+    
+    def _parse_libgen_results(self, content, mirror, title, author):
+        """Return the download link of the best matching row in a LibGen results page"""
+        doc = parse_html(content)
+        if doc is None:
+            return None
+        
+        # Find results table
+        candidates = []
+        for table in doc.iter('table'):
+            rows = list(table.iter('tr'))[1:]  # Skip header
+            
+            for row in rows[:10]:  # Score the first 10 results
+                cells = list(row.iter('td'))
+                if len(cells) < 5:
+                    continue
                 
-                # Check if this is the PDF download button
-                if 'pdf-button' in src or alt.lower() == 'submit':
-                    # This button should lead to Fetching_Resource.php
-                    # We need to construct the proper download URL
-                    parent_form = button.find_parent('form')
-                    if parent_form:
-                        action = parent_form.get('action', '')
-                        method = parent_form.get('method', 'post').lower()
-                        
-                        if 'Fetching_Resource.php' in action or not action:
-                            # Return the fetching resource URL
-                            base_url = 'https://oceanofpdf.com/'
-                            if action:
-                                download_url = urljoin(base_url, action)
-                            else:
-                                download_url = base_url + 'Fetching_Resource.php'
-                            
-                            return download_url
-            
-            # Fallback: look for any form that might lead to the download
-            forms = soup.find_all('form')
-            for form in forms:
-                action = form.get('action', '')
-                if 'Fetching_Resource.php' in action:
-                    return urljoin('https://oceanofpdf.com/', action)
-            
-            # If no form found, try to find direct links to Fetching_Resource.php
-            links = soup.find_all('a', href=True)
-            for link in links:
-                href = link.get('href')
-                if 'Fetching_Resource.php' in href:
-                    return urljoin('https://oceanofpdf.com/', href)
+                # Look for a download link in the row
+                download = first(row, './/a[contains(translate(@href, "DOWNLOAD", "download"), "download") '
+                                      'or contains(@href, "get.php") or contains(@href, "ads.php")]')
+                if download is None:
+                    continue
+                href = download.get('href')
+                # Make absolute URL if needed
+                if not href.startswith('http'):
+                    href = urljoin(mirror, href)
+                
+                # The title links to the book's md5 page; authors are in the second column
+                title_link = first(row, './/a[contains(@href, "md5=")]')
+                book_title = title_link.text_content() if title_link is not None else ''
+                candidates.append((href, book_title, cells[1].text_content()))
+        
+        ranked = BookMatcher(title, author).rank(candidates)
+        return ranked[0] if ranked else None
+    
+    def _query_libgen_mirror(self, mirror, title, author, deadline=None):
+        """Fetch a LibGen results page, recording the outcome in the mirror's health"""
+        search_url = self._libgen_search_url(mirror, title, author)
+        
+        logging.info(f"Searching LibGen mirror {mirror}: {search_url}")
+        
+        self.libgen_health.begin(mirror)
+        start = time.monotonic()
+        try:
+            response = self._get(search_url, deadline, 10)
+            response.raise_for_status()
+        except HostThrottled:
+            # A mirror that keeps answering 429/503 is failing, even though it is reported as a timeout
+            self.libgen_health.record_failure(mirror, time.monotonic() - start)
+            raise
+        except DeadlineExceeded:
+            # Running out of our own budget says nothing about the mirror
+            self.libgen_health.cancel(mirror)
+            raise
+        except Exception:
+            self.libgen_health.record_failure(mirror, time.monotonic() - start)
+            raise
+        self.libgen_health.record_success(mirror, time.monotonic() - start)
+        return response.content
+    
+    def search_libgen(self, title, author, deadline=None):
+        """Search Library Genesis for a book, healthiest mirror first.
+
+        If the current mirror runs past its usual p90 latency, the next one is
+        queried in parallel and whichever answers first wins.
+        """
+        try:
+            mirrors = self.libgen_health.ordered(self.LIBGEN_MIRRORS)
+            in_flight = {}
+            launch_next = True
+            failure = None
             
+            while mirrors or in_flight:
+                if mirrors and launch_next:
+                    mirror = mirrors.pop(0)
+                    future = self._hedge_executor.submit(self._query_libgen_mirror, mirror, title, author, deadline)
+                    in_flight[future] = mirror
+                    launch_next = False
+                
+                # Only wait as long as the hedge delay while a fallback is left
+                hedge_delay = self.libgen_health.hedge_delay(mirror) if mirrors and self.LIBGEN_HEDGING else None
+                done, _ = wait(in_flight, timeout=hedge_delay, return_when=FIRST_COMPLETED)
+                if not done:
+                    logging.info(f"Mirror {mirror} slower than its p90, hedging to the next mirror")
+                    launch_next = True
+                    continue
+                
+                for future in done:
+                    answered = in_flight.pop(future)
+                    try:
+                        content = future.result()
+                    except Exception as mirror_error:
+                        logging.warning(f"Mirror {answered} failed: {str(mirror_error)}")
+                        failure = mirror_error
+                        launch_next = True
+                        continue
+                    
+                    # If this mirror worked, its answer is final even when empty
+                    return self._parse_libgen_results(content, answered, title, author)
+            
+            # No mirror answered, so this is a failure rather than a miss
+            if failure is not None:
+                raise failure
             return None
             
         except Exception as e:
-            logging.error(f"Error getting OceanOfPDF download link: {str(e)}")
+            logging.error(f"Error searching LibGen: {str(e)}")
+            raise
+    
+    def _archive_search_urls(self, title, author):
+        # Try multiple search variations
+        search_queries = [
+            f'title:("{title}") AND creator:("{author}")',
+            f'{title} {author}',
+            f'{title} AND {author}'
+        ]
+        return [
+            f"{self.ARCHIVE_URL}advancedsearch.php?q={quote(search_query)}&fl[]=identifier,title,creator&rows=10&page=1&output=json"
+            for search_query in search_queries
+        ]
+    
+    def _archive_field(self, doc, name):
+        """A doc field as text, or None if missing; multi-valued fields come back as lists"""
+        value = doc.get(name)
+        if isinstance(value, list):
+            return '; '.join(value)
+        return value
+    
+    def _archive_identifiers(self, data, title, author):
+        """Return identifiers of relevant docs in an advancedsearch response, best first"""
+        docs = data.get('response', {}).get('docs', [])
+        candidates = []
+        
+        for doc in docs[:10]:  # Score the first 10 results
+            identifier = doc.get('identifier')
+            if identifier:
+                candidates.append((identifier, self._archive_field(doc, 'title') or '', self._archive_field(doc, 'creator')))
+        
+        # Only the 5 best get their file listing fetched
+        return BookMatcher(title, author).rank(candidates)[:5]
+    
+    def _archive_metadata_url(self, identifier):
+        return f"{self.ARCHIVE_URL}metadata/{quote(identifier)}"
+    
+    def _pick_archive_pdf(self, identifier, metadata):
+        """Return the download URL of the best PDF in an item's file listing"""
+        # Lending-library items list PDFs that cannot actually be downloaded
+        if not metadata or metadata.get('is_dark') or metadata.get('metadata', {}).get('access-restricted-item') == 'true':
+            return None
+        
+        pdfs = [
+            f for f in metadata.get('files') or []
+            if f.get('name', '').lower().endswith('.pdf') and f.get('private') != 'true'
+        ]
+        if not pdfs:
             return None
+        
+        # Prefer the text-layer PDF, then originals over derived copies
+        best = min(pdfs, key=lambda f: (f.get('format') != 'Text PDF', f.get('source') != 'original'))
+        return f"{self.ARCHIVE_URL}download/{quote(identifier)}/{quote(best['name'])}"
+    
+    def _fetch_archive_metadata(self, identifier, deadline=None):
+        response = self._get(self._archive_metadata_url(identifier), deadline, 10)
+        response.raise_for_status()
+        return response.json()
     
-    def search_libgen(self, title, author):
-        """Search Library Genesis for a book"""
+    def _resolve_archive_pdf(self, identifiers, deadline=None):
+        """Fetch the file listings of several items at once and return the best-ranked PDF"""
+        futures = [
+            self._metadata_executor.submit(self._fetch_archive_metadata, identifier, deadline)
+            for identifier in identifiers
+        ]
+        failure = None
         try:
-            # Try multiple LibGen mirrors
-            mirrors = [
-                'https://libgen.is/',
-                'https://libgen.li/',
-                'https://libgen.st/'
-            ]
-            
-            for mirror in mirrors:
+            for identifier, future in zip(identifiers, futures):
                 try:
-                    search_query = f"{title} {author}"
-                    search_url = f"{mirror}search.php?req={quote(search_query)}&lg_topic=libgen&open=0&view=simple&res=25&phrase=1&column=def"
-                    
-                    logging.info(f"Searching LibGen mirror {mirror}: {search_url}")
-                    
-                    response = self.session.get(search_url, timeout=10)
-                    response.raise_for_status()
-                    
-                    soup = BeautifulSoup(response.content, 'html.parser')
-                    
-                    # Find results table
-                    tables = soup.find_all('table')
-                    for table in tables:
-                        rows = table.find_all('tr')[1:]  # Skip header
-                        
-                        for row in rows[:3]:  # Check first 3 results
-                            cells = row.find_all('td')
-                            if len(cells) < 5:
-                                continue
-                            
-                            # Look for download links in the row
-                            for cell in cells:
-                                links = cell.find_all('a', href=True)
-                                for link in links:
-                                    href = link.get('href')
-                                    if href and ('download' in href.lower() or 'get.php' in href or 'ads.php' in href):
-                                        # Make absolute URL if needed
-                                        if not href.startswith('http'):
-                                            href = urljoin(mirror, href)
-                                        return href
-                    
-                    # If we get here, this mirror worked but no results found
-                    break
-                    
-                except Exception as mirror_error:
-                    logging.warning(f"Mirror {mirror} failed: {str(mirror_error)}")
+                    pdf_url = self._pick_archive_pdf(identifier, future.result())
+                except Exception as e:
+                    logging.warning(f"Metadata lookup failed for {identifier}: {str(e)}")
+                    failure = e
                     continue
-            
+                if pdf_url:
+                    return pdf_url
+            # An item whose listing could not be read may have had the PDF
+            if failure is not None:
+                raise failure
             return None
+        finally:
+            for future in futures:
+                future.cancel()
+    
+    def _plan_archive_batches(self, lookups):
+        """Group the positions of Internet Archive lookups into batch-sized chunks"""
+        positions = [i for i, lookup in enumerate(lookups) if lookup[3] == 'Internet Archive']
+        if len(positions) < self.ARCHIVE_BATCH_MIN:
+            return []
+        return [positions[i:i + self.ARCHIVE_BATCH_SIZE] for i in range(0, len(positions), self.ARCHIVE_BATCH_SIZE)]
+    
+    def _archive_batch_url(self, batch):
+        clauses = []
+        for title, author in batch:
+            title, author = title.replace('"', ''), author.replace('"', '')
+            clauses.append(f'(title:("{title}") AND creator:("{author}"))')
+        search_query = ' OR '.join(clauses)
+        return f"{self.ARCHIVE_URL}advancedsearch.php?q={quote(search_query)}&fl[]=identifier,title,creator&rows={len(batch) * 10}&page=1&output=json"
+    
+    def _map_archive_batch(self, batch, data):
+        """Assign the docs of a batch response to the books that asked for them.
+
+        Returns one list of up to 5 identifiers per book, best match first.
+        """
+        docs = data.get('response', {}).get('docs', [])
+        matchers = [BookMatcher(title, author) for title, author in batch]
+        scored = [[] for _ in batch]
+        
+        for order, doc in enumerate(docs):
+            identifier = doc.get('identifier')
+            if not identifier:
+                continue
+            
+            # Tokenize each doc once and score it against every book in the batch
+            found = title_tokens(self._archive_field(doc, 'title') or '')
+            creator = self._archive_field(doc, 'creator')
+            listed = author_tokens(creator) if creator is not None else None
             
+            for position, matcher in enumerate(matchers):
+                score = matcher.score_tokens(found, listed)
+                if score >= matcher.threshold:
+                    scored[position].append((-score, order, identifier))
+        
+        return [[identifier for _, _, identifier in sorted(entries)[:5]] for entries in scored]
+    
+    def search_internet_archive_batch(self, batch, deadline=None):
+        """Run one OR'ed advancedsearch query for many (title, author) pairs"""
+        search_url = self._archive_batch_url(batch)
+        
+        logging.info(f"Searching Internet Archive for a batch of {len(batch)} books")
+        
+        response = self._get(search_url, deadline, 20)
+        response.raise_for_status()
+        return self._map_archive_batch(batch, response.json())
+    
+    def _search_internet_archive_planned(self, batch_future, position, title, author, deadline=None):
+        """Resolve a book from its batch query, falling back to a per-book search"""
+        try:
+            identifiers = batch_future.result()[position]
         except Exception as e:
-            logging.error(f"Error searching LibGen: {str(e)}")
-            return None
+            logging.warning(f"Internet Archive batch query failed: {str(e)}")
+            identifiers = []
+        
+        failure = None
+        if identifiers:
+            try:
+                pdf_url = self._resolve_archive_pdf(identifiers, deadline)
+            except Exception as e:
+                failure = e
+                pdf_url = None
+            if pdf_url:
+                return pdf_url
+        
+        pdf_url = self.search_internet_archive(title, author, deadline)
+        if not pdf_url and failure is not None:
+            raise failure
+        return pdf_url
     
-    def search_internet_archive(self, title, author):
+    def search_internet_archive(self, title, author, deadline=None):
         """Search Internet Archive for a book with improved relevance checking"""
         try:
-            # Try multiple search variations
-            search_queries = [
-                f'title:("{title}") AND creator:("{author}")',
-                f'{title} {author}',
-                f'{title} AND {author}'
-            ]
-            
-            for search_query in search_queries:
+            failure = None
+            for search_url in self._archive_search_urls(title, author):
                 try:
-                    search_url = f"https://archive.org/advancedsearch.php?q={quote(search_query)}&fl[]=identifier,title,creator&rows=10&page=1&output=json"
-                    
                     logging.info(f"Searching Internet Archive: {search_url}")
                     
-                    response = self.session.get(search_url, timeout=15)
+                    response = self._get(search_url, deadline, 15)
                     response.raise_for_status()
                     
                     data = response.json()
                     
-                    if 'response' in data and 'docs' in data['response']:
-                        docs = data['response']['docs']
-                        
-                        for doc in docs[:5]:  # Check first 5 results
-                            identifier = doc.get('identifier')
-                            if identifier:
-                                # Try multiple PDF naming patterns
-                                pdf_patterns = [
-                                    f"https://archive.org/download/{identifier}/{identifier}.pdf",
-                                    f"https://archive.org/download/{identifier}/{identifier}_text.pdf",
-                                    f"https://archive.org/download/{identifier}/{identifier}_bw.pdf"
-                                ]
-                                
-                                for pdf_url in pdf_patterns:
-                                    try:
-                                        head_response = self.session.head(pdf_url, timeout=8, allow_redirects=True)
-                                        if head_response.status_code == 200:
-                                            # Verify it's actually the right book by checking title relevance
-                                            doc_title = doc.get('title', '').lower()
-                                            if any(word.lower() in doc_title for word in title.split()[:2]):
-                                                return pdf_url
-                                        # Handle redirects
-                                        elif head_response.status_code in [302, 301] and head_response.headers.get('location'):
-                                            redirect_url = head_response.headers.get('location')
-                                            if redirect_url.endswith('.pdf'):
-                                                doc_title = doc.get('title', '').lower()
-                                                if any(word.lower() in doc_title for word in title.split()[:2]):
-                                                    return redirect_url
-                                    except:
-                                        continue
+                    # Read the real file names instead of guessing them
+                    pdf_url = self._resolve_archive_pdf(self._archive_identifiers(data, title, author), deadline)
+                    if pdf_url:
+                        return pdf_url
                     
                     # If we found results but no PDFs, try next query
                     if data.get('response', {}).get('docs'):
@@ -316,96 +913,178 @@ class BookSearcher:
                         
                 except Exception as query_error:
                     logging.warning(f"Search query failed: {str(query_error)}")
+                    failure = query_error
                     continue
             
+            # Only a search where every query answered is a genuine miss
+            if failure is not None:
+                raise failure
             return None
             
         except Exception as e:
             logging.error(f"Error searching Internet Archive: {str(e)}")
+            raise
+    
+    def _pdfcoffee_search_url(self, title, author):
+        search_query = f"{title} {author}"
+        return f"{self.PDFCOFFEE_URL}search?q={quote(search_query)}"
+    
+    def _parse_pdfcoffee_results(self, content, title, author):
+        """Return the best matching document link in a PDF Coffee results page"""
+        doc = parse_html(content)
+        if doc is None:
             return None
+        host = urlparse(self.PDFCOFFEE_URL).netloc
+        
+        # Look for search results
+        results = doc.xpath(f'//div[{has_class("item", "result")}]') or doc.xpath('//a[@href]')
+        
+        candidates = []
+        for result in results[:10]:  # Score the first 10 results
+            link = result if result.tag == 'a' else first(result, './/a[@href]')
+            if link is not None:
+                href = link.get('href')
+                if href and host in href:
+                    # Make absolute URL
+                    if not href.startswith('http'):
+                        href = urljoin(self.PDFCOFFEE_URL, href)
+                    candidates.append((href, [link.text_content(), slug_text(href)], None))
+        
+        ranked = BookMatcher(title, author).rank(candidates)
+        return ranked[0] if ranked else None
     
-    def search_pdfcoffee(self, title, author):
+    def search_pdfcoffee(self, title, author, deadline=None):
         """Search PDF Coffee for a book"""
         try:
-            search_query = f"{title} {author}"
-            search_url = f"https://pdfcoffee.com/search?q={quote(search_query)}"
+            search_url = self._pdfcoffee_search_url(title, author)
             
             logging.info(f"Searching PDF Coffee: {search_url}")
             
-            response = self.session.get(search_url, timeout=15)
+            response = self._get(search_url, deadline, 15)
             response.raise_for_status()
             
-            soup = BeautifulSoup(response.content, 'html.parser')
-            
-            # Look for search results
-            results = soup.find_all('div', class_=['item', 'result']) or soup.find_all('a', href=True)
-            
-            for result in results[:5]:
-                link = result if result.name == 'a' else result.find('a', href=True)
-                if link:
-                    href = link.get('href')
-                    if href and 'pdfcoffee.com' in href and any(word.lower() in href.lower() for word in title.split()[:2]):
-                        # Make absolute URL
-                        if not href.startswith('http'):
-                            href = urljoin('https://pdfcoffee.com/', href)
-                        return href
-            
-            return None
+            return self._parse_pdfcoffee_results(response.content, title, author)
             
         except Exception as e:
             logging.error(f"Error searching PDF Coffee: {str(e)}")
+            raise
+    
+    def _gutenberg_search_url(self, title, author):
+        search_query = f"{title} {author}"
+        return f"{self.GUTENBERG_URL}ebooks/search/?query={quote(search_query)}&submit_search=Go%21"
+    
+    def _parse_gutenberg_book_ids(self, content, title, author):
+        """Return ids of the best matching ebooks on a Gutenberg search page, best first"""
+        doc = parse_html(content)
+        if doc is None:
+            return []
+        candidates = []
+        
+        # Look for book results
+        for result in doc.xpath(f'//li[{has_class("booklink")}]')[:10]:  # Score the first 10 results
+            link = first(result, './/a[@href]')
+            if link is None:
+                continue
+            
+            # Extract book ID from the link
+            book_id_match = re.search(r'/ebooks/(\d+)', link.get('href'))
+            if book_id_match:
+                # Title and author sit in <span class="title"> and <span class="subtitle">
+                spans = {name: span for span in result.iter('span') for name in span.get('class', '').split()}
+                book_title = spans.get('title', link).text_content()
+                book_author = spans['subtitle'].text_content() if 'subtitle' in spans else None
+                candidates.append((book_id_match.group(1), book_title, book_author))
+        
+        # Each id costs up to three HEAD probes, so only the 3 best are tried
+        return BookMatcher(title, author).rank(candidates)[:3]
+    
+    def _gutenberg_pdf_urls(self, book_id):
+        # PDF formats in order of preference; the generated cache/epub copy
+        # exists for every text ebook, the others only for some
+        return [
+            f"{self.GUTENBERG_URL}cache/epub/{book_id}/pg{book_id}.pdf",
+            f"{self.GUTENBERG_URL}files/{book_id}/{book_id}-pdf.pdf",
+            f"{self.GUTENBERG_URL}files/{book_id}/{book_id}.pdf"
+        ]
+    
+    def _gutenberg_probe_rounds(self, book_ids):
+        """Candidate PDFs in probe rounds, most likely first.
+
+        The best-ranked id's cache/epub copy is nearly always there, so it is
+        probed alone; the other candidates, at most 8, only if it is not.
+        """
+        candidates = [self._gutenberg_pdf_urls(book_id) for book_id in book_ids]
+        ordered = [urls[pattern] for pattern in range(3) for urls in candidates]
+        ordered = [url for url in ordered if not self.link_verifier.is_bad(url)]
+        return [urls for urls in (ordered[:1], ordered[1:]) if urls]
+    
+    def _pick_probed(self, urls, outcomes):
+        """Return (best-ranked URL that answered, first failure) for one probe round.
+
+        outcomes hold a status or the exception each probe raised; a 404 or
+        410 only means the format is missing, anything else is a failure.
+        """
+        failure = None
+        for url, outcome in zip(urls, outcomes):
+            if isinstance(outcome, BaseException):
+                failure = failure or outcome
+            elif outcome < 400:
+                return url, failure
+            elif outcome not in (404, 410):
+                failure = failure or requests.HTTPError(f"{outcome} probing {url}")
+        return None, failure
+    
+    def _probe(self, url, deadline=None):
+        response = self.politeness.request(self.session, 'HEAD', url, deadline, 10, allow_redirects=True)
+        response.close()
+        return response.status_code
+    
+    def _pick_gutenberg_pdf(self, book_ids, deadline=None):
+        """Return the most preferred candidate PDF that exists, probing each round's candidates at once"""
+        failure = None
+        for urls in self._gutenberg_probe_rounds(book_ids):
+            futures = [self._probe_executor.submit(self._probe, url, deadline) for url in urls]
+            outcomes = []
+            for future in futures:
+                try:
+                    outcomes.append(future.result())
+                except Exception as e:
+                    outcomes.append(e)
+            pdf_url, round_failure = self._pick_probed(urls, outcomes)
+            if pdf_url:
+                return pdf_url
+            failure = failure or round_failure
+        # A candidate that could not be probed may have existed
+        if failure is not None:
+            raise failure
+        return None
+    
+    def _gutenberg_index_lookup(self, title, author):
+        """Resolve a Gutenberg link from the offline catalog without any network calls"""
+        book_ids = self.gutenberg_index.search(title, author, limit=1)
+        if not book_ids:
             return None
+        # The generated cache/epub copy exists for every text ebook in the catalog
+        return self._gutenberg_pdf_urls(book_ids[0])[0]
     
-    def search_project_gutenberg(self, title, author):
+    def search_project_gutenberg(self, title, author, deadline=None):
         """Search Project Gutenberg for a book"""
+        if self.gutenberg_index is not None:
+            return self._gutenberg_index_lookup(title, author)
+        
         try:
-            search_query = f"{title} {author}"
-            search_url = f"https://www.gutenberg.org/ebooks/search/?query={quote(search_query)}&submit_search=Go%21"
+            search_url = self._gutenberg_search_url(title, author)
             
             logging.info(f"Searching Project Gutenberg: {search_url}")
             
-            response = self.session.get(search_url, timeout=15)
+            response = self._get(search_url, deadline, 15)
             response.raise_for_status()
             
-            soup = BeautifulSoup(response.content, 'html.parser')
-            
-            # Look for book results
-            results = soup.find_all('li', class_='booklink')
-            
-            for result in results[:3]:  # Check first 3 results
-                # Find the book ID from the link
-                link = result.find('a', href=True)
-                if not link:
-                    continue
-                
-                href = link.get('href')
-                if '/ebooks/' in href:
-                    # Extract book ID
-                    import re
-                    book_id_match = re.search(r'/ebooks/(\d+)', href)
-                    if book_id_match:
-                        book_id = book_id_match.group(1)
-                        
-                        # Try different PDF formats
-                        pdf_urls = [
-                            f"https://www.gutenberg.org/files/{book_id}/{book_id}-pdf.pdf",
-                            f"https://www.gutenberg.org/files/{book_id}/{book_id}.pdf",
-                            f"https://www.gutenberg.org/cache/epub/{book_id}/pg{book_id}.pdf"
-                        ]
-                        
-                        for pdf_url in pdf_urls:
-                            try:
-                                head_response = self.session.head(pdf_url, timeout=10)
-                                if head_response.status_code == 200:
-                                    return pdf_url
-                            except:
-                                continue
-            
-            return None
+            return self._pick_gutenberg_pdf(self._parse_gutenberg_book_ids(response.content, title, author), deadline)
             
         except Exception as e:
             logging.error(f"Error searching Project Gutenberg: {str(e)}")
-            return None
+            raise
     
     def search_pdf_drive(self, title, author):
         """Search PDF Drive for a book"""
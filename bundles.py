@@ -0,0 +1,303 @@
+"""One ZIP download of many search results.
+
+The archive is written as it is sent: files are fetched from upstream a
+few at a time, and their chunks go through small bounded queues straight
+into ZIP entries, so memory stays the same however many or large the
+files are. Entries are stored uncompressed (PDFs barely deflate) with
+their sizes and CRCs in data descriptors after the data, the way zipfile
+writes to a stream it cannot seek back in. A final manifest.json entry
+lists what happened to every requested link.
+"""
+import json
+import logging
+import os
+import queue
+import re
+import threading
+import time
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urljoin, urlparse
+
+# What became of each requested link, as reported in the manifest
+OK = 'ok'
+FAILED = 'failed'
+# Part of the file is in the archive, but the download broke off
+INCOMPLETE = 'incomplete'
+
+MANIFEST_NAME = 'manifest.json'
+
+# Marks the end of a file's chunks
+_END = object()
+
+# Redirects followed per download, each checked against the allowed hosts
+MAX_REDIRECTS = 5
+
+
+class BundleCancelled(Exception):
+    """The client went away before the bundle was sent"""
+
+
+class _StreamSink:
+    """Write-only file object the ZIP is written to, drained by the response generator"""
+
+    def __init__(self):
+        self._parts = []
+
+    def write(self, data):
+        self._parts.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        data, self._parts = b''.join(self._parts), []
+        return data
+
+
+class _Download:
+    """One link in a bundle, with the chunks read so far but not yet written"""
+
+    def __init__(self, result, name, max_chunks):
+        self.result = result
+        self.name = name
+        self.chunks = queue.Queue(maxsize=max_chunks)
+        self.started = False
+        self.status = None
+        self.error = None
+        self.bytes = 0
+
+    def manifest_entry(self):
+        return {
+            'title': self.result.get('title'),
+            'author': self.result.get('author'),
+            'source': self.result.get('source'),
+            'link': self.result['link'],
+            'file': self.name if self.started else None,
+            'status': self.status,
+            'bytes': self.bytes,
+            'error': self.error,
+        }
+
+
+def bundle_file_name(result):
+    """A safe "Title - Author (Source).pdf" archive name for a search result"""
+    parts = ' - '.join(part for part in (result.get('title'), result.get('author')) if part) or 'book'
+    if result.get('source'):
+        parts += f" ({result['source']})"
+    name = ' '.join(re.sub(r'[\\/:*?"<>|\x00-\x1f]+', ' ', parts).split())
+    return name[:150].strip(' .') + '.pdf'
+
+
+class BundleBuilder:
+    """Streams a ZIP of the PDFs behind a list of search results.
+
+    Up to `workers` files are downloaded at once per bundle, each through
+    a queue of at most `max_chunks` chunks of `chunk_size` bytes; a
+    download whose queue is full waits for the archive to catch up, so a
+    bundle holds no more than workers * max_chunks * chunk_size bytes.
+    Whichever file starts arriving first is written next. Requests go
+    through the searchers' session and per-host pacing. A file is given
+    up on if it is not a PDF, is over `max_file_bytes`, or takes longer
+    than `file_timeout` seconds; the manifest says why.
+
+    Only links (and redirects) to `allowed_hosts` are fetched, so a bundle
+    cannot be pointed at internal addresses. An allowed "host" also covers
+    its subdomains on the default port; "host:port" matches exactly.
+    """
+
+    def __init__(self, session, politeness=None, allowed_hosts=(), workers=4, chunk_size=64 * 1024, max_chunks=8,
+                 max_file_bytes=512 * 1024 * 1024, timeout=30.0, file_timeout=300.0):
+        self.session = session
+        self.politeness = politeness
+        self.allowed_hosts = frozenset(host.strip().lower() for host in allowed_hosts if host.strip())
+        self.workers = workers
+        self.chunk_size = chunk_size
+        self.max_chunks = max_chunks
+        self.max_file_bytes = max_file_bytes
+        self.timeout = timeout
+        self.file_timeout = file_timeout
+        self._lock = threading.Lock()
+        self._stats = {'bundles': 0, 'cancelled': 0, 'files': 0, 'failed': 0, 'bytes': 0, 'active': 0}
+
+    @classmethod
+    def from_env(cls, session, politeness=None, allowed_hosts=()):
+        hosts = os.environ.get('BOOK_BUNDLE_HOSTS')
+        return cls(
+            session,
+            politeness=politeness,
+            allowed_hosts=hosts.split(',') if hosts else allowed_hosts,
+            workers=int(os.environ.get('BOOK_BUNDLE_WORKERS', 4)),
+            max_file_bytes=int(os.environ.get('BOOK_BUNDLE_MAX_FILE_MB', 512)) * 1024 * 1024,
+            file_timeout=float(os.environ.get('BOOK_BUNDLE_FILE_TIMEOUT', 300.0)),
+        )
+
+    def allows(self, link):
+        """Whether a link is http(s) on one of the allowed hosts"""
+        try:
+            parsed = urlparse(link)
+            port = parsed.port
+        except ValueError:
+            return False
+        if parsed.scheme not in ('http', 'https') or not parsed.hostname:
+            return False
+        host = parsed.hostname.lower()
+        if port is not None:
+            return f"{host}:{port}" in self.allowed_hosts
+        return any(host == allowed or host.endswith('.' + allowed) for allowed in self.allowed_hosts)
+
+    def stats(self):
+        with self._lock:
+            return dict(self._stats)
+
+    def _count(self, **changes):
+        with self._lock:
+            for key, change in changes.items():
+                self._stats[key] += change
+
+    def stream(self, results):
+        """Yield the bytes of a ZIP holding the PDF behind each result's link, then manifest.json.
+
+        Results repeating a link are fetched once. Closing the generator
+        early stops the downloads still running.
+        """
+        downloads = []
+        names = set()
+        links = set()
+        for result in results:
+            if result['link'] in links:
+                continue
+            links.add(result['link'])
+            name = bundle_file_name(result)
+            stem, number = name[:-4], 2
+            while name.lower() in names:
+                name, number = f"{stem} ({number}).pdf", number + 1
+            names.add(name.lower())
+            downloads.append(_Download(result, name, self.max_chunks))
+
+        ready = queue.Queue()
+        cancelled = threading.Event()
+        executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='bundle')
+        for download in downloads:
+            executor.submit(self._fetch, download, ready, cancelled)
+        self._count(bundles=1, active=1)
+        logging.info(f"Bundling {len(downloads)} files")
+
+        sink = _StreamSink()
+        finished = False
+        try:
+            with zipfile.ZipFile(sink, 'w', compression=zipfile.ZIP_STORED) as archive:
+                for _ in downloads:
+                    download = ready.get()
+                    if download.started:
+                        yield from self._write_entry(archive, sink, download)
+                    self._count(files=1, failed=int(download.status != OK), bytes=download.bytes)
+
+                manifest = {
+                    'files': [download.manifest_entry() for download in downloads],
+                    'ok': sum(1 for download in downloads if download.status == OK),
+                    'failed': sum(1 for download in downloads if download.status != OK),
+                }
+                archive.writestr(self._zip_info(MANIFEST_NAME), json.dumps(manifest, indent=2))
+            yield sink.drain()
+            finished = True
+        finally:
+            cancelled.set()
+            executor.shutdown(wait=False, cancel_futures=True)
+            self._count(active=-1, cancelled=int(not finished))
+
+    def _zip_info(self, name):
+        info = zipfile.ZipInfo(name, date_time=time.localtime()[:6])
+        info.compress_type = zipfile.ZIP_STORED
+        info.external_attr = 0o644 << 16
+        return info
+
+    def _write_entry(self, archive, sink, download):
+        # Files over 2 GiB need ZIP64 sizes, which have to be asked for up front
+        force_zip64 = self.max_file_bytes > zipfile.ZIP64_LIMIT
+        with archive.open(self._zip_info(download.name), 'w', force_zip64=force_zip64) as entry:
+            while True:
+                chunk = download.chunks.get()
+                if chunk is _END:
+                    break
+                entry.write(chunk)
+                yield sink.drain()
+
+    def _request(self, link):
+        """GET a link, following redirects only while they stay on allowed hosts"""
+        for _ in range(MAX_REDIRECTS + 1):
+            if not self.allows(link):
+                raise ValueError(f"{urlparse(link).netloc or link} is not a book source")
+            # Downloads share the searches' per-host pacing, when there is one
+            if self.politeness is not None:
+                response = self.politeness.request(self.session, 'GET', link, limit=self.timeout, stream=True, allow_redirects=False)
+            else:
+                response = self.session.get(link, timeout=self.timeout, stream=True, allow_redirects=False)
+            if not response.is_redirect:
+                return response
+            link = urljoin(link, response.headers['Location'])
+            response.close()
+        raise ValueError(f"more than {MAX_REDIRECTS} redirects")
+
+    def _put(self, download, item, cancelled):
+        # Wait for the archive to take chunks, unless the bundle was abandoned
+        while True:
+            if cancelled.is_set():
+                raise BundleCancelled()
+            try:
+                download.chunks.put(item, timeout=1)
+                return
+            except queue.Full:
+                pass
+
+    def _fetch(self, download, ready, cancelled):
+        """Download one file into its chunk queue, handing it to the archive once it is known to be a PDF"""
+        if cancelled.is_set():
+            return
+        link = download.result['link']
+        response = None
+        try:
+            response = self._request(link)
+            if response.status_code >= 400:
+                raise ValueError(f"HTTP {response.status_code}")
+            length = int(response.headers.get('Content-Length') or 0)
+            if length > self.max_file_bytes:
+                raise ValueError(f"file is {length} bytes, over the {self.max_file_bytes} byte limit")
+
+            started_at = time.monotonic()
+            chunks = response.iter_content(self.chunk_size)
+            first = next(chunks, b'')
+            if not first.startswith(b'%PDF'):
+                content_type = response.headers.get('Content-Type', 'unknown')
+                raise ValueError(f"not a PDF (Content-Type {content_type})")
+
+            download.started = True
+            ready.put(download)
+            download.bytes += len(first)
+            self._put(download, first, cancelled)
+            for chunk in chunks:
+                if download.bytes + len(chunk) > self.max_file_bytes:
+                    raise ValueError(f"file is over the {self.max_file_bytes} byte limit")
+                if time.monotonic() - started_at > self.file_timeout:
+                    raise ValueError(f"download took over {self.file_timeout:.0f}s")
+                download.bytes += len(chunk)
+                self._put(download, chunk, cancelled)
+            download.status = OK
+        except BundleCancelled:
+            return
+        except Exception as e:
+            download.status = INCOMPLETE if download.started else FAILED
+            download.error = str(e) or type(e).__name__
+            logging.info(f"Bundle download failed for {link}: {download.error}")
+        finally:
+            if response is not None:
+                response.close()
+
+        if download.started:
+            try:
+                self._put(download, _END, cancelled)
+            except BundleCancelled:
+                pass
+        else:
+            ready.put(download)
@@ -0,0 +1,36 @@
+import time
+
+
+class DeadlineExceeded(Exception):
+    """Raised when a lookup runs out of its time budget"""
+
+
+class Deadline:
+    """A point in time after which no further outbound calls should start.
+
+    Each outbound call asks for `timeout(limit)`, which clips the call's own
+    timeout to the time left, so a chain of sequential calls can never run
+    past the deadline.
+    """
+
+    def __init__(self, seconds):
+        self.expires_at = time.monotonic() + seconds
+
+    def remaining(self):
+        return max(0.0, self.expires_at - time.monotonic())
+
+    def expired(self):
+        return time.monotonic() >= self.expires_at
+
+    def timeout(self, limit):
+        """Return the timeout for the next call, or raise if none is left"""
+        remaining = self.remaining()
+        if remaining <= 0:
+            raise DeadlineExceeded('deadline exceeded')
+        return min(limit, remaining)
+
+    def child(self, seconds):
+        """Return a sub-deadline that ends after `seconds` or with this one"""
+        child = Deadline(0)
+        child.expires_at = min(self.expires_at, time.monotonic() + seconds)
+        return child
@@ -0,0 +1,38 @@
+"""Production server settings.
+
+Usage: gunicorn -c gunicorn.conf.py main:app
+
+Tuned with environment variables:
+    PORT                   port to listen on (default 5000)
+    WEB_CONCURRENCY        worker processes (default 2 per CPU, at most 8)
+    BOOK_WORKER_CLASS      gunicorn worker class (default gthread); an async
+                           class such as gevent works once it is installed
+    BOOK_WORKER_THREADS    request threads per gthread worker (default 8)
+    BOOK_WORKER_TIMEOUT    seconds before a silent worker is restarted (default 120)
+"""
+import multiprocessing
+import os
+
+bind = f"0.0.0.0:{os.environ.get('PORT', 5000)}"
+workers = int(os.environ.get('WEB_CONCURRENCY', min(2 * multiprocessing.cpu_count(), 8)))
+# Each worker paces upstream hosts at its share of their request rates
+os.environ.setdefault('BOOK_SERVER_WORKERS', str(workers))
+worker_class = os.environ.get('BOOK_WORKER_CLASS', 'gthread')
+# Searches mostly wait on upstream sites, so each worker serves many at once
+threads = int(os.environ.get('BOOK_WORKER_THREADS', 8))
+# Longer than a whole search (BOOK_SEARCH_DEADLINE, 45s by default)
+timeout = int(os.environ.get('BOOK_WORKER_TIMEOUT', 120))
+graceful_timeout = 30
+keepalive = 5
+
+# Import the app and its dependencies once in the master; workers are forked
+# from it ready to serve, and build their searchers on the first request
+preload_app = True
+
+accesslog = '-'
+
+
+def on_starting(server):
+    # Loaded before the fork, the Gutenberg index is shared by every worker
+    from gutenberg_index import load_shared_index, DEFAULT_INDEX_PATH
+    load_shared_index(os.environ.get('BOOK_GUTENBERG_INDEX', DEFAULT_INDEX_PATH))
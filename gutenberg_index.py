@@ -0,0 +1,251 @@
+"""Offline Project Gutenberg catalog index.
+
+Builds an inverted index over normalized title and author tokens from
+Gutenberg's bulk catalog dump (pg_catalog.csv) so lookups need no network.
+
+Usage:
+    python gutenberg_index.py build pg_catalog.csv [--index PATH]
+    python gutenberg_index.py refresh [CSV_PATH_OR_URL] [--index PATH]
+    python gutenberg_index.py query "Pride and Prejudice" "Jane Austen" [--index PATH]
+"""
+import argparse
+import csv
+import gzip
+import io
+import json
+import logging
+import os
+import time
+from functools import lru_cache
+import requests
+from matching import title_tokens, author_tokens
+
+CATALOG_URL = 'https://www.gutenberg.org/cache/epub/feeds/pg_catalog.csv'
+DEFAULT_INDEX_PATH = 'gutenberg_index.json.gz'
+INDEX_VERSION = 1
+
+
+class GutenbergIndex:
+    """In-memory inverted index of Gutenberg text ebooks"""
+
+    def __init__(self):
+        self.books = {}
+        self.title_index = {}
+        self.author_index = {}
+        self.last_modified = None
+        self.built_at = None
+
+    def __len__(self):
+        return len(self.books)
+
+    def _add(self, book_id, title, authors, language):
+        self.books[book_id] = [title, authors, language]
+        for token in title_tokens(title):
+            self.title_index.setdefault(token, set()).add(book_id)
+        for token in author_tokens(authors):
+            self.author_index.setdefault(token, set()).add(book_id)
+
+    def _remove(self, book_id):
+        title, authors, _ = self.books.pop(book_id)
+        for index, tokens in ((self.title_index, title_tokens(title)), (self.author_index, author_tokens(authors))):
+            for token in tokens:
+                postings = index.get(token)
+                if postings is not None:
+                    postings.discard(book_id)
+                    if not postings:
+                        del index[token]
+
+    @staticmethod
+    def read_catalog(lines):
+        """Yield (book_id, title, authors, language) for text ebooks in a catalog CSV"""
+        for row in csv.DictReader(lines):
+            if row.get('Type', 'Text') != 'Text':
+                continue
+            try:
+                book_id = int(row['Text#'])
+            except (KeyError, TypeError, ValueError):
+                continue
+            title = ' '.join((row.get('Title') or '').split())
+            if title:
+                yield book_id, title, row.get('Authors') or '', row.get('Language') or ''
+
+    def update(self, records):
+        """Apply a full catalog snapshot, touching only entries that changed.
+
+        Returns a dict with counts of added, changed and removed ebooks.
+        """
+        counts = {'added': 0, 'changed': 0, 'removed': 0}
+        seen = set()
+
+        for book_id, title, authors, language in records:
+            seen.add(book_id)
+            current = self.books.get(book_id)
+            if current == [title, authors, language]:
+                continue
+            if current is None:
+                counts['added'] += 1
+            else:
+                counts['changed'] += 1
+                self._remove(book_id)
+            self._add(book_id, title, authors, language)
+
+        for book_id in set(self.books) - seen:
+            self._remove(book_id)
+            counts['removed'] += 1
+
+        self.built_at = time.time()
+        return counts
+
+    def search(self, title, author, limit=3):
+        """Return ids of ebooks whose title and author contain every query token, best first"""
+        wanted_title = title_tokens(title)
+        wanted_author = author_tokens(author)
+        if not wanted_title:
+            return []
+
+        # Intersect the rarest postings first to keep the candidate set small
+        postings = []
+        for token in wanted_title:
+            ids = self.title_index.get(token)
+            if not ids:
+                return []
+            postings.append(ids)
+        for token in wanted_author:
+            ids = self.author_index.get(token)
+            if not ids:
+                return []
+            postings.append(ids)
+        postings.sort(key=len)
+
+        matches = set(postings[0])
+        for ids in postings[1:]:
+            matches &= ids
+            if not matches:
+                return []
+
+        # Closest title wins; English editions and lower (older) ids break ties
+        def rank(book_id):
+            book_title, _, language = self.books[book_id]
+            extra = len(title_tokens(book_title) - wanted_title)
+            return (extra, 'en' not in language.split('; '), book_id)
+
+        return sorted(matches, key=rank)[:limit]
+
+    def save(self, path):
+        data = {
+            'version': INDEX_VERSION,
+            'last_modified': self.last_modified,
+            'built_at': self.built_at,
+            'books': self.books,
+            'title_index': {token: sorted(ids) for token, ids in self.title_index.items()},
+            'author_index': {token: sorted(ids) for token, ids in self.author_index.items()},
+        }
+        tmp_path = f"{path}.tmp"
+        with gzip.open(tmp_path, 'wt', encoding='utf-8') as f:
+            json.dump(data, f, separators=(',', ':'))
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path):
+        with gzip.open(path, 'rt', encoding='utf-8') as f:
+            data = json.load(f)
+        if data.get('version') != INDEX_VERSION:
+            raise ValueError(f"Unsupported Gutenberg index version {data.get('version')}")
+
+        index = cls()
+        index.last_modified = data.get('last_modified')
+        index.built_at = data.get('built_at')
+        index.books = {int(book_id): entry for book_id, entry in data['books'].items()}
+        index.title_index = {token: set(ids) for token, ids in data['title_index'].items()}
+        index.author_index = {token: set(ids) for token, ids in data['author_index'].items()}
+        return index
+
+    @classmethod
+    def load_if_present(cls, path):
+        """Load the index at path, returning None when it is missing or unreadable"""
+        if not path or not os.path.exists(path):
+            return None
+        try:
+            start = time.perf_counter()
+            index = cls.load(path)
+            logging.info(f"Loaded Gutenberg index with {len(index)} ebooks in {time.perf_counter() - start:.2f}s")
+            return index
+        except Exception as e:
+            logging.warning(f"Could not load Gutenberg index {path}: {str(e)}")
+            return None
+
+    def refresh(self, source=CATALOG_URL, session=None):
+        """Re-read the catalog from a URL or file and apply only what changed.
+
+        Remote catalogs are fetched conditionally, so an unchanged dump costs
+        a single 304 response. Returns the update counts, or None if unchanged.
+        """
+        if not source.startswith(('http://', 'https://')):
+            with open(source, newline='', encoding='utf-8') as f:
+                return self.update(self.read_catalog(f))
+
+        session = session or requests.Session()
+        headers = {'If-Modified-Since': self.last_modified} if self.last_modified else {}
+        response = session.get(source, headers=headers, timeout=120)
+        if response.status_code == 304:
+            return None
+        response.raise_for_status()
+
+        counts = self.update(self.read_catalog(io.StringIO(response.content.decode('utf-8'))))
+        self.last_modified = response.headers.get('Last-Modified')
+        return counts
+
+
+@lru_cache(maxsize=None)
+def load_shared_index(path):
+    """GutenbergIndex.load_if_present(), once per path for the whole process.
+
+    Loaded in a server's master process before it forks, the index is
+    shared by every worker instead of being read again by each.
+    """
+    return GutenbergIndex.load_if_present(path)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Build and query the offline Gutenberg catalog index')
+    parser.add_argument('--index', default=os.environ.get('BOOK_GUTENBERG_INDEX', DEFAULT_INDEX_PATH))
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    build = commands.add_parser('build', help='build a new index from a catalog CSV')
+    build.add_argument('catalog', nargs='?', default=CATALOG_URL)
+
+    refresh = commands.add_parser('refresh', help='apply catalog changes to an existing index')
+    refresh.add_argument('catalog', nargs='?', default=CATALOG_URL)
+
+    query = commands.add_parser('query', help='look up a title and author')
+    query.add_argument('title')
+    query.add_argument('author')
+
+    args = parser.parse_args()
+
+    if args.command == 'query':
+        index = GutenbergIndex.load(args.index)
+        start = time.perf_counter()
+        book_ids = index.search(args.title, args.author)
+        elapsed_us = (time.perf_counter() - start) * 1e6
+        for book_id in book_ids:
+            title, authors, _ = index.books[book_id]
+            print(f"{book_id}\t{title}\t{authors}")
+        print(f"{len(book_ids)} matches in {elapsed_us:.0f} µs")
+        return
+
+    if args.command == 'refresh' and os.path.exists(args.index):
+        index = GutenbergIndex.load(args.index)
+    else:
+        index = GutenbergIndex()
+
+    counts = index.refresh(args.catalog)
+    if counts is None:
+        print('Catalog unchanged')
+        return
+    index.save(args.index)
+    print(f"{len(index)} ebooks indexed ({counts['added']} added, {counts['changed']} changed, {counts['removed']} removed)")
+
+
+if __name__ == '__main__':
+    main()
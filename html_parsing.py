@@ -0,0 +1,37 @@
+"""Fast HTML parsing for the scraped sources.
+
+Each page is parsed into a full element tree by lxml's C parser, which is
+much faster than building a BeautifulSoup tree, and scrapers pick out the
+elements they read with XPath.
+"""
+from functools import lru_cache
+import lxml.etree
+import lxml.html
+
+
+def parse_html(content):
+    """Parse a page into an lxml element tree, or None if there is nothing to parse"""
+    if isinstance(content, bytes):
+        # Every source serves UTF-8; lxml would otherwise guess Latin-1 for pages without a charset
+        content = content.decode('utf-8', errors='replace')
+    try:
+        return lxml.html.fromstring(content)
+    except (lxml.etree.ParserError, ValueError):
+        return None
+
+
+def has_class(*names):
+    """XPath predicate matching elements with any of the given CSS classes"""
+    return ' or '.join(f'contains(concat(" ", normalize-space(@class), " "), " {name} ")' for name in names)
+
+
+@lru_cache(maxsize=128)
+def _first_xpath(path):
+    # Scrapers call first() once per result row, so compile each expression once
+    return lxml.etree.XPath(f'({path})[1]')
+
+
+def first(element, path):
+    """Return the first element matching an XPath expression, or None"""
+    matches = _first_xpath(path)(element)
+    return matches[0] if matches else None
@@ -0,0 +1,349 @@
+import csv
+import io
+import logging
+import os
+import queue
+import sqlite3
+import threading
+import time
+import uuid
+from matching import split_title_author
+from search_cache import normalize_text
+from shared_state import process_id
+
+# Job states; queued and running jobs are picked up again after a restart
+QUEUED = 'queued'
+RUNNING = 'running'
+DONE = 'done'
+FAILED = 'failed'
+CANCELLED = 'cancelled'
+UNFINISHED = (QUEUED, RUNNING)
+
+
+def parse_books_csv(text):
+    """Read (title, author) rows from CSV text, with or without a title,author header, or "Title – Author" lines"""
+    rows = [row for row in csv.reader(io.StringIO(text)) if any(cell.strip() for cell in row)]
+    if not rows:
+        return []
+
+    header = [cell.strip().lower() for cell in rows[0]]
+    if 'title' in header and 'author' in header:
+        title_col, author_col = header.index('title'), header.index('author')
+        rows = rows[1:]
+    else:
+        title_col, author_col = 0, 1
+
+    books = []
+    for row in rows:
+        if len(row) > max(title_col, author_col):
+            books.append({'title': row[title_col], 'author': row[author_col]})
+        elif len(row) == 1:
+            # A single "Title – Author" column, as typed into the search box
+            title, author = split_title_author(row[0])
+            if author:
+                books.append({'title': title, 'author': author})
+    return books
+
+
+class JobStore:
+    """SQLite record of jobs, their books and every result found so far"""
+
+    def __init__(self, path=None):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path or ':memory:', check_same_thread=False)
+        if path:
+            self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.executescript(
+            'CREATE TABLE IF NOT EXISTS jobs ('
+            ' id TEXT PRIMARY KEY, status TEXT NOT NULL, total INTEGER NOT NULL, done INTEGER NOT NULL DEFAULT 0,'
+            ' created_at REAL NOT NULL, updated_at REAL NOT NULL, error TEXT);'
+            'CREATE TABLE IF NOT EXISTS job_books ('
+            ' job_id TEXT NOT NULL, position INTEGER NOT NULL, title TEXT NOT NULL, author TEXT NOT NULL,'
+            ' done INTEGER NOT NULL DEFAULT 0, PRIMARY KEY (job_id, position));'
+            'CREATE TABLE IF NOT EXISTS job_results ('
+            ' id INTEGER PRIMARY KEY AUTOINCREMENT, job_id TEXT NOT NULL, position INTEGER NOT NULL,'
+            ' source TEXT NOT NULL, link TEXT, kind TEXT NOT NULL);'
+            'CREATE INDEX IF NOT EXISTS job_results_job ON job_results (job_id, id);'
+        )
+        # Stores created before jobs had leases lack these columns
+        columns = {row[1] for row in self._conn.execute('PRAGMA table_info(jobs)')}
+        for column, kind in (('owner', 'TEXT'), ('lease_until', 'REAL')):
+            if column not in columns:
+                self._conn.execute(f'ALTER TABLE jobs ADD COLUMN {column} {kind}')
+        self._conn.commit()
+
+    @classmethod
+    def from_env(cls):
+        return cls(os.environ.get('BOOK_JOBS_PATH', 'book_jobs.sqlite3') or None)
+
+    def create(self, books):
+        job_id = uuid.uuid4().hex
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                'INSERT INTO jobs (id, status, total, created_at, updated_at) VALUES (?, ?, ?, ?, ?)',
+                (job_id, QUEUED, len(books), now, now)
+            )
+            self._conn.executemany(
+                'INSERT INTO job_books (job_id, position, title, author) VALUES (?, ?, ?, ?)',
+                [(job_id, position, book['title'], book['author']) for position, book in enumerate(books)]
+            )
+            self._conn.commit()
+        return job_id
+
+    def get(self, job_id):
+        with self._lock:
+            row = self._conn.execute(
+                'SELECT id, status, total, done, created_at, updated_at, error FROM jobs WHERE id = ?', (job_id,)
+            ).fetchone()
+            if row is None:
+                return None
+            counts = dict(self._conn.execute(
+                'SELECT kind, COUNT(*) FROM job_results WHERE job_id = ? GROUP BY kind', (job_id,)
+            ).fetchall())
+        job_id, status, total, done, created_at, updated_at, error = row
+        return {
+            'id': job_id,
+            'status': status,
+            'total': total,
+            'done': done,
+            'results': counts.get('result', 0),
+            'timed_out': counts.get('timeout', 0),
+            'created_at': created_at,
+            'updated_at': updated_at,
+            'error': error,
+        }
+
+    def set_status(self, job_id, status, error=None):
+        with self._lock:
+            self._conn.execute(
+                'UPDATE jobs SET status = ?, error = ?, updated_at = ? WHERE id = ?',
+                (status, error, time.time(), job_id)
+            )
+            self._conn.commit()
+
+    def claimable(self):
+        """Return queued jobs, and running ones whose lease ran out, oldest first"""
+        with self._lock:
+            rows = self._conn.execute(
+                'SELECT id FROM jobs WHERE status = ? OR (status = ? AND (lease_until IS NULL OR lease_until < ?)) '
+                'ORDER BY created_at', (QUEUED, RUNNING, time.time())
+            ).fetchall()
+        return [job_id for job_id, in rows]
+
+    def claim(self, job_id, owner, lease):
+        """Mark a claimable job running for owner for the next `lease` seconds; False if it is not claimable"""
+        now = time.time()
+        with self._lock:
+            cursor = self._conn.execute(
+                'UPDATE jobs SET status = ?, owner = ?, lease_until = ?, updated_at = ? '
+                'WHERE id = ? AND (status = ? OR (status = ? AND (lease_until IS NULL OR lease_until < ?)))',
+                (RUNNING, owner, now + lease, now, job_id, QUEUED, RUNNING, now)
+            )
+            self._conn.commit()
+        return cursor.rowcount == 1
+
+    def renew(self, job_id, owner, lease):
+        """Extend owner's lease on a running job; False if the job was cancelled or taken over"""
+        with self._lock:
+            cursor = self._conn.execute(
+                'UPDATE jobs SET lease_until = ? WHERE id = ? AND status = ? AND owner = ?',
+                (time.time() + lease, job_id, RUNNING, owner)
+            )
+            self._conn.commit()
+        return cursor.rowcount == 1
+
+    def pending_books(self, job_id):
+        """Return (position, title, author) for every book not searched yet"""
+        with self._lock:
+            return self._conn.execute(
+                'SELECT position, title, author FROM job_books WHERE job_id = ? AND done = 0 ORDER BY position', (job_id,)
+            ).fetchall()
+
+    def save_books(self, job_id, positions, rows):
+        """Store the result rows (position, source, link, kind) and mark the books done, atomically"""
+        with self._lock:
+            # Rows left by an interrupted attempt at these books are replaced
+            self._conn.executemany(
+                'DELETE FROM job_results WHERE job_id = ? AND position = ?', [(job_id, position) for position in positions]
+            )
+            self._conn.executemany(
+                'INSERT INTO job_results (job_id, position, source, link, kind) VALUES (?, ?, ?, ?, ?)',
+                [(job_id, position, source, link, kind) for position, source, link, kind in rows]
+            )
+            self._conn.executemany(
+                'UPDATE job_books SET done = 1 WHERE job_id = ? AND position = ?', [(job_id, position) for position in positions]
+            )
+            self._conn.execute(
+                'UPDATE jobs SET done = (SELECT COUNT(*) FROM job_books WHERE job_id = ? AND done = 1), updated_at = ? WHERE id = ?',
+                (job_id, time.time(), job_id)
+            )
+            self._conn.commit()
+
+    def results_since(self, job_id, after_id=0):
+        """Return result rows stored after the given row id, oldest first"""
+        with self._lock:
+            rows = self._conn.execute(
+                'SELECT r.id, r.position, b.title, b.author, r.source, r.link, r.kind FROM job_results r '
+                'JOIN job_books b ON b.job_id = r.job_id AND b.position = r.position '
+                'WHERE r.job_id = ? AND r.id > ? ORDER BY r.id', (job_id, after_id)
+            ).fetchall()
+        return [
+            {'id': row_id, 'position': position, 'title': title, 'author': author, 'source': source, 'link': link, 'kind': kind}
+            for row_id, position, title, author, source, link, kind in rows
+        ]
+
+    def books(self, job_id):
+        """Return every book of a job with its links and timed out sources, in submission order"""
+        with self._lock:
+            books = [
+                {'title': title, 'author': author, 'done': bool(done), 'results': [], 'timed_out': []}
+                for title, author, done in self._conn.execute(
+                    'SELECT title, author, done FROM job_books WHERE job_id = ? ORDER BY position', (job_id,)
+                )
+            ]
+            rows = self._conn.execute(
+                'SELECT position, source, link, kind FROM job_results WHERE job_id = ? ORDER BY id', (job_id,)
+            ).fetchall()
+        for position, source, link, kind in rows:
+            if kind == 'result':
+                books[position]['results'].append({'source': source, 'link': link})
+            else:
+                books[position]['timed_out'].append(source)
+        return books
+
+
+class JobManager:
+    """Runs submitted book lists on background workers through a BookSearcher.
+
+    At most `workers` jobs run at once. Each job is searched `chunk_size`
+    books at a time and every chunk's results are saved before the next
+    starts, so a job interrupted by a restart resumes from its first
+    unsearched book.
+
+    Several server processes may share one store. A job runs in whichever
+    process claims it, under a `lease` (seconds) renewed after every chunk;
+    idle workers look for claimable jobs every `poll_interval` seconds, so
+    a job whose process died is taken over once its lease runs out.
+    """
+
+    def __init__(self, searcher, store, workers=2, chunk_size=25, lease=120.0, poll_interval=15.0):
+        self.searcher = searcher
+        self.store = store
+        self.workers = workers
+        self.chunk_size = chunk_size
+        self.lease = lease
+        self.poll_interval = poll_interval
+        self.owner = None
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._started = False
+
+    @classmethod
+    def from_env(cls, searcher):
+        return cls(
+            searcher,
+            JobStore.from_env(),
+            workers=int(os.environ.get('BOOK_JOB_WORKERS', 2)),
+            chunk_size=int(os.environ.get('BOOK_JOB_CHUNK', 25)),
+        )
+
+    def start(self):
+        """Start the workers and requeue jobs left unfinished by a previous run"""
+        if self._started:
+            return
+        with self._lock:
+            if self._started:
+                return
+            self._started = True
+            self.owner = process_id()
+            for job_id in self.store.claimable():
+                logging.info(f"Resuming job {job_id}")
+                self._queue.put(job_id)
+            for number in range(self.workers):
+                threading.Thread(target=self._work, name=f"job-worker-{number}", daemon=True).start()
+
+    def submit(self, books):
+        job_id = self.store.create(books)
+        self._queue.put(job_id)
+        return job_id
+
+    def cancel(self, job_id):
+        """Stop a queued or running job after its current chunk; returns False if it already finished"""
+        job = self.store.get(job_id)
+        if job is None or job['status'] not in UNFINISHED:
+            return False
+        self.store.set_status(job_id, CANCELLED)
+        return True
+
+    def _work(self):
+        while True:
+            try:
+                job_id = self._queue.get(timeout=self.poll_interval)
+            except queue.Empty:
+                # Pick up jobs queued by other processes or abandoned by dead ones
+                for job_id in self.store.claimable():
+                    self._queue.put(job_id)
+                continue
+            try:
+                self._run(job_id)
+            except Exception as e:
+                logging.error(f"Job {job_id} failed: {str(e)}")
+                self.store.set_status(job_id, FAILED, str(e))
+            finally:
+                self._queue.task_done()
+
+    def _run(self, job_id):
+        job = self.store.get(job_id)
+        if job is None or job['status'] not in UNFINISHED:
+            return
+        if not self.store.claim(job_id, self.owner, self.lease):
+            return
+
+        pending = self.store.pending_books(job_id)
+        for start in range(0, len(pending), self.chunk_size):
+            if self.store.get(job_id)['status'] == CANCELLED:
+                logging.info(f"Job {job_id} cancelled")
+                return
+            if not self.store.renew(job_id, self.owner, self.lease):
+                logging.info(f"Job {job_id} was taken over by another process")
+                return
+            self._search_chunk(job_id, pending[start:start + self.chunk_size])
+
+        if self.store.get(job_id)['status'] != CANCELLED:
+            self.store.set_status(job_id, DONE)
+            logging.info(f"Job {job_id} finished")
+
+    def _search_chunk(self, job_id, chunk):
+        books = [{'title': title, 'author': author} for _, title, author in chunk]
+
+        # The searcher answers a book listed twice only once, so map answers back to every position
+        positions = {}
+        for position, title, author in chunk:
+            positions.setdefault((normalize_text(title.strip()), normalize_text(author.strip())), []).append(position)
+
+        rows = []
+        for event, payload in self.searcher.iter_search_books(books):
+            if event not in ('result', 'timeout'):
+                continue
+            key = (normalize_text(payload['title'].strip()), normalize_text(payload['author'].strip()))
+            for position in positions.get(key, []):
+                rows.append((position, payload['source'], payload.get('link'), event))
+
+        self.store.save_books(job_id, [position for position, _, _ in chunk], rows)
+
+
+def export_csv(books):
+    """One row per link found, plus a row for each book with none"""
+    output = io.StringIO()
+    writer = csv.writer(output)
+    writer.writerow(['title', 'author', 'source', 'link', 'timed_out'])
+    for book in books:
+        timed_out = ';'.join(book['timed_out'])
+        for result in book['results']:
+            writer.writerow([book['title'], book['author'], result['source'], result['link'], timed_out])
+        if not book['results']:
+            writer.writerow([book['title'], book['author'], '', '', timed_out])
+    return output.getvalue()
+
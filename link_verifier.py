@@ -0,0 +1,220 @@
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlparse
+import requests
+from deadline import DeadlineExceeded
+
+# Check outcomes; a 429 or similar says nothing about the link and is dropped
+OK = 'ok'
+GONE = 'gone'
+FAILED = 'failed'
+
+# Answers that prove a link is dead; other failures may be transient
+GONE_STATUSES = {404, 410}
+
+
+class LinkVerifier:
+    """Re-checks found links in the background, stale-while-revalidate style.
+
+    Searches serve a cached link straight away and pass it to refresh();
+    once the link is older than `verify_after` seconds it is queued. A
+    worker thread takes the queue in batches of up to `batch_size`, groups
+    them by host and sends HEAD requests, hosts in parallel but at most
+    `host_rate` per second to any one host. A link that checks out is
+    stored again, restarting its age. One that is gone (404/410) or fails
+    `max_failures` checks in a row is evicted from the cache and remembered
+    as bad, so searches stop returning it. Other server processes learn
+    about bad links through export_shared() and import_shared().
+    """
+
+    def __init__(self, cache, session, verify_after=24 * 3600, max_failures=3, retry_after=600.0, batch_size=50,
+                 host_rate=2.0, host_workers=4, timeout=10.0, max_queue=10000, max_bad_links=10000, politeness=None):
+        self.cache = cache
+        self.session = session
+        self.politeness = politeness
+        self.verify_after = verify_after
+        self.max_failures = max_failures
+        self.retry_after = retry_after
+        self.batch_size = batch_size
+        self.host_rate = host_rate
+        self.host_workers = host_workers
+        self.timeout = timeout
+        self.max_queue = max_queue
+        self.max_bad_links = max_bad_links
+        self._lock = threading.Lock()
+        self._ready = threading.Condition(self._lock)
+        self._queue = OrderedDict()
+        self._checked_at = {}
+        self._failures = {}
+        self._bad = OrderedDict()
+        self._new_bad = {}
+        self._host_next = {}
+        self._started = False
+        self._stats = {'queued': 0, 'dropped': 0, 'verified': 0, 'failed': 0, 'evicted': 0}
+
+    @classmethod
+    def from_env(cls, cache, session, politeness=None):
+        return cls(
+            cache,
+            session,
+            politeness=politeness,
+            verify_after=float(os.environ.get('BOOK_LINK_VERIFY_AFTER', 24 * 3600)),
+            max_failures=int(os.environ.get('BOOK_LINK_MAX_FAILURES', 3)),
+            host_rate=float(os.environ.get('BOOK_LINK_VERIFY_RATE', 2.0)),
+        )
+
+    def refresh(self, title, author, source, link, age):
+        """Queue a cached link that was just served if it is due for a re-check"""
+        if link and age >= self.verify_after:
+            self.submit(title, author, source, link)
+
+    def submit(self, title, author, source, link):
+        """Queue a link for checking, unless it is queued already or failed a check recently"""
+        with self._lock:
+            if link in self._queue or link in self._bad:
+                return
+            checked_at = self._checked_at.get(link)
+            if checked_at is not None and time.time() - checked_at < self.retry_after:
+                return
+            if len(self._queue) >= self.max_queue:
+                self._stats['dropped'] += 1
+                return
+            self._queue[link] = (title, author, source)
+            self._stats['queued'] += 1
+            self._ready.notify()
+        self._start()
+
+    def is_bad(self, link):
+        """True for a link evicted after failing verification"""
+        with self._lock:
+            return link in self._bad
+
+    def stats(self):
+        with self._lock:
+            return {**self._stats, 'pending': len(self._queue), 'failing': len(self._failures), 'bad_links': len(self._bad)}
+
+    def export_shared(self):
+        """Links found bad since the last call, with when"""
+        with self._lock:
+            new_bad, self._new_bad = self._new_bad, {}
+            return new_bad
+
+    def import_shared(self, values):
+        """Remember links other processes found bad"""
+        with self._lock:
+            for link, bad_at in values.items():
+                self._queue.pop(link, None)
+                self._remember_bad(link, bad_at)
+
+    def _remember_bad(self, link, bad_at):
+        self._bad[link] = bad_at
+        while len(self._bad) > self.max_bad_links:
+            self._bad.popitem(last=False)
+
+    def _start(self):
+        # Started on first use, so a forked server process runs its own worker
+        if self._started:
+            return
+        with self._lock:
+            if self._started:
+                return
+            self._started = True
+            self._executor = ThreadPoolExecutor(max_workers=self.host_workers, thread_name_prefix='link-check')
+            threading.Thread(target=self._work, name='link-verifier', daemon=True).start()
+
+    def _work(self):
+        while True:
+            with self._ready:
+                while not self._queue:
+                    self._ready.wait()
+                now = time.time()
+                batch = []
+                while self._queue and len(batch) < self.batch_size:
+                    link, book = self._queue.popitem(last=False)
+                    self._checked_at[link] = now
+                    batch.append((link, book))
+
+            by_host = {}
+            for link, book in batch:
+                by_host.setdefault(urlparse(link).netloc, []).append((link, book))
+
+            # Hosts are checked in parallel, each host's links one after another
+            futures = [self._executor.submit(self._check_host, host, links) for host, links in by_host.items()]
+            for future in futures:
+                try:
+                    future.result()
+                except Exception as e:
+                    logging.error(f"Link verification failed: {str(e)}")
+
+    def _check_host(self, host, links):
+        for link, (title, author, source) in links:
+            with self._lock:
+                now = time.monotonic()
+                slot = max(now, self._host_next.get(host, now))
+                self._host_next[host] = slot + 1 / self.host_rate
+            if slot > now:
+                time.sleep(slot - now)
+            self._record(link, title, author, source, self._check(link))
+
+    def _request(self, method, link, **kwargs):
+        # Checks share the searches' per-host pacing, when there is one
+        if self.politeness is not None:
+            return self.politeness.request(self.session, method, link, limit=self.timeout, **kwargs)
+        return self.session.request(method, link, timeout=self.timeout, **kwargs)
+
+    def _check(self, link):
+        try:
+            response = self._request('HEAD', link, allow_redirects=True)
+            if response.status_code == 405:
+                # Some hosts refuse HEAD; fetch just the headers with a streamed GET
+                response = self._request('GET', link, stream=True)
+                response.close()
+        except requests.RequestException as e:
+            logging.info(f"Link check failed for {link}: {str(e)}")
+            return FAILED
+        except DeadlineExceeded:
+            # The host is throttling us or paused for longer than a check may wait; try again later
+            return None
+
+        if response.status_code < 400:
+            return OK
+        if response.status_code in GONE_STATUSES:
+            return GONE
+        if response.status_code == 429:
+            return None
+        return FAILED
+
+    def _record(self, link, title, author, source, result):
+        if result is None:
+            return
+
+        evict = False
+        with self._lock:
+            if result == OK:
+                self._stats['verified'] += 1
+                self._failures.pop(link, None)
+                self._checked_at.pop(link, None)
+            else:
+                self._stats['failed'] += 1
+                failures = self._failures[link] = self._failures.get(link, 0) + 1
+                if result == GONE or failures >= self.max_failures:
+                    evict = True
+                    self._stats['evicted'] += 1
+                    self._failures.pop(link, None)
+                    self._checked_at.pop(link, None)
+                    bad_at = self._new_bad[link] = time.time()
+                    self._remember_bad(link, bad_at)
+
+        # Only touch the entry if it still holds this link
+        if self.cache.get(title, author, source) != link:
+            return
+        if result == OK:
+            # Storing the link again restarts its age and TTL
+            self.cache.set(title, author, source, link)
+        elif evict:
+            logging.info(f"Evicting dead {source} link for {title}: {link}")
+            self.cache.delete(title, author, source)
@@ -1,4 +1,5 @@
 from app import app
 
+# Development server; in production run: gunicorn -c gunicorn.conf.py main:app
 if __name__ == '__main__':
     app.run(host='0.0.0.0', port=5000, debug=True)
@@ -0,0 +1,109 @@
+"""Title and author matching for search results.
+
+Result pages list many candidates (catalog rows, search hits, links) for
+each lookup. Titles and authors are normalized to token sets (case,
+diacritics, punctuation and articles ignored) and every candidate gets a
+score between 0 and 1, so scrapers only fetch or probe the ones that are
+plausibly the book asked for, best first.
+"""
+import re
+from urllib.parse import unquote, urlparse
+from search_cache import normalize_text
+
+# Words too common in titles to narrow a lookup
+TITLE_STOPWORDS = {'a', 'an', 'the', 'of', 'and', 'or', 'in', 'on', 'to'}
+
+# Words result pages put around a title: formats and download wording
+LISTING_WORDS = {'pdf', 'epub', 'mobi', 'azw3', 'djvu', 'txt', 'ebook', 'ebooks', 'free', 'download', 'html', 'by'}
+
+# The dash in "Title – Author": an en or em dash, or a hyphen-like dash with spaces around it
+TITLE_AUTHOR_SEPARATOR = re.compile('\\s*[\u2013\u2014\u2015]\\s*|\\s+[-\u2010\u2011\u2012\u2212]\\s+')
+
+# Minimum score for a candidate to be worth fetching
+MATCH_THRESHOLD = 0.65
+
+# How much of a title score comes from finding every wanted word, versus having no extra ones
+TITLE_RECALL_WEIGHT = 0.75
+
+
+def title_tokens(title):
+    return {token for token in normalize_text(title).split() if token not in TITLE_STOPWORDS}
+
+
+def author_tokens(authors):
+    # Catalog authors look like "Austen, Jane, 1775-1817; Other, Name [Editor]"
+    authors = re.sub(r'\[[^\]]*\]|\d+\??', ' ', authors or '')
+    return {token for token in normalize_text(authors).split() if len(token) > 1}
+
+
+def split_title_author(text):
+    """Split "Title – Author" at its last dash; returns (title, author), with author '' if there is none"""
+    parts = TITLE_AUTHOR_SEPARATOR.split(text.strip())
+    if len(parts) < 2:
+        return text.strip(), ''
+    return ' - '.join(parts[:-1]), parts[-1]
+
+
+def slug_text(url):
+    """The words of a URL's last path segment, e.g. 'pride and prejudice 0 pdf free'"""
+    segments = [segment for segment in urlparse(url).path.split('/') if segment]
+    if not segments:
+        return ''
+    slug = re.sub(r'\.\w+$', '', unquote(segments[-1]))
+    return re.sub(r'[-_+]+', ' ', slug)
+
+
+class BookMatcher:
+    """Scores candidates against one wanted title and author"""
+
+    def __init__(self, title, author, threshold=MATCH_THRESHOLD):
+        self.title = title_tokens(title)
+        self.author = author_tokens(author)
+        self.threshold = threshold
+
+    def score(self, text, author=None):
+        """Score a candidate title (or link text, or URL slug) between 0 and 1.
+
+        Pass the candidate's author when the page lists one: an author
+        sharing no name with the wanted one halves the score. Without it,
+        author names inside the text are neither noise nor evidence.
+        """
+        return self.score_tokens(title_tokens(text), None if author is None else author_tokens(author))
+
+    def score_tokens(self, found, listed=None):
+        """score() on text already split by title_tokens() and author_tokens()"""
+        if not self.title:
+            return 0.0
+
+        # Listing words, years and ids are noise unless the wanted title has them
+        found = {
+            token for token in found
+            if token in self.title or not (token in LISTING_WORDS or any(c.isdigit() for c in token))
+        }
+        if listed is None:
+            found -= self.author - self.title
+
+        matched = len(found & self.title)
+        if not matched:
+            return 0.0
+        score = TITLE_RECALL_WEIGHT * matched / len(self.title) + (1 - TITLE_RECALL_WEIGHT) * matched / len(found)
+
+        if listed is not None and self.author:
+            score *= 0.5 + 0.5 * len(listed & self.author) / len(self.author)
+        return score
+
+    def rank(self, candidates):
+        """Return the items of (item, text, author) candidates that pass the threshold, best first.
+
+        text may also be a list of alternative texts (say link text and URL
+        slug); the best scoring one counts. Ties keep page order.
+        """
+        scored = []
+        for position, (item, texts, author) in enumerate(candidates):
+            if isinstance(texts, str):
+                texts = [texts]
+            score = max((self.score(text, author) for text in texts), default=0.0)
+            if score >= self.threshold:
+                scored.append((-score, position, item))
+        scored.sort(key=lambda entry: entry[:2])
+        return [item for _, _, item in scored]
@@ -0,0 +1,222 @@
+"""Search metrics with Prometheus text exposition.
+
+A deliberately small registry (counters and histograms with labels) so the
+app needs no client library; render() produces the text format served on
+/metrics. snapshot() exports the values so several server processes can
+be rendered as one.
+"""
+import threading
+
+# Upper bounds in seconds, from a cache-speed lookup to a source budget running out
+DEFAULT_BUCKETS = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 25.0, 60.0)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(names, values, extra=None):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def _format_number(value):
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+
+class Counter:
+    """A monotonically increasing count per label set"""
+
+    kind = 'counter'
+
+    def __init__(self, name, help, labelnames=()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._values = {}
+
+    def inc(self, *labels, amount=1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def value(self, *labels):
+        with self._lock:
+            return self._values.get(labels, 0)
+
+    def snapshot(self):
+        with self._lock:
+            return [[list(labels), value] for labels, value in self._values.items()]
+
+    @staticmethod
+    def merge(snapshots):
+        """Sum snapshot() lists into {labels: value}"""
+        values = {}
+        for snapshot in snapshots:
+            for labels, value in snapshot:
+                values[tuple(labels)] = values.get(tuple(labels), 0) + value
+        return values
+
+    def samples(self, values=None):
+        if values is None:
+            with self._lock:
+                values = dict(self._values)
+        for labels, value in sorted(values.items()):
+            yield f"{self.name}{_format_labels(self.labelnames, labels)} {_format_number(value)}"
+
+
+class Histogram:
+    """Observations bucketed by upper bound, with their sum and count per label set"""
+
+    kind = 'histogram'
+
+    def __init__(self, name, help, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._lock = threading.Lock()
+        self._values = {}
+
+    def observe(self, value, *labels):
+        with self._lock:
+            entry = self._values.get(labels)
+            if entry is None:
+                entry = self._values[labels] = {'buckets': [0] * len(self.buckets), 'sum': 0.0, 'count': 0}
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    entry['buckets'][i] += 1
+            entry['sum'] += value
+            entry['count'] += 1
+
+    def snapshot(self):
+        with self._lock:
+            return [[list(labels), {**entry, 'buckets': list(entry['buckets'])}] for labels, entry in self._values.items()]
+
+    @staticmethod
+    def merge(snapshots):
+        """Sum snapshot() lists into {labels: entry}"""
+        values = {}
+        for snapshot in snapshots:
+            for labels, entry in snapshot:
+                total = values.get(tuple(labels))
+                if total is None:
+                    values[tuple(labels)] = {**entry, 'buckets': list(entry['buckets'])}
+                    continue
+                total['buckets'] = [a + b for a, b in zip(total['buckets'], entry['buckets'])]
+                total['sum'] += entry['sum']
+                total['count'] += entry['count']
+        return values
+
+    def samples(self, values=None):
+        if values is None:
+            with self._lock:
+                values = {labels: {**entry, 'buckets': list(entry['buckets'])} for labels, entry in self._values.items()}
+        for labels, entry in sorted(values.items()):
+            for bound, count in zip(self.buckets, entry['buckets']):
+                le = _format_labels(self.labelnames, labels, f'le="{_format_number(bound)}"')
+                yield f"{self.name}_bucket{le} {count}"
+            inf = _format_labels(self.labelnames, labels, 'le="+Inf"')
+            yield f"{self.name}_bucket{inf} {entry['count']}"
+            yield f"{self.name}_sum{_format_labels(self.labelnames, labels)} {_format_number(entry['sum'])}"
+            yield f"{self.name}_count{_format_labels(self.labelnames, labels)} {entry['count']}"
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._metrics = []
+
+    def counter(self, name, help, labelnames=()):
+        metric = Counter(name, help, labelnames)
+        self._metrics.append(metric)
+        return metric
+
+    def histogram(self, name, help, labelnames=(), buckets=DEFAULT_BUCKETS):
+        metric = Histogram(name, help, labelnames, buckets)
+        self._metrics.append(metric)
+        return metric
+
+    def snapshot(self):
+        """Every metric's values as JSON-serializable data"""
+        return {metric.name: metric.snapshot() for metric in self._metrics}
+
+    def render(self, snapshots=None):
+        """Return every metric in the Prometheus text exposition format.
+
+        Given snapshot() results (say, one per server process), renders
+        their sums instead of this registry's own values.
+        """
+        lines = []
+        for metric in self._metrics:
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            values = None
+            if snapshots is not None:
+                values = metric.merge(snapshot.get(metric.name, []) for snapshot in snapshots)
+            lines.extend(metric.samples(values))
+        return '\n'.join(lines) + '\n'
+
+
+class SearchMetrics:
+    """Per-source lookup and per-host upstream request metrics shared by both engines"""
+
+    def __init__(self, registry=None):
+        self.registry = registry or MetricsRegistry()
+        self.lookup_seconds = self.registry.histogram(
+            'book_source_lookup_seconds', 'Time to complete one source lookup', ['source'])
+        self.lookups = self.registry.counter(
+            'book_source_lookups_total', 'Source lookups by outcome (found, not_found, timeout, error)', ['source', 'outcome'])
+        self.cache_lookups = self.registry.counter(
+            'book_source_cache_total', 'Lookup cache checks by result (hit, miss)', ['source', 'result'])
+        self.request_seconds = self.registry.histogram(
+            'book_upstream_request_seconds', 'Time for one outbound request to an upstream host', ['host', 'method'])
+        self.requests = self.registry.counter(
+            'book_upstream_requests_total', 'Outbound requests by HTTP status, or error/timeout', ['host', 'method', 'status'])
+        self.response_bytes = self.registry.counter(
+            'book_upstream_response_bytes_total', 'Response body bytes received from upstream hosts, after decompression', ['host'])
+
+    def observe_lookup(self, source, outcome, seconds):
+        self.lookups.inc(source, outcome)
+        self.lookup_seconds.observe(seconds, source)
+
+    def observe_cache(self, source, hit):
+        self.cache_lookups.inc(source, 'hit' if hit else 'miss')
+
+    def observe_request(self, host, method, status, seconds):
+        self.requests.inc(host, method, str(status))
+        self.request_seconds.observe(seconds, host, method)
+
+    def observe_bytes(self, host, nbytes):
+        if nbytes:
+            self.response_bytes.inc(host, amount=nbytes)
+
+    def snapshot(self):
+        return self.registry.snapshot()
+
+    def render(self, snapshots=None):
+        return self.registry.render(snapshots)
+
+
+class RequestTimings:
+    """Time spent in each source's lookups during one search request"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._sources = {}
+
+    def add(self, source, seconds):
+        with self._lock:
+            entry = self._sources.setdefault(source, [0.0, 0.0])
+            entry[0] += seconds
+            entry[1] = max(entry[1], seconds)
+
+    def merge_into(self, summary):
+        """Add 'seconds' (total) and 'slowest_seconds' to each source's summary counts"""
+        with self._lock:
+            for source, counts in summary.items():
+                total, slowest = self._sources.get(source, (0.0, 0.0))
+                counts['seconds'] = round(total, 3)
+                counts['slowest_seconds'] = round(slowest, 3)
+        return summary
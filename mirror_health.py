@@ -0,0 +1,229 @@
+import json
+import logging
+import os
+import threading
+import time
+from collections import deque
+
+# Circuit breaker states
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half_open'
+
+
+class MirrorHealth:
+    """Rolling health of one mirror: latency EWMA, error rate and breaker state"""
+
+    def __init__(self, prior_latency=2.0):
+        self.latency_ewma = prior_latency
+        self.error_rate = 0.0
+        self.samples = 0
+        self.consecutive_failures = 0
+        self.state = CLOSED
+        self.open_until = 0.0
+        self.cooldown = 0.0
+        self.trial_in_flight = False
+        self.recent_latencies = deque(maxlen=50)
+
+    def to_dict(self):
+        return {
+            'latency_ewma': self.latency_ewma,
+            'error_rate': self.error_rate,
+            'samples': self.samples,
+            'consecutive_failures': self.consecutive_failures,
+            'state': self.state,
+            'open_until': self.open_until,
+            'cooldown': self.cooldown,
+            'recent_latencies': list(self.recent_latencies),
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        health = cls()
+        health.latency_ewma = data.get('latency_ewma', health.latency_ewma)
+        health.error_rate = data.get('error_rate', 0.0)
+        health.samples = data.get('samples', 0)
+        health.consecutive_failures = data.get('consecutive_failures', 0)
+        health.state = data.get('state', CLOSED)
+        health.open_until = data.get('open_until', 0.0)
+        health.cooldown = data.get('cooldown', 0.0)
+        health.recent_latencies.extend(data.get('recent_latencies', []))
+        # A trial from a previous process never finished
+        if health.state == HALF_OPEN:
+            health.state = OPEN
+        return health
+
+
+class MirrorHealthTracker:
+    """Tracks mirror health across requests and orders mirrors by it.
+
+    Mirrors whose breaker is open are skipped until their cooldown ends,
+    then get a single half-open trial request. State is saved to a JSON
+    file (at most every `save_interval` seconds) so it survives restarts,
+    and exchanged with other server processes through export_shared() and
+    import_shared().
+    """
+
+    def __init__(self, path=None, alpha=0.2, failure_threshold=3, base_cooldown=30.0, max_cooldown=600.0,
+                 save_interval=30.0):
+        self.path = path
+        self.alpha = alpha
+        self.failure_threshold = failure_threshold
+        self.base_cooldown = base_cooldown
+        self.max_cooldown = max_cooldown
+        self.save_interval = save_interval
+        self._lock = threading.Lock()
+        self._save_lock = threading.Lock()
+        self._mirrors = {}
+        self._dirty = set()
+        self._last_save = 0.0
+        if path:
+            self._load()
+
+    @classmethod
+    def from_env(cls):
+        return cls(path=os.environ.get('BOOK_MIRROR_HEALTH_PATH', 'libgen_mirrors.json') or None)
+
+    def _get(self, mirror):
+        health = self._mirrors.get(mirror)
+        if health is None:
+            health = self._mirrors[mirror] = MirrorHealth()
+        return health
+
+    def _available(self, health, now):
+        if health.state == CLOSED:
+            return True
+        if health.state == OPEN and now >= health.open_until:
+            return True
+        return health.state == HALF_OPEN and not health.trial_in_flight
+
+    def ordered(self, mirrors):
+        """Return the mirrors worth trying, healthiest first.
+
+        Mirrors with an open breaker are left out; if every mirror is open,
+        the one whose cooldown ends first is returned so lookups still try.
+        """
+        now = time.time()
+        with self._lock:
+            available = []
+            for position, mirror in enumerate(mirrors):
+                health = self._get(mirror)
+                if self._available(health, now):
+                    score = health.latency_ewma * (1 + 4 * health.error_rate)
+                    available.append((score, position, mirror))
+            if not available:
+                return sorted(mirrors, key=lambda m: self._get(m).open_until)[:1]
+            return [mirror for _, _, mirror in sorted(available)]
+
+    def begin(self, mirror):
+        """Mark a request as starting; turns an expired open breaker into a half-open trial"""
+        with self._lock:
+            health = self._get(mirror)
+            if health.state == OPEN and time.time() >= health.open_until:
+                health.state = HALF_OPEN
+            if health.state == HALF_OPEN:
+                health.trial_in_flight = True
+
+    def cancel(self, mirror):
+        """Forget a request that was abandoned before it finished"""
+        with self._lock:
+            self._get(mirror).trial_in_flight = False
+
+    def record_success(self, mirror, latency):
+        with self._lock:
+            health = self._get(mirror)
+            health.latency_ewma = latency if health.samples == 0 else (1 - self.alpha) * health.latency_ewma + self.alpha * latency
+            health.error_rate *= (1 - self.alpha)
+            health.samples += 1
+            health.consecutive_failures = 0
+            health.recent_latencies.append(latency)
+            health.state = CLOSED
+            health.cooldown = 0.0
+            health.trial_in_flight = False
+            self._dirty.add(mirror)
+        self._maybe_save()
+
+    def record_failure(self, mirror, latency):
+        with self._lock:
+            health = self._get(mirror)
+            # A failure costs at least as much as the time it took to fail
+            health.latency_ewma = max(health.latency_ewma, (1 - self.alpha) * health.latency_ewma + self.alpha * latency)
+            health.error_rate = (1 - self.alpha) * health.error_rate + self.alpha
+            health.samples += 1
+            health.consecutive_failures += 1
+            health.trial_in_flight = False
+
+            if health.state == HALF_OPEN or health.consecutive_failures >= self.failure_threshold:
+                # Back off longer each time the breaker re-opens
+                health.cooldown = min(self.max_cooldown, health.cooldown * 2 or self.base_cooldown)
+                health.state = OPEN
+                health.open_until = time.time() + health.cooldown
+                logging.warning(f"Mirror {mirror} circuit opened for {health.cooldown:.0f}s")
+            self._dirty.add(mirror)
+        self._maybe_save()
+
+    def hedge_delay(self, mirror, min_samples=5):
+        """Return the mirror's p90 latency, or None until there are enough samples"""
+        with self._lock:
+            latencies = sorted(self._get(mirror).recent_latencies)
+        if len(latencies) < min_samples:
+            return None
+        return latencies[min(len(latencies) - 1, int(len(latencies) * 0.9))]
+
+    def stats(self):
+        with self._lock:
+            return {
+                mirror: {
+                    'state': health.state,
+                    'latency_ewma': round(health.latency_ewma, 3),
+                    'error_rate': round(health.error_rate, 3),
+                    'samples': health.samples,
+                }
+                for mirror, health in self._mirrors.items()
+            }
+
+    def export_shared(self):
+        """Health of the mirrors updated since the last call"""
+        with self._lock:
+            dirty, self._dirty = self._dirty, set()
+            return {mirror: self._mirrors[mirror].to_dict() for mirror in dirty}
+
+    def import_shared(self, values):
+        """Adopt mirror health recorded by other processes, unless this one has newer news"""
+        with self._lock:
+            for mirror, entry in values.items():
+                if mirror not in self._dirty:
+                    self._mirrors[mirror] = MirrorHealth.from_dict(entry)
+
+    def _load(self):
+        if not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, encoding='utf-8') as f:
+                data = json.load(f)
+            self._mirrors = {mirror: MirrorHealth.from_dict(entry) for mirror, entry in data.items()}
+        except (OSError, ValueError) as e:
+            logging.warning(f"Could not load mirror health from {self.path}: {str(e)}")
+
+    def _maybe_save(self):
+        if not self.path:
+            return
+        with self._lock:
+            if time.time() - self._last_save < self.save_interval:
+                return
+            self._last_save = time.time()
+        self.save()
+
+    def save(self):
+        if not self.path:
+            return
+        with self._lock:
+            data = {mirror: health.to_dict() for mirror, health in self._mirrors.items()}
+        try:
+            with self._save_lock:
+                tmp_path = f"{self.path}.tmp"
+                with open(tmp_path, 'w', encoding='utf-8') as f:
+                    json.dump(data, f)
+                os.replace(tmp_path, self.path)
+        except OSError as e:
+            logging.warning(f"Could not save mirror health to {self.path}: {str(e)}")
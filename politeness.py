@@ -0,0 +1,293 @@
+"""Per-host pacing and retries for outbound requests.
+
+Every request to an upstream host first takes a token from that host's
+bucket, so the bursts large book lists cause are spread out to the host's
+rate. A 429 or 503 answer pauses the host for its Retry-After (or a
+backoff) and halves its rate, which then creeps back up with every
+answer that is not a throttle. Retryable answers, refused or dropped
+connections and timeouts are retried with jittered exponential backoff
+while the caller's deadline allows.
+"""
+import asyncio
+import logging
+import os
+import random
+import threading
+import time
+from email.utils import parsedate_to_datetime
+from urllib.parse import urlparse
+import requests
+from deadline import Deadline, DeadlineExceeded
+
+# Answers worth retrying; 429 and 503 also mean the host wants us to slow down
+RETRYABLE_STATUSES = {429, 502, 503, 504}
+THROTTLE_STATUSES = {429, 503}
+
+
+class HostThrottled(DeadlineExceeded):
+    """The host kept throttling us until the retries or the deadline ran out.
+
+    A DeadlineExceeded, so lookups report it as a timeout and never cache it
+    as "not found".
+    """
+
+
+def parse_retry_after(value, now=None):
+    """Seconds to wait according to a Retry-After header (seconds or an HTTP date), or None"""
+    if not value:
+        return None
+    value = value.strip()
+    if value.isdigit():
+        return float(value)
+    try:
+        when = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    return max(0.0, when.timestamp() - (time.time() if now is None else now))
+
+
+class HostBucket:
+    """Token bucket of one host; a rate of None means unpaced, though throttle pauses still apply"""
+
+    def __init__(self, rate):
+        self.max_rate = rate
+        self.rate = rate
+        self.burst = max(1.0, rate) if rate else None
+        self.tokens = self.burst
+        self.updated = time.monotonic()
+        self.paused_until = 0.0
+        self.throttled = 0
+
+    def _refill(self, now):
+        if now > self.updated:
+            if self.rate:
+                self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+
+    def reserve(self, now, max_wait):
+        """Take the next free slot and return the seconds until it, or None (taking nothing) if that is over max_wait.
+
+        Tokens may go negative; each one below zero is a slot already
+        promised to a waiting request.
+        """
+        self._refill(now)
+        if not self.rate:
+            wait = max(0.0, self.paused_until - now)
+            return wait if wait <= max_wait else None
+        ready = self.updated + max(0.0, 1 - self.tokens) / self.rate
+        if ready - now > max_wait:
+            return None
+        self.tokens -= 1
+        return max(0.0, ready - now)
+
+    def throttle(self, now, pause, min_rate):
+        """Send nothing for `pause` seconds, then resume at half the rate with a single request"""
+        self._refill(now)
+        self.throttled += 1
+        # Answers to requests sent before the pause began cut the rate only once
+        if self.rate and now >= self.paused_until:
+            self.rate = max(min_rate, self.rate / 2)
+        until = now + pause
+        if until > self.paused_until:
+            self.paused_until = until
+            if self.rate:
+                self.updated = until
+                self.tokens = min(self.tokens, 1.0)
+
+    def recover(self, step):
+        if self.rate:
+            self.rate = min(self.max_rate, self.rate + step * self.max_rate)
+
+
+class PolitenessScheduler:
+    """Paces and retries the outbound requests of both search engines, per host.
+
+    Hosts are paced at the rate given to configure(), or `default_rate`
+    requests per second, times `scale`; a scale of 0 turns pacing off.
+    Throttled hosts are paused for at most `max_pause` seconds and
+    requests are retried up to `max_retries` times. Pauses are shared
+    with other server processes through export_shared() and
+    import_shared().
+    """
+
+    def __init__(self, default_rate=4.0, scale=1.0, max_retries=2, base_backoff=0.5, max_backoff=30.0,
+                 max_pause=600.0, min_rate=0.2, recovery=0.05):
+        self.default_rate = default_rate
+        self.scale = scale
+        self.max_retries = max_retries
+        self.base_backoff = base_backoff
+        self.max_backoff = max_backoff
+        self.max_pause = max_pause
+        self.min_rate = min_rate
+        self.recovery = recovery
+        self._lock = threading.Lock()
+        self._buckets = {}
+        self._new_pauses = {}
+        self._stats = {'retries': 0, 'waits': 0, 'waited_seconds': 0.0, 'deadline_refusals': 0}
+
+    @classmethod
+    def from_env(cls):
+        # Each server worker process paces itself to its share of every host's rate
+        workers = max(1, int(os.environ.get('BOOK_SERVER_WORKERS', 1)))
+        return cls(
+            default_rate=float(os.environ.get('BOOK_HOST_RATE', 4.0)),
+            scale=float(os.environ.get('BOOK_HOST_RATE_SCALE', 1.0)) / workers,
+            max_retries=int(os.environ.get('BOOK_HOST_RETRIES', 2)),
+        )
+
+    def configure(self, host, rate):
+        """Pace a host (netloc) at `rate` requests per second, before scaling"""
+        with self._lock:
+            self._buckets[host] = HostBucket(rate * self.scale or None)
+
+    def _bucket(self, host):
+        bucket = self._buckets.get(host)
+        if bucket is None:
+            bucket = self._buckets[host] = HostBucket(self.default_rate * self.scale or None)
+        return bucket
+
+    def _reserve(self, host, max_wait):
+        with self._lock:
+            wait = self._bucket(host).reserve(time.monotonic(), max_wait)
+            if wait is None:
+                self._stats['deadline_refusals'] += 1
+            elif wait > 0:
+                self._stats['waits'] += 1
+                self._stats['waited_seconds'] += wait
+            return wait
+
+    def _paused(self, host):
+        with self._lock:
+            return self._bucket(host).paused_until > time.monotonic()
+
+    def acquire(self, host, deadline=None):
+        """Wait for the host's next free slot; raises HostThrottled at once if it comes after the deadline"""
+        while True:
+            wait = self._reserve(host, deadline.remaining() if deadline is not None else float('inf'))
+            if wait is None:
+                # Fail fast, so a paused host does not hold the caller's worker for its whole budget
+                raise HostThrottled(f'no request slot for {host} before the deadline')
+            if wait > 0:
+                time.sleep(wait)
+            # A throttle answer that arrived meanwhile paused the host; queue again behind the pause
+            if not self._paused(host):
+                return
+
+    async def acquire_async(self, host, deadline=None):
+        """acquire() for coroutines"""
+        while True:
+            wait = self._reserve(host, deadline.remaining() if deadline is not None else float('inf'))
+            if wait is None:
+                raise HostThrottled(f'no request slot for {host} before the deadline')
+            if wait > 0:
+                await asyncio.sleep(wait)
+            if not self._paused(host):
+                return
+
+    def _backoff(self, attempt):
+        # Half fixed, half random, so retries from many lookups spread out
+        cap = min(self.max_backoff, self.base_backoff * 2 ** attempt)
+        return cap / 2 + random.uniform(0, cap / 2)
+
+    def after_response(self, host, status, retry_after, attempt):
+        """Adjust the host's pacing to an answer and return the seconds to wait before retrying it, or None"""
+        if status not in RETRYABLE_STATUSES:
+            with self._lock:
+                self._bucket(host).recover(self.recovery)
+            return None
+
+        delay = parse_retry_after(retry_after)
+        if delay is None:
+            delay = self._backoff(attempt)
+        delay = min(delay, self.max_pause)
+        if status in THROTTLE_STATUSES:
+            logging.info(f"{host} answered {status}, pausing it for {delay:.1f}s")
+            with self._lock:
+                self._bucket(host).throttle(time.monotonic(), delay, self.min_rate)
+                self._new_pauses[host] = time.time() + delay
+        return delay if attempt < self.max_retries else None
+
+    def retry_delay(self, attempt, deadline=None):
+        """Seconds to back off before retrying a failed connection, or None if no retry is left or fits"""
+        if attempt >= self.max_retries:
+            return None
+        delay = self._backoff(attempt)
+        if deadline is not None and delay >= deadline.remaining():
+            return None
+        return delay
+
+    def request(self, session, method, url, deadline=None, limit=15.0, **kwargs):
+        """Send a request on a requests session, paced and retried.
+
+        Each attempt's timeout is `limit` clipped to the deadline (or just
+        `limit` overall without one). Connection errors and timeouts are
+        retried like retryable answers. Returns the last response, which
+        may still be an error; raises HostThrottled if the host still
+        answers 429 or 503 once retries or time run out, the last
+        connection error or timeout, and DeadlineExceeded when no attempt
+        fits.
+        """
+        host = urlparse(url).netloc
+        if deadline is None:
+            deadline = Deadline(limit)
+        attempt = 0
+        while True:
+            self.acquire(host, deadline)
+            try:
+                response = session.request(method, url, timeout=deadline.timeout(limit), **kwargs)
+            except (requests.ConnectionError, requests.Timeout) as e:
+                delay = self.retry_delay(attempt, deadline)
+                if delay is None:
+                    raise
+                logging.info(f"Retrying {host} in {delay:.1f}s after {type(e).__name__}")
+                attempt += 1
+                self.record_retry()
+                time.sleep(delay)
+                continue
+            delay = self.after_response(host, response.status_code, response.headers.get('Retry-After'), attempt)
+            if delay is None or delay >= deadline.remaining():
+                if response.status_code in THROTTLE_STATUSES:
+                    response.close()
+                    raise HostThrottled(f'{host} still answered {response.status_code} after {attempt + 1} attempts')
+                return response
+            response.close()
+            attempt += 1
+            self.record_retry()
+            # A throttled host waits out its pause in acquire()
+            if response.status_code not in THROTTLE_STATUSES:
+                time.sleep(delay)
+
+    def record_retry(self):
+        with self._lock:
+            self._stats['retries'] += 1
+
+    def stats(self):
+        now = time.monotonic()
+        with self._lock:
+            return {
+                **self._stats,
+                'waited_seconds': round(self._stats['waited_seconds'], 3),
+                'hosts': {
+                    host: {
+                        'rate': round(bucket.rate, 3) if bucket.rate else None,
+                        'max_rate': round(bucket.max_rate, 3) if bucket.max_rate else None,
+                        'throttled': bucket.throttled,
+                        'paused_seconds': round(max(0.0, bucket.paused_until - now), 3),
+                    }
+                    for host, bucket in self._buckets.items()
+                },
+            }
+
+    def export_shared(self):
+        """Host pauses started since the last call, as wall clock times"""
+        with self._lock:
+            pauses, self._new_pauses = self._new_pauses, {}
+            return pauses
+
+    def import_shared(self, values):
+        """Pause hosts that throttled another process"""
+        now, wall = time.monotonic(), time.time()
+        with self._lock:
+            for host, until in values.items():
+                if until > wall:
+                    self._bucket(host).throttle(now, until - wall, self.min_rate)
@@ -0,0 +1,127 @@
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlparse
+import requests
+from requests.adapters import HTTPAdapter
+
+
+class InstrumentedHTTPAdapter(HTTPAdapter):
+    """HTTPAdapter that reports each request's host, status, latency and body size to a SearchMetrics"""
+
+    def __init__(self, metrics=None, **kwargs):
+        self.metrics = metrics
+        super().__init__(**kwargs)
+
+    def send(self, request, stream=False, **kwargs):
+        if self.metrics is None:
+            return super().send(request, stream=stream, **kwargs)
+
+        host = urlparse(request.url).netloc
+        start = time.perf_counter()
+        try:
+            response = super().send(request, stream=stream, **kwargs)
+            # Read the body here, as the session would right after, so the
+            # latency includes the download; streamed bodies go by their header
+            nbytes = int(response.headers.get('Content-Length') or 0) if stream else len(response.content)
+        except requests.Timeout:
+            self.metrics.observe_request(host, request.method, 'timeout', time.perf_counter() - start)
+            raise
+        except Exception:
+            self.metrics.observe_request(host, request.method, 'error', time.perf_counter() - start)
+            raise
+        self.metrics.observe_request(host, request.method, response.status_code, time.perf_counter() - start)
+        self.metrics.observe_bytes(host, nbytes)
+        return response
+
+
+def mount_host_pools(session, host_pool_sizes, metrics=None):
+    """Give each upstream host its own keep-alive pool on a requests session.
+
+    host_pool_sizes maps base URLs (e.g. 'https://archive.org/') to the
+    number of connections kept open to that host. With metrics, every
+    request, including those to unlisted hosts, is recorded. Returns the
+    mounted adapters keyed by host.
+    """
+    adapters = {}
+    for base_url, size in host_pool_sizes.items():
+        parsed = urlparse(base_url)
+        adapter = InstrumentedHTTPAdapter(metrics, pool_connections=1, pool_maxsize=size, max_retries=0)
+        session.mount(f"{parsed.scheme}://{parsed.netloc}/", adapter)
+        adapters[parsed.netloc] = adapter
+    if metrics is not None:
+        for prefix in ('http://', 'https://'):
+            session.mount(prefix, InstrumentedHTTPAdapter(metrics))
+    return adapters
+
+
+def host_pool_stats(adapters):
+    """Report pool size, idle connections and connection reuse for each mounted host"""
+    stats = {}
+    for host, adapter in adapters.items():
+        poolmanager = adapter.poolmanager
+        host_stats = {'pool_maxsize': poolmanager.connection_pool_kw.get('maxsize'), 'idle': 0, 'connections_opened': 0, 'requests': 0}
+        for key in poolmanager.pools.keys():
+            pool = poolmanager.pools.get(key)
+            if pool is None:
+                continue
+            host_stats['idle'] += sum(1 for conn in list(pool.pool.queue) if conn is not None)
+            host_stats['connections_opened'] += pool.num_connections
+            host_stats['requests'] += pool.num_requests
+        stats[host] = host_stats
+    return stats
+
+
+class Bulkhead:
+    """A dedicated worker pool for one source.
+
+    Each source gets its own threads, so a source that stalls can only
+    exhaust its own workers; lookups for other sources keep running.
+    """
+
+    def __init__(self, name, max_workers):
+        self.name = name
+        self.max_workers = max_workers
+        slug = re.sub(r'\W+', '-', name.lower()).strip('-')
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix=f"bulkhead-{slug}")
+        self._lock = threading.Lock()
+        self._queued = 0
+        self._active = 0
+        self._completed = 0
+        self._cancelled = 0
+
+    def submit(self, fn, *args):
+        def run():
+            with self._lock:
+                self._queued -= 1
+                self._active += 1
+            try:
+                return fn(*args)
+            finally:
+                with self._lock:
+                    self._active -= 1
+                    self._completed += 1
+
+        def on_done(future):
+            # Cancelled before a worker picked it up
+            if future.cancelled():
+                with self._lock:
+                    self._queued -= 1
+                    self._cancelled += 1
+
+        with self._lock:
+            self._queued += 1
+        future = self.executor.submit(run)
+        future.add_done_callback(on_done)
+        return future
+
+    def stats(self):
+        with self._lock:
+            return {
+                'max_workers': self.max_workers,
+                'active': self._active,
+                'queued': self._queued,
+                'completed': self._completed,
+                'cancelled': self._cancelled,
+            }
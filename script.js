@@ -10,6 +10,8 @@ class BookFinder {
         this.resultsSection = document.getElementById('resultsSection');
         this.resultsTable = document.getElementById('resultsTable');
         this.emptyState = document.getElementById('emptyState');
+        this.bundleBtn = document.getElementById('bundleBtn');
+        this.results = [];
         
         console.log('Elements found:', {
             searchBtn: !!this.searchBtn,
@@ -51,6 +53,25 @@ class BookFinder {
         } else {
             console.error('Book input not found!');
         }
+        
+        if (this.bundleBtn) {
+            this.bundleBtn.addEventListener('click', () => this.downloadBundle());
+        }
+    }
+    
+    downloadBundle() {
+        // A plain form post lets the browser save the ZIP as it streams in
+        const form = document.createElement('form');
+        form.method = 'POST';
+        form.action = '/search_books/bundle';
+        const field = document.createElement('input');
+        field.type = 'hidden';
+        field.name = 'results';
+        field.value = JSON.stringify(this.results);
+        form.appendChild(field);
+        document.body.appendChild(form);
+        form.submit();
+        form.remove();
     }
     
     parseBookInput() {
@@ -103,7 +124,7 @@ class BookFinder {
             // Perform search
             console.log('Sending search request for books:', books);
             
-            const response = await fetch('/search', {
+            const response = await fetch('/search_books/stream', {
                 method: 'POST',
                 headers: {
                     'Content-Type': 'application/json',
@@ -120,9 +141,33 @@ class BookFinder {
                 throw new Error(errorData.error || `Server error: ${response.status}`);
             }
             
-            const results = await response.json();
-            console.log('Search results received:', results);
-            this.displayResults(results);
+            // Render each result row as soon as its line arrives
+            this.resultsTable.innerHTML = '';
+            this.results = [];
+            let resultCount = 0;
+            
+            await this.readEventStream(response, (event) => {
+                if (event.type === 'result') {
+                    if (resultCount === 0) {
+                        this.resultsSection.style.display = 'block';
+                        if (this.bundleBtn) this.bundleBtn.style.display = 'inline-block';
+                    }
+                    resultCount++;
+                    this.results.push(event);
+                    this.resultsTable.appendChild(this.createResultRow(event, 1));
+                } else if (event.type === 'timeout') {
+                    console.warn(`Timed out searching ${event.source} for ${event.title}`);
+                } else if (event.type === 'summary') {
+                    console.log('Search summary by source:', event.sources);
+                } else if (event.type === 'error') {
+                    throw new Error(event.error);
+                }
+            });
+            
+            console.log(`Search finished with ${resultCount} results`);
+            if (resultCount === 0) {
+                this.displayResults([]);
+            }
             
         } catch (error) {
             console.error('Search error:', error);
@@ -135,11 +180,38 @@ class BookFinder {
         }
     }
     
+    async readEventStream(response, onEvent) {
+        // Parse a newline-delimited JSON body incrementally
+        const reader = response.body.getReader();
+        const decoder = new TextDecoder();
+        let buffer = '';
+        
+        while (true) {
+            const { done, value } = await reader.read();
+            if (done) break;
+            
+            buffer += decoder.decode(value, { stream: true });
+            const lines = buffer.split('\n');
+            buffer = lines.pop();
+            
+            for (const line of lines) {
+                if (line.trim()) {
+                    onEvent(JSON.parse(line));
+                }
+            }
+        }
+        
+        if (buffer.trim()) {
+            onEvent(JSON.parse(buffer));
+        }
+    }
+    
     hideAllStates() {
         this.loadingSpinner.style.display = 'none';
         this.errorMessage.style.display = 'none';
         this.resultsSection.style.display = 'none';
         this.emptyState.style.display = 'none';
+        if (this.bundleBtn) this.bundleBtn.style.display = 'none';
     }
     
     showLoading() {
@@ -0,0 +1,236 @@
+import logging
+import os
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+
+# Returned by SearchCache.get when nothing usable is cached. A cached
+# "not found" result is returned as None, so callers must compare against
+# this sentinel rather than test for truthiness.
+CACHE_MISS = object()
+
+
+def normalize_text(value):
+    """Lowercase, strip accents and punctuation, and collapse whitespace"""
+    value = value or ''
+    # Plain ASCII has no accents to strip
+    if not value.isascii():
+        value = unicodedata.normalize('NFKD', value)
+        value = ''.join(c for c in value if not unicodedata.combining(c))
+    value = re.sub(r'[^\w\s]', ' ', value.lower())
+    return ' '.join(value.split())
+
+
+def normalize_key(title, author, source):
+    """Build a cache key that ignores case, accents, punctuation and spacing"""
+    return f"{normalize_text(title)}|{normalize_text(author)}|{source}"
+
+
+class MemoryCacheTier:
+    """Bounded in-process LRU tier"""
+
+    def __init__(self, max_entries=2048):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            link, expires_at = entry
+            if expires_at <= time.time():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return entry
+
+    def set(self, key, link, expires_at):
+        with self._lock:
+            self._entries[key] = (link, expires_at)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class SQLiteCacheTier:
+    """Persistent tier backed by a single SQLite file"""
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute(
+            'CREATE TABLE IF NOT EXISTS lookups ('
+            'key TEXT PRIMARY KEY, link TEXT, expires_at REAL NOT NULL)'
+        )
+        self._conn.commit()
+
+    def get(self, key):
+        with self._lock:
+            row = self._conn.execute(
+                'SELECT link, expires_at FROM lookups WHERE key = ?', (key,)
+            ).fetchone()
+        if row is None or row[1] <= time.time():
+            return None
+        return row
+
+    def set(self, key, link, expires_at):
+        with self._lock:
+            self._conn.execute(
+                'INSERT OR REPLACE INTO lookups (key, link, expires_at) VALUES (?, ?, ?)',
+                (key, link, expires_at)
+            )
+            self._conn.commit()
+
+    def delete(self, key):
+        with self._lock:
+            self._conn.execute('DELETE FROM lookups WHERE key = ?', (key,))
+            self._conn.commit()
+
+    def purge_expired(self):
+        with self._lock:
+            self._conn.execute('DELETE FROM lookups WHERE expires_at <= ?', (time.time(),))
+            self._conn.commit()
+
+    def clear(self):
+        with self._lock:
+            self._conn.execute('DELETE FROM lookups')
+            self._conn.commit()
+
+
+class SearchCache:
+    """Two-tier cache of per-source lookup results.
+
+    Found links and "not found" results are stored with separate TTLs so
+    that a dead end is retried sooner than a working link is re-scraped.
+    """
+
+    def __init__(self, path=None, hit_ttl=7 * 24 * 3600, miss_ttl=3600, max_memory_entries=2048):
+        self.hit_ttl = hit_ttl
+        self.miss_ttl = miss_ttl
+        self.memory = MemoryCacheTier(max_memory_entries)
+        self.persistent = None
+        if path:
+            try:
+                self.persistent = SQLiteCacheTier(path)
+                self.persistent.purge_expired()
+            except sqlite3.Error as e:
+                logging.warning(f"Persistent cache unavailable at {path}: {str(e)}")
+        self._lock = threading.Lock()
+        self._stats = {
+            'memory_hits': 0,
+            'persistent_hits': 0,
+            'misses': 0,
+            'negative_hits': 0,
+            'stores': 0,
+        }
+
+    @classmethod
+    def from_env(cls):
+        """Create a cache configured from BOOK_CACHE_* environment variables"""
+        path = os.environ.get('BOOK_CACHE_PATH', 'book_cache.sqlite3')
+        return cls(
+            path=path or None,
+            hit_ttl=float(os.environ.get('BOOK_CACHE_HIT_TTL', 7 * 24 * 3600)),
+            miss_ttl=float(os.environ.get('BOOK_CACHE_MISS_TTL', 3600)),
+            max_memory_entries=int(os.environ.get('BOOK_CACHE_MEMORY_ENTRIES', 2048)),
+        )
+
+    def _count(self, name):
+        with self._lock:
+            self._stats[name] += 1
+
+    def get(self, title, author, source):
+        """Return the cached link, None for a cached miss, or CACHE_MISS"""
+        entry = self._get_entry(title, author, source)
+        return CACHE_MISS if entry is None else entry[0]
+
+    def get_with_age(self, title, author, source):
+        """Return (link, seconds since it was stored), or CACHE_MISS"""
+        entry = self._get_entry(title, author, source)
+        if entry is None:
+            return CACHE_MISS
+        link, expires_at = entry
+        ttl = self.hit_ttl if link else self.miss_ttl
+        return link, max(0.0, time.time() - (expires_at - ttl))
+
+    def _get_entry(self, title, author, source):
+        key = normalize_key(title, author, source)
+
+        entry = self.memory.get(key)
+        if entry is not None:
+            self._count('memory_hits')
+        elif self.persistent is not None:
+            try:
+                entry = self.persistent.get(key)
+            except sqlite3.Error as e:
+                logging.warning(f"Persistent cache read failed: {str(e)}")
+                entry = None
+            if entry is not None:
+                self._count('persistent_hits')
+                # Promote so the next lookup stays in-process
+                self.memory.set(key, entry[0], entry[1])
+
+        if entry is None:
+            self._count('misses')
+            return None
+
+        if entry[0] is None:
+            self._count('negative_hits')
+        return entry
+
+    def set(self, title, author, source, link):
+        """Store a lookup result; link=None records a "not found" result"""
+        key = normalize_key(title, author, source)
+        ttl = self.hit_ttl if link else self.miss_ttl
+        expires_at = time.time() + ttl
+        link = link or None
+
+        self.memory.set(key, link, expires_at)
+        if self.persistent is not None:
+            try:
+                self.persistent.set(key, link, expires_at)
+            except sqlite3.Error as e:
+                logging.warning(f"Persistent cache write failed: {str(e)}")
+        self._count('stores')
+
+    def delete(self, title, author, source):
+        """Drop a cached result so the next lookup scrapes again"""
+        key = normalize_key(title, author, source)
+        self.memory.delete(key)
+        if self.persistent is not None:
+            try:
+                self.persistent.delete(key)
+            except sqlite3.Error as e:
+                logging.warning(f"Persistent cache delete failed: {str(e)}")
+
+    def clear(self):
+        self.memory.clear()
+        if self.persistent is not None:
+            self.persistent.clear()
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+        stats['hits'] = stats['memory_hits'] + stats['persistent_hits']
+        lookups = stats['hits'] + stats['misses']
+        stats['hit_rate'] = round(stats['hits'] / lookups, 4) if lookups else 0.0
+        stats['memory_entries'] = len(self.memory)
+        return stats
@@ -0,0 +1,177 @@
+"""State shared between server worker processes.
+
+Under gunicorn every worker process has its own BookSearcher, so what one
+worker learns (mirror health, source hit rates, dead links, metrics) would
+stay in that process. SharedStore keeps such state in one SQLite file and
+SharedStateSync exchanges it every few seconds, so each worker keeps fast
+in-memory state on the request path and converges with the others.
+"""
+import json
+import logging
+import os
+import socket
+import sqlite3
+import threading
+import time
+
+
+def process_id():
+    """Identifies this server process among the ones sharing a store"""
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+class SharedStore:
+    """JSON values in namespaces, each stamped with the process that wrote it and a sequence number.
+
+    Sequence numbers only grow, so a reader can ask for what changed since
+    the last number it saw.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = None
+        self._pid = None
+
+    @classmethod
+    def from_env(cls):
+        path = os.environ.get('BOOK_SHARED_STATE_PATH', 'book_state.sqlite3')
+        return cls(path) if path else None
+
+    def _connection(self):
+        # A connection must not cross a fork, so every process opens its own
+        if self._conn is None or self._pid != os.getpid():
+            self._conn = sqlite3.connect(self.path, check_same_thread=False, timeout=10)
+            self._conn.execute('PRAGMA journal_mode=WAL')
+            self._conn.executescript(
+                'CREATE TABLE IF NOT EXISTS shared_state ('
+                ' namespace TEXT NOT NULL, key TEXT NOT NULL, value TEXT NOT NULL, origin TEXT NOT NULL,'
+                ' seq INTEGER NOT NULL, PRIMARY KEY (namespace, key));'
+                'CREATE INDEX IF NOT EXISTS shared_state_seq ON shared_state (namespace, seq);'
+            )
+            self._conn.commit()
+            self._pid = os.getpid()
+        return self._conn
+
+    def put_many(self, namespace, values, origin):
+        """Store {key: value} under a namespace"""
+        with self._lock:
+            conn = self._connection()
+            # Take the write lock up front, so sequence numbers are handed out in commit order
+            conn.execute('BEGIN IMMEDIATE')
+            try:
+                for key, value in values.items():
+                    conn.execute(
+                        'INSERT OR REPLACE INTO shared_state (namespace, key, value, origin, seq) '
+                        'VALUES (?, ?, ?, ?, (SELECT COALESCE(MAX(seq), 0) + 1 FROM shared_state))',
+                        (namespace, key, json.dumps(value), origin)
+                    )
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+
+    def delete(self, namespace, keys):
+        """Remove the given keys from a namespace"""
+        with self._lock:
+            conn = self._connection()
+            try:
+                conn.executemany('DELETE FROM shared_state WHERE namespace = ? AND key = ?', [(namespace, key) for key in keys])
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+
+    def get_all(self, namespace):
+        """Return {key: value} for a whole namespace"""
+        with self._lock:
+            rows = self._connection().execute(
+                'SELECT key, value FROM shared_state WHERE namespace = ?', (namespace,)
+            ).fetchall()
+        return {key: json.loads(value) for key, value in rows}
+
+    def changed_since(self, namespace, seq, origin=None):
+        """Return ({key: value}, latest seq) for entries written after seq, leaving out origin's own"""
+        with self._lock:
+            rows = self._connection().execute(
+                'SELECT key, value, origin, seq FROM shared_state WHERE namespace = ? AND seq > ? ORDER BY seq',
+                (namespace, seq)
+            ).fetchall()
+        values = {key: json.loads(value) for key, value, writer, _ in rows if writer != origin}
+        return values, max([seq] + [row_seq for _, _, _, row_seq in rows])
+
+
+class SharedStateSync:
+    """Exchanges state between processes through a SharedStore every `interval` seconds.
+
+    Participants implement export_shared(), returning {key: value} for
+    whatever changed locally since the last call, and import_shared(values)
+    to adopt what other processes wrote. Metrics are not merged into the
+    local registry; each process stores a timestamped snapshot, and
+    render_metrics() adds up those refreshed within `metrics_ttl` seconds,
+    so workers that exited (or ran before a restart) stop being counted.
+    """
+
+    def __init__(self, store, metrics=None, interval=2.0, metrics_ttl=None):
+        self.store = store
+        self.metrics = metrics
+        self.interval = interval
+        # A live process refreshes its snapshot every interval
+        self.metrics_ttl = metrics_ttl if metrics_ttl is not None else max(30.0, 10 * interval)
+        self.origin = process_id()
+        self._participants = []
+        self._seen = {}
+        self._lock = threading.Lock()
+        self._started = False
+
+    @classmethod
+    def from_env(cls, store, metrics=None):
+        interval = float(os.environ.get('BOOK_SHARED_STATE_INTERVAL', 2.0))
+        ttl = os.environ.get('BOOK_SHARED_METRICS_TTL')
+        return cls(store, metrics, interval=interval, metrics_ttl=float(ttl) if ttl else None)
+
+    def register(self, namespace, participant):
+        self._participants.append((namespace, participant))
+
+    def start(self):
+        """Start syncing in the background, beginning with what other processes have shared so far"""
+        if self._started:
+            return
+        with self._lock:
+            if self._started:
+                return
+            self._started = True
+            threading.Thread(target=self._work, name='shared-state-sync', daemon=True).start()
+
+    def _work(self):
+        while True:
+            try:
+                self.sync()
+            except Exception as e:
+                logging.error(f"Shared state sync failed: {str(e)}")
+            time.sleep(self.interval)
+
+    def sync(self):
+        for namespace, participant in self._participants:
+            changes = participant.export_shared()
+            if changes:
+                self.store.put_many(namespace, changes, self.origin)
+            values, self._seen[namespace] = self.store.changed_since(namespace, self._seen.get(namespace, 0), self.origin)
+            if values:
+                participant.import_shared(values)
+        if self.metrics is not None:
+            self.store.put_many('metrics', {self.origin: {'time': time.time(), 'snapshot': self.metrics.snapshot()}}, self.origin)
+            stale = [origin for origin, entry in self.store.get_all('metrics').items() if not self._is_fresh(entry)]
+            if stale:
+                self.store.delete('metrics', stale)
+                logging.info(f"Dropped metrics of {len(stale)} processes that stopped reporting")
+
+    def _is_fresh(self, entry):
+        # Snapshots from before they carried a time count as stale
+        return isinstance(entry, dict) and time.time() - entry.get('time', 0) <= self.metrics_ttl
+
+    def render_metrics(self):
+        """Metrics summed over every live process that shared them, with this one's current values"""
+        snapshots = {origin: entry['snapshot'] for origin, entry in self.store.get_all('metrics').items() if self._is_fresh(entry)}
+        snapshots[self.origin] = self.metrics.snapshot()
+        return self.metrics.render(list(snapshots.values()))
@@ -0,0 +1,90 @@
+import asyncio
+import threading
+from concurrent.futures import Future
+from deadline import DeadlineExceeded
+
+
+class SingleFlight:
+    """Coalesce identical in-flight calls so only the first caller does the work.
+
+    Calls are keyed by the caller; while a call for a key is running, every
+    other caller with that key waits on the same future and gets the same
+    result or exception. Thread-based and asyncio callers can share one
+    instance, even across event loops, because the shared future is a
+    concurrent.futures.Future.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+        self._leaders = 0
+        self._coalesced = 0
+
+    def _claim(self, key):
+        """Return (future, is_leader) for key, registering a new call if none is running"""
+        with self._lock:
+            future = self._calls.get(key)
+            if future is not None:
+                self._coalesced += 1
+                return future, False
+            future = Future()
+            self._calls[key] = future
+            self._leaders += 1
+            return future, True
+
+    def _finish(self, key, future, result=None, error=None):
+        with self._lock:
+            self._calls.pop(key, None)
+        if future.done():
+            return
+        if error is not None:
+            future.set_exception(error)
+        else:
+            future.set_result(result)
+
+    def do(self, key, fn, *args, timeout=None):
+        """Run fn(*args) unless a call for key is already running, then wait for it.
+
+        Followers wait at most `timeout` seconds and get a TimeoutError after that.
+        """
+        future, leader = self._claim(key)
+        if not leader:
+            return future.result(timeout=timeout)
+
+        try:
+            result = fn(*args)
+        except Exception as e:
+            self._finish(key, future, error=e)
+            raise
+        except BaseException:
+            self._finish(key, future, error=DeadlineExceeded('shared lookup was interrupted'))
+            raise
+        self._finish(key, future, result=result)
+        return result
+
+    async def do_async(self, key, fn, *args):
+        """Await fn(*args) unless a call for key is already running, then await that"""
+        future, leader = self._claim(key)
+        if not leader:
+            # Shield so a follower's cancellation never cancels the shared future
+            return await asyncio.shield(asyncio.wrap_future(future))
+
+        try:
+            result = await fn(*args)
+        except Exception as e:
+            self._finish(key, future, error=e)
+            raise
+        except BaseException:
+            # A cancelled leader (e.g. its budget ran out) must not cancel followers
+            self._finish(key, future, error=DeadlineExceeded('shared lookup was interrupted'))
+            raise
+        self._finish(key, future, result=result)
+        return result
+
+    def stats(self):
+        with self._lock:
+            return {
+                'in_flight': len(self._calls),
+                'leaders': self._leaders,
+                'coalesced': self._coalesced,
+            }
@@ -0,0 +1,106 @@
+import os
+import random
+import threading
+
+
+class SourceStats:
+    """Rolling hit rate and lookup cost of one source"""
+
+    def __init__(self, prior_hit_rate, prior_cost):
+        self.hit_rate = prior_hit_rate
+        self.cost = prior_cost
+        self.samples = 0
+
+    def to_dict(self):
+        return {'hit_rate': round(self.hit_rate, 3), 'cost_seconds': round(self.cost, 3), 'samples': self.samples}
+
+
+class SourceScheduler:
+    """Learns which sources are worth querying and in what order.
+
+    Every finished lookup updates its source's hit rate and cost (seconds)
+    as exponentially weighted averages. Sources are ranked by expected
+    links per second, hit_rate / cost. A source whose hit rate stays below
+    `min_hit_rate` is skipped, except for an `explore_rate` share of
+    requests so that it can earn its place back. Server processes pool
+    what they learn through export_shared() and import_shared().
+    """
+
+    # Costs below this are treated as equal, so an instant offline source
+    # doesn't outrank everything regardless of its hit rate
+    MIN_COST = 0.05
+
+    def __init__(self, alpha=0.05, min_samples=20, min_hit_rate=0.02, explore_rate=0.05,
+                 prior_hit_rate=0.5, prior_cost=1.0):
+        self.alpha = alpha
+        self.min_samples = min_samples
+        self.min_hit_rate = min_hit_rate
+        self.explore_rate = explore_rate
+        self.prior_hit_rate = prior_hit_rate
+        self.prior_cost = prior_cost
+        self._lock = threading.Lock()
+        self._stats = {}
+        self._dirty = set()
+
+    @classmethod
+    def from_env(cls):
+        return cls(
+            min_hit_rate=float(os.environ.get('BOOK_SOURCE_MIN_HIT_RATE', 0.02)),
+            explore_rate=float(os.environ.get('BOOK_SOURCE_EXPLORE_RATE', 0.05)),
+        )
+
+    def _get(self, source):
+        stats = self._stats.get(source)
+        if stats is None:
+            stats = self._stats[source] = SourceStats(self.prior_hit_rate, self.prior_cost)
+        return stats
+
+    def record(self, source, found, seconds):
+        with self._lock:
+            stats = self._get(source)
+            # Average plainly until there are enough samples for the EWMA to mean anything
+            weight = max(self.alpha, 1 / (stats.samples + 1))
+            stats.hit_rate += weight * ((1.0 if found else 0.0) - stats.hit_rate)
+            stats.cost += weight * (seconds - stats.cost)
+            stats.samples += 1
+            self._dirty.add(source)
+
+    def order(self, sources):
+        """Return the sources to query, best first, leaving out ones not worth a lookup"""
+        with self._lock:
+            ranked = []
+            for position, source in enumerate(sources):
+                stats = self._get(source)
+                score = stats.hit_rate / max(stats.cost, self.MIN_COST)
+                ranked.append((-score, position, source, stats))
+        ranked.sort()
+
+        chosen = [
+            source for _, _, source, stats in ranked
+            if stats.samples < self.min_samples or stats.hit_rate >= self.min_hit_rate
+            or random.random() < self.explore_rate
+        ]
+        # Always query something, even when every source looks poor
+        return chosen or [ranked[0][2]]
+
+    def stats(self):
+        with self._lock:
+            return {source: stats.to_dict() for source, stats in self._stats.items()}
+
+    def export_shared(self):
+        """Stats of the sources updated since the last call"""
+        with self._lock:
+            dirty, self._dirty = self._dirty, set()
+            return {
+                source: {'hit_rate': self._stats[source].hit_rate, 'cost': self._stats[source].cost,
+                         'samples': self._stats[source].samples}
+                for source in dirty
+            }
+
+    def import_shared(self, values):
+        """Adopt source stats recorded by other processes, unless this one has newer ones"""
+        with self._lock:
+            for source, entry in values.items():
+                if source not in self._dirty:
+                    stats = self._get(source)
+                    stats.hit_rate, stats.cost, stats.samples = entry['hit_rate'], entry['cost'], entry['samples']